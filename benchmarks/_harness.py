@@ -0,0 +1,111 @@
+# Shared timing, memory and baseline helpers for the benchmark scripts
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "src" / "shinyapp"
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / ".fixtures"
+
+# Let the benchmarks import the app packages (wrc_rallydj, wrcapi_rallydj)
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+# How much slower than the baseline (as a fraction) counts as a regression
+REGRESSION_THRESHOLD = 0.25
+
+
+def time_call(fn, repeat=1):
+    """Call fn repeat times; return a list of the durations (s)."""
+    durations = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - t0)
+    return durations
+
+
+def measure_memory(fn):
+    """Call fn under tracemalloc; return (peak KiB, number of allocations)."""
+    tracemalloc.start()
+    try:
+        fn()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    allocations = sum(stat.count for stat in snapshot.statistics("filename"))
+    return round(peak / 1024, 1), allocations
+
+
+def percentile(values, p):
+    """The p-th percentile (0-100) of some values, by nearest rank."""
+    values = sorted(values)
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, round(p / 100 * len(values) + 0.5) - 1))
+    return values[k]
+
+
+def summarise(durations):
+    """Median and p95 (ms) of some durations (s)."""
+    ms = [d * 1000 for d in durations]
+    return {
+        "median_ms": round(statistics.median(ms), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+    }
+
+
+def load_baseline(path):
+    path = Path(path)
+    return json.loads(path.read_text()) if path.is_file() else {}
+
+
+def save_baseline(path, results):
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+def compare_to_baseline(
+    results, baseline, metrics, threshold=REGRESSION_THRESHOLD, higher_is_better=()
+):
+    """
+    Compare results against a baseline.
+
+    Both are {case: {metric: value}}; larger values are worse, except for
+    the metrics in higher_is_better (throughputs).
+    Returns a list of (case, metric, baseline value, value) regressions.
+    """
+    regressions = []
+    for case, values in results.items():
+        for metric in metrics:
+            base = baseline.get(case, {}).get(metric)
+            value = values.get(metric)
+            if not base or value is None:
+                continue
+            if metric in higher_is_better:
+                regressed = value < base / (1 + threshold)
+            else:
+                regressed = value > base * (1 + threshold)
+            if regressed:
+                regressions.append((case, metric, base, value))
+    return regressions
+
+
+def print_report(results, columns, regressions=()):
+    """Print results as a table, flagging any regressions."""
+    flagged = {(case, metric) for case, metric, _, _ in regressions}
+    width = max([len(case) for case in results] + [4]) + 2
+    print(f"{'case':<{width}}" + "".join(f"{c:>16}" for c in columns))
+    for case, values in results.items():
+        cells = []
+        for c in columns:
+            value = values.get(c)
+            cell = "-" if value is None else f"{value:g}"
+            cells.append(f"{cell + (' !' if (case, c) in flagged else ''):>16}")
+        print(f"{case:<{width}}" + "".join(cells))
+    for case, metric, base, value in regressions:
+        print(f"REGRESSION {case} {metric}: {base:g} -> {value:g}")
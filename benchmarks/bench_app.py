@@ -0,0 +1,526 @@
+# Headless benchmarks for the app's panels
+#
+# The app is loaded as shiny serves it, on a copy of the benchmark fixture
+# db (as an archive db, so no API calls are made), and driven by simulated
+# browser sessions. A simulated browser starts with the inputs' initial values
+# from the page, follows the server's select updates as a browser would (with
+# the mocked inputs pinned), binds the inputs in rendered UI, and only shows
+# the outputs in the accordion panels it has opened.
+#
+# Each panel is timed from opening it (its accordion panels) on a loaded page
+# to the session going idle, in a new session each time; the first, cold,
+# open in the process is reported separately. The render function's own time
+# is taken from the reactive profiler. The full page load (a new session,
+# with all the panels then opened) is timed too, as is the same for --sessions
+# concurrent sessions. The sessions share one event loop, as they do in a shiny worker,
+# so concurrent sessions queue behind each other's renders.
+#
+# Usage:
+#   python benchmarks/bench_app.py [panel ...] [--repeat 5] [--sessions 4]
+#       [--input stage=12008337] [--save-baseline] [--threshold 0.25]
+#
+# Needs shiny and shinywidgets, and the app's Python version (3.12+).
+# Exits with status 1 if any panel is over its latency budget (the p95 ms in
+# benchmarks/budgets_app.json), or has regressed against the baseline.
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+
+from _harness import (
+    APP_DIR,
+    BENCH_DIR,
+    REGRESSION_THRESHOLD,
+    compare_to_baseline,
+    load_baseline,
+    print_report,
+    save_baseline,
+    summarise,
+)
+from fixtures import SEASON_DB, build_season_fixture
+
+BASELINE = BENCH_DIR / "baseline_app.json"
+BUDGETS = BENCH_DIR / "budgets_app.json"
+
+# The panels benchmarked by default, by output id
+PANELS = [
+    "split_report",
+    "split_times_heat",
+    "stage_progression_heat",
+    "seaborn_linechart_stage_typ",
+    "stage_report_remarks",
+]
+
+COLUMNS = ["cold_ms", "median_ms", "p95_ms", "render_ms", "budget_ms"]
+# The metrics checked for regressions
+METRICS = ["median_ms", "p95_ms"]
+
+# The size plots are drawn at
+PLOT_SIZE = (800, 500)
+
+VOID_TAGS = {"area", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+
+
+class PageParser(HTMLParser):
+    """
+    Pick out the inputs (with their initial values), the outputs and the
+    accordion panels in some page HTML.
+
+    Each output is recorded with the accordion panels it is in, outermost
+    first, and each panel as (accordion input id or None, panel value).
+    """
+
+    def __init__(self, panel_offset=0):
+        super().__init__()
+        self.inputs = {}
+        self.multiple = set()
+        self.options = {}
+        self.outputs = {}
+        self.plots = set()
+        self.panels = {}
+        self._panel_offset = panel_offset
+        self._groups = set()
+        self._select = None
+        # The open elements, as (tag, accordion input id or panel number)
+        self._stack = []
+
+    def _accordion(self):
+        for tag, kind, value in reversed(self._stack):
+            if kind == "accordion":
+                return value
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+        id = attrs.get("id")
+        kind = value = None
+
+        if "accordion" in classes:
+            kind = "accordion"
+            if "bslib-accordion-input" in classes:
+                # No panels are open
+                value = id
+                self.inputs[id] = None
+        elif "accordion-item" in classes:
+            kind, value = "panel", self._panel_offset + len(self.panels)
+            self.panels[value] = (self._accordion(), attrs.get("data-value"))
+        elif id and (tag == "shiny-data-frame" or any(c.endswith("-output") for c in classes)):
+            self.outputs[id] = tuple(v for _, k, v in self._stack if k == "panel")
+            if "shiny-plot-output" in classes:
+                self.plots.add(id)
+        elif tag == "select" and id:
+            self._select = id
+            self.options[id] = []
+            if "multiple" in attrs:
+                self.multiple.add(id)
+            self.inputs[id] = () if id in self.multiple else None
+        elif tag == "option" and self._select:
+            self.options[self._select].append(attrs.get("value"))
+            if "selected" in attrs:
+                if self._select in self.multiple:
+                    self.inputs[self._select] += (attrs.get("value"),)
+                else:
+                    self.inputs[self._select] = attrs.get("value")
+        elif id and "shiny-input-radiogroup" in classes:
+            self._groups.add(id)
+            self.inputs[id] = None
+        elif id and "shiny-input-checkboxgroup" in classes:
+            self._groups.add(id)
+            self.inputs[id] = ()
+        elif tag == "input" and attrs.get("name") in self._groups:
+            name = attrs["name"]
+            if "checked" in attrs:
+                if isinstance(self.inputs[name], tuple):
+                    self.inputs[name] += (attrs.get("value"),)
+                else:
+                    self.inputs[name] = attrs.get("value")
+        elif tag == "input" and id:
+            if attrs.get("type") == "checkbox":
+                self.inputs[id] = "checked" in attrs
+            elif "js-range-slider" in classes:
+                self.inputs[id] = float(attrs["data-from"])
+            elif attrs.get("type") == "number":
+                self.inputs[id] = float(attrs["value"]) if attrs.get("value") else None
+            else:
+                self.inputs[id] = attrs.get("value", "")
+        elif tag == "button" and id and "action-button" in classes:
+            self.inputs[id] = 0
+
+        if tag not in VOID_TAGS:
+            self._stack.append((tag, kind, value))
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self._select = None
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+
+
+def parse_page(html, panel_offset=0):
+    parser = PageParser(panel_offset)
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def option_values(html):
+    """The values of the options in some select options HTML."""
+    return parse_page(f'<select id="_">{html}</select>').options["_"]
+
+
+class Browser:
+    """
+    A simulated browser page for a session: the inputs, outputs and open
+    accordion panels on the page, and the output values and errors the
+    server has sent it.
+    """
+
+    def __init__(self, page, pinned=None):
+        self.pinned = dict(pinned or {})
+        # The pinned inputs are set from the start, as if restored from a
+        # bookmark, and kept through the server's updates
+        self.inputs = {**page.inputs, **self.pinned}
+        self.multiple = set(page.multiple)
+        self.outputs = dict(page.outputs)
+        self.plots = set(page.plots)
+        self.panels = dict(page.panels)
+        self.open = set()
+        self.values = {}
+        self.errors = {}
+        # The input values last sent to the server
+        self._sent = {}
+
+    def visible(self, output):
+        return all(panel in self.open for panel in self.outputs[output])
+
+    def open_output(self, output):
+        """Open the accordion panels an output is in."""
+        self.open.update(self.outputs[output])
+        for accordion in {self.panels[p][0] for p in self.outputs[output]} - {None}:
+            self.inputs[accordion] = [
+                value
+                for panel, (_accordion, value) in sorted(self.panels.items())
+                if _accordion == accordion and panel in self.open
+            ]
+
+    def clientdata(self):
+        data = {".clientdata_pixelratio": 1}
+        for output in self.outputs:
+            data[f".clientdata_output_{output}_hidden"] = not self.visible(output)
+            if output in self.plots:
+                data[f".clientdata_output_{output}_width"] = PLOT_SIZE[0]
+                data[f".clientdata_output_{output}_height"] = PLOT_SIZE[1]
+        return data
+
+    def changes(self):
+        """The input values that have changed since they were last sent."""
+        data = {**self.inputs, **self.clientdata()}
+        changed = {k: v for k, v in data.items() if k not in self._sent or self._sent[k] != v}
+        self._sent.update(changed)
+        return changed
+
+    def _bind(self, output, html):
+        """Bind the inputs and outputs in some rendered UI."""
+        ui = parse_page(html, panel_offset=max(self.panels, default=-1) + 1)
+        for id, value in ui.inputs.items():
+            self.inputs.setdefault(id, self.pinned.get(id, value))
+        self.multiple |= ui.multiple
+        self.plots |= ui.plots
+        self.panels.update(ui.panels)
+        for id, panels in ui.outputs.items():
+            self.outputs[id] = self.outputs[output] + panels
+
+    def _update_input(self, id, message):
+        """Update an input from an input message, as its binding would."""
+        value = self.inputs.get(id)
+        selected = message.get("value")
+        if "options" in message:
+            options = option_values(message["options"])
+            if id in self.pinned and self.pinned[id] in options:
+                value = self.pinned[id]
+            elif selected:
+                value = tuple(selected) if id in self.multiple else selected[0]
+            elif id in self.multiple:
+                value = tuple(v for v in value or () if v in options)
+            elif value not in options:
+                value = options[0] if options else None
+        elif id in self.pinned:
+            return
+        elif "value" in message:
+            if isinstance(selected, list) and id not in self.multiple:
+                selected = selected[0] if selected else None
+            value = selected
+        self.inputs[id] = value
+
+    def receive(self, message):
+        """Take in a message from the server; return the input values that change."""
+        for id, value in (message.get("values") or {}).items():
+            self.values[id] = value
+            self.errors.pop(id, None)
+            if isinstance(value, dict) and isinstance(value.get("html"), str):
+                self._bind(id, value["html"])
+        self.errors.update(message.get("errors") or {})
+        for input_message in message.get("inputMessages") or []:
+            self._update_input(input_message["id"], input_message["message"])
+        return self.changes()
+
+
+def connection_class():
+    from shiny._connection import MockConnection
+
+    class BrowserConnection(MockConnection):
+        """A session connection that answers the server as a browser would.
+        idle is set whenever the server is waiting on the browser."""
+
+        def __init__(self, browser):
+            super().__init__()
+            self.browser = browser
+            self.idle = asyncio.Event()
+
+        def post(self, method, data):
+            self._queue.put_nowait(json.dumps({"method": method, "data": data}))
+            self.idle.clear()
+
+        async def send(self, message):
+            changes = self.browser.receive(json.loads(message))
+            if changes:
+                self.post("update", changes)
+
+        async def receive(self):
+            if self._queue.empty():
+                self.idle.set()
+            return await super().receive()
+
+    return BrowserConnection
+
+
+async def start_session(app, browser):
+    """Start a session and load the page in it."""
+    conn = connection_class()(browser)
+    session = app._create_session(conn)
+    conn.post("init", browser.changes())
+    task = asyncio.create_task(session._run())
+    # If the session fails, it won't be waiting on the browser again
+    task.add_done_callback(lambda task: conn.idle.set())
+    await conn.idle.wait()
+    return conn, session, task
+
+
+async def end_session(conn, task):
+    # The browser closes the connection, and the session ends
+    conn._queue.put_nowait("")
+    await task
+
+
+def render_time(session, output):
+    """The total time (s) spent in an output's render function in a session."""
+    import reactive_profiler
+
+    profile = reactive_profiler.PROFILES.get(session.id)
+    stats = profile.nodes.get(output) if profile else None
+    return stats.total if stats else None
+
+
+async def open_panel(app, page, pinned, panel):
+    """
+    Load the page in a new session, then open a panel on it.
+    Returns the time (s) to open it, the time in its render function,
+    and its error (or None).
+    """
+    browser = Browser(page, pinned)
+    conn, session, task = await start_session(app, browser)
+    try:
+        browser.open_output(panel)
+        t0 = time.perf_counter()
+        conn.post("update", browser.changes())
+        await conn.idle.wait()
+        elapsed = time.perf_counter() - t0
+        render = render_time(session, panel)
+    finally:
+        await end_session(conn, task)
+    return elapsed, render, browser.errors.get(panel)
+
+
+async def load_page(app, page, pinned, panels):
+    """
+    Load the page in a new session and open some panels on it, as a user
+    opening them all would. Returns the time (s) from the start of the
+    session, and the errors, by output.
+    """
+    browser = Browser(page, pinned)
+    t0 = time.perf_counter()
+    conn, session, task = await start_session(app, browser)
+    try:
+        for panel in panels:
+            browser.open_output(panel)
+        conn.post("update", browser.changes())
+        await conn.idle.wait()
+        elapsed = time.perf_counter() - t0
+    finally:
+        await end_session(conn, task)
+    return elapsed, browser.errors
+
+
+def load_app(dbname):
+    """Load the app, with its reactive nodes profiled, on an archive db."""
+    os.environ["WRC_ARCHIVE_DB"] = str(dbname)
+    import reactive_profiler
+
+    reactive_profiler.install(profile=True)
+    from shiny.express._run import wrap_express_app
+
+    return wrap_express_app(APP_DIR / "app.py")
+
+
+def default_inputs(fixture, stageId=None):
+    """
+    The mocked inputs, selecting a stage (by default, one part way through
+    the fixture's last event) along with its event, day and section.
+    """
+    with sqlite3.connect(fixture) as conn:
+        if stageId is None:
+            (eventId,) = conn.execute("SELECT MAX(eventId) FROM event_rallies").fetchone()
+            stages = conn.execute(
+                "SELECT stageId FROM itinerary_stages WHERE eventId=? ORDER BY number",
+                (eventId,),
+            ).fetchall()
+            (stageId,) = stages[len(stages) // 2]
+        year, seasonId, eventId, legId, sectionId = conn.execute(
+            "SELECT s.year, s.seasonId, it.eventId, it.itineraryLegId, it.itinerarySectionId "
+            "FROM itinerary_stages AS it "
+            "INNER JOIN season_rounds AS r ON r.eventId=it.eventId "
+            "INNER JOIN seasons AS s ON s.seasonId=r.seasonId WHERE it.stageId=?",
+            (int(stageId),),
+        ).fetchone()
+    values = dict(
+        year=year,
+        rally_seasonId=seasonId,
+        season_round=eventId,
+        event_day=legId,
+        event_section=sectionId,
+        stage=stageId,
+    )
+    # As select inputs, these are all strings
+    return {k: str(v) for k, v in values.items()}
+
+
+def panel_errors(errors, panels):
+    """Report the errors in the benchmarked panels; a failed render isn't a fair timing."""
+    for panel in panels:
+        if panel in errors:
+            print(f"ERROR in {panel}: {errors[panel].get('message')}", file=sys.stderr)
+
+
+async def run(app, page, pinned, panels, repeat=5, sessions=4):
+    results = {}
+    for panel in panels:
+        # Cold: the first time the panel is opened in the process
+        cold, _, error = await open_panel(app, page, pinned, panel)
+        durations, renders = [], []
+        for _ in range(repeat):
+            elapsed, render, error = await open_panel(app, page, pinned, panel)
+            durations.append(elapsed)
+            if render is not None:
+                renders.append(render)
+        panel_errors({panel: error} if error else {}, [panel])
+        results[panel] = dict(
+            cold_ms=round(cold * 1000, 2),
+            **summarise(durations),
+            render_ms=summarise(renders)["median_ms"] if renders else None,
+        )
+
+    # The full page, with all the panels open
+    durations = []
+    for _ in range(repeat):
+        elapsed, errors = await load_page(app, page, pinned, panels)
+        durations.append(elapsed)
+    panel_errors(errors, panels)
+    results["page_load"] = summarise(durations)
+
+    # Concurrent page loads, each timed from when they all start
+    if sessions > 1:
+        durations = []
+        for _ in range(repeat):
+            loads = await asyncio.gather(
+                *(load_page(app, page, pinned, panels) for _ in range(sessions))
+            )
+            durations.extend(elapsed for elapsed, _ in loads)
+        results[f"page_load[{sessions} sessions]"] = summarise(durations)
+    return results
+
+
+def check_budgets(results, budgets):
+    """Set budget_ms on the results; return the (case, p95 ms, budget ms) overruns."""
+    overruns = []
+    for case, values in results.items():
+        budget = budgets.get(case)
+        if budget is None:
+            continue
+        values["budget_ms"] = budget
+        if values["p95_ms"] > budget:
+            overruns.append((case, values["p95_ms"], budget))
+    return overruns
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the app's panels, headless.")
+    parser.add_argument("panels", nargs="*", help="Output ids (default: %(default)s)", default=PANELS)
+    parser.add_argument("--repeat", type=int, default=5, help="Sessions per timing")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions")
+    parser.add_argument(
+        "--input", action="append", default=[], metavar="NAME=VALUE", help="Mock an input"
+    )
+    parser.add_argument("--fixture", default=str(SEASON_DB))
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the fixture")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--budgets", default=str(BUDGETS))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    if args.rebuild or not Path(args.fixture).is_file():
+        build_season_fixture(args.fixture)
+
+    mocked = dict(i.split("=", 1) for i in args.input)
+    pinned = {**default_inputs(args.fixture, mocked.get("stage")), **mocked}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        dbname = Path(workdir) / "archive.db"
+        shutil.copy(args.fixture, dbname)
+        # The app's request caches are made in the working directory
+        os.chdir(workdir)
+        app = load_app(dbname)
+        page = parse_page(app.ui["html"])
+        unknown = [panel for panel in args.panels if panel not in page.outputs]
+        if unknown:
+            sys.exit(f"No such outputs: {', '.join(unknown)}")
+        results = asyncio.run(
+            run(app, page, pinned, args.panels, repeat=args.repeat, sessions=args.sessions)
+        )
+
+    budgets = load_baseline(args.budgets)
+    overruns = check_budgets(results, budgets)
+    regressions = compare_to_baseline(
+        results, load_baseline(args.baseline), METRICS, threshold=args.threshold
+    )
+    print_report(results, COLUMNS, regressions)
+    for case, p95, budget in overruns:
+        print(f"OVER BUDGET {case} p95_ms: {p95:g} > {budget:g}")
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions or overruns:
+        sys.exit(1)
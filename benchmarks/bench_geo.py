@@ -0,0 +1,226 @@
+# Benchmarks for RallyGeoTools on the bundled rally route geometries
+#
+# Each operation is run over every stage route in resources/*.json (or an
+# evenly spaced sample of them), and reported as throughput (route vertices
+# per second) and the median and p95 latency per stage, compared against
+# a baseline.
+#
+# Usage:
+#   python benchmarks/bench_geo.py [ops ...] [--max-stages 50] [--save-baseline] [--threshold 0.25]
+#
+# Some operations reproject per vertex or per point, so a full corpus run
+# takes a while; compare runs made with the same --max-stages and --points.
+# Exits with status 1 if any operation has regressed against the baseline,
+# or if any route file fails to load.
+import json
+import logging
+import sys
+from pathlib import Path
+
+import numpy as np
+from pandas import DataFrame
+
+from _harness import (
+    BENCH_DIR,
+    REGRESSION_THRESHOLD,
+    ROOT,
+    compare_to_baseline,
+    load_baseline,
+    percentile,
+    print_report,
+    save_baseline,
+    time_call,
+)
+
+import geopandas as gpd
+from shapely.geometry import LineString
+
+from wrcapi_rallydj.data_api import simple_stage_list
+from wrcapi_rallydj.geotools import RallyGeoTools
+
+RESOURCES_DIR = ROOT / "resources"
+BASELINE = BENCH_DIR / "baseline_geo.json"
+
+COLUMNS = ["stages", "vertices", "vertices_per_s", "median_ms", "p95_ms"]
+# The metrics checked for regressions
+METRICS = ["vertices_per_s", "p95_ms"]
+HIGHER_IS_BETTER = ["vertices_per_s"]
+
+# Split a route into sections of this length (m) for route_N_segments_meters
+SEGMENT_METERS = 1000
+# Maximum distance (m) between points for smooth_geojson_route
+SMOOTH_METERS = 10
+
+
+def load_corpus(resources=RESOURCES_DIR):
+    """The route GeoJSON for each event, as {event: FeatureCollection}."""
+    corpus = {}
+    for path in sorted(Path(resources).glob("*.json")):
+        gj = json.loads(path.read_text())
+        gj = gj[0] if isinstance(gj, list) else gj
+        for feature in gj["features"]:
+            # Stage lists as the data API client reads them
+            feature["properties"]["stages"] = simple_stage_list(
+                feature["properties"].get("name", "")
+            )
+        corpus[path.stem] = gj
+    return corpus
+
+
+def corpus_gdfs(geotools, corpus):
+    """
+    The stages geodataframe for each event, as {event: gdf}, and a list of
+    the events whose routes can't be read (eg badly behaved stage names).
+    """
+    gdfs, failed = {}, []
+    for event, gj in corpus.items():
+        try:
+            gdfs[event] = geotools.geojson_to_gpd(gj)
+        except Exception as e:
+            failed.append((event, repr(e)))
+    return gdfs, failed
+
+
+def corpus_stages(gdfs):
+    """
+    The stage routes in the corpus, as a list of dicts with the event stages
+    geodataframe, the route's index in it, its line, vertex count and length (m).
+    """
+    stages = []
+    for event, gdf in gdfs.items():
+        for idx, line in gdf.geometry.items():
+            if not isinstance(line, LineString) or len(line.coords) < 2:
+                continue
+            utm_crs = gpd.GeoSeries([line], crs="EPSG:4326").estimate_utm_crs()
+            length = gpd.GeoSeries([line], crs="EPSG:4326").to_crs(utm_crs).length.iloc[0]
+            stages.append(
+                dict(
+                    name=f"{event}/{gdf.loc[idx, 'name']}",
+                    gdf=gdf,
+                    index=idx,
+                    line=line,
+                    vertices=len(line.coords),
+                    length=length,
+                )
+            )
+    return stages
+
+
+def sample(items, n=None):
+    """An evenly spaced sample of n items (or all of them)."""
+    if not n or n >= len(items):
+        return items
+    return [items[int(i)] for i in np.linspace(0, len(items) - 1, n)]
+
+
+def route_points(line, n=10):
+    """A dataframe of n lat/lon points on a route, as from a telemetry feed."""
+    coords = sample(list(line.coords), n)
+    return DataFrame({"lon": [c[0] for c in coords], "lat": [c[1] for c in coords]})
+
+
+def bench_ops(geotools):
+    """The benchmarked per stage operations, as {name: fn(stage)}."""
+    return {
+        "cut_line_by_distance_meters": lambda stage: geotools.cut_line_by_distance_meters(
+            stage["line"], stage["length"] * 0.25, stage["length"] * 0.75
+        ),
+        "route_N_segments_meters": lambda stage: geotools.route_N_segments_meters(
+            stage["line"],
+            list(np.arange(SEGMENT_METERS, stage["length"], SEGMENT_METERS)),
+            toend=True,
+        ),
+        "smooth_geojson_route": lambda stage: geotools.smooth_geojson_route(
+            stage["line"], max_distance_meters=SMOOTH_METERS
+        ),
+        "enrich_df_with_route_distances": lambda stage: geotools.enrich_df_with_route_distances(
+            stage["points"], stage["gdf"], stage["index"]
+        ),
+    }
+
+
+def summarise_op(durations, vertices):
+    """Throughput and per stage latency for an operation's runs."""
+    ms = [d * 1000 for d in durations]
+    return dict(
+        stages=len(durations),
+        vertices=sum(vertices),
+        vertices_per_s=round(sum(vertices) / sum(durations)) if sum(durations) else None,
+        median_ms=round(float(np.median(ms)), 2),
+        p95_ms=round(percentile(ms, 95), 2),
+    )
+
+
+def run(corpus, ops=None, max_stages=None, points=10):
+    """The results for each operation, and the events whose routes failed to load."""
+    geotools = RallyGeoTools()
+    results = {}
+    gdfs, failed = corpus_gdfs(geotools, corpus)
+
+    if not ops or "geojson_to_gpd" in ops:
+        durations, vertices = [], []
+        for gj in [corpus[event] for event in gdfs]:
+            (duration,) = time_call(lambda: geotools.geojson_to_gpd(gj))
+            durations.append(duration)
+            vertices.append(
+                sum(len(list(geotools.explode(f["geometry"]["coordinates"]))) for f in gj["features"])
+            )
+        results["geojson_to_gpd"] = summarise_op(durations, vertices)
+
+    stages = sample(corpus_stages(gdfs), max_stages)
+    for stage in stages:
+        stage["points"] = route_points(stage["line"], points)
+    for name, fn in bench_ops(geotools).items():
+        if ops and name not in ops:
+            continue
+        durations = []
+        for stage in stages:
+            (duration,) = time_call(lambda: fn(stage))
+            durations.append(duration)
+        results[name] = summarise_op(durations, [s["vertices"] for s in stages])
+    return results, failed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark RallyGeoTools.")
+    parser.add_argument("ops", nargs="*", help="Only run these operations")
+    parser.add_argument("--resources", default=str(RESOURCES_DIR))
+    parser.add_argument(
+        "--max-stages", type=int, default=None, help="Sample this many stage routes"
+    )
+    parser.add_argument(
+        "--points", type=int, default=10, help="Points per route to enrich"
+    )
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    corpus = load_corpus(args.resources)
+    results, failed = run(
+        corpus,
+        ops=args.ops,
+        max_stages=args.max_stages,
+        points=args.points,
+    )
+    regressions = compare_to_baseline(
+        results,
+        load_baseline(args.baseline),
+        METRICS,
+        threshold=args.threshold,
+        higher_is_better=HIGHER_IS_BETTER,
+    )
+    print_report(results, COLUMNS, regressions)
+    # Routes that can't be read aren't benchmarked, so count as failures
+    for event, error in failed:
+        print(f"FAILED {event}: {error}")
+    if failed:
+        print(f"{len(failed)} of {len(corpus)} route files failed to load")
+    if args.save_baseline and not failed:
+        save_baseline(args.baseline, results)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions or failed:
+        sys.exit(1)
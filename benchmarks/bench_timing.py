@@ -0,0 +1,147 @@
+# Benchmarks for the timing client's hot read paths
+#
+# Each path is timed cold (a new client on a fresh copy of the fixture db)
+# and warm (repeated calls on the same client), with the peak memory and
+# number of allocations for a warm call, and compared against a baseline.
+#
+# Usage:
+#   python benchmarks/bench_timing.py [--repeat 20] [--save-baseline] [--threshold 0.25]
+#
+# With --query-report, the slowest queries (with their plans) are listed too.
+#
+# Exits with status 1 if any path has regressed against the baseline.
+import logging
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from _harness import (
+    BENCH_DIR,
+    REGRESSION_THRESHOLD,
+    compare_to_baseline,
+    load_baseline,
+    measure_memory,
+    print_report,
+    save_baseline,
+    summarise,
+    time_call,
+)
+from fixtures import SEASON_DB, build_season_fixture, fixture_events
+
+from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+
+BASELINE = BENCH_DIR / "baseline_timing.json"
+
+COLUMNS = ["cold_ms", "median_ms", "p95_ms", "peak_kib", "allocations"]
+# The metrics checked for regressions
+METRICS = ["cold_ms", "median_ms", "peak_kib"]
+
+
+def make_client(fixture, workdir):
+    """A client, offline, on a fresh copy of the fixture db, set to the last event."""
+    dbname = Path(tempfile.mkdtemp(dir=workdir)) / "bench.db"
+    shutil.copy(fixture, dbname)
+    wrc = WRCTimingResultsAPIClientV2(dbname=str(dbname), liveCatchup=False)
+    wrc.api_client.offline = True
+    wrc.eventId, wrc.rallyId, wrc.itineraryId = fixture_events(fixture)[-1]
+    return wrc
+
+
+def bench_cases(wrc):
+    """The benchmarked calls, as {name: fn}, for a client's current event."""
+    stages = wrc.getCompletedStages()
+    stageIds = list(stages)
+    # A stage part way through the rally, and the last stage
+    stageId, lastStageId = stageIds[len(stageIds) // 2], stageIds[-1]
+    wrc.stageId = stageId
+
+    split_times_wide = wrc.getSplitTimesWide(stageId=stageId, extended=True)
+    rebase_driver = split_times_wide["carNo"].iloc[0]
+
+    return {
+        "getStageTimes": lambda: wrc.getStageTimes(stageId=stageId, raw=False),
+        "getStageTimes[P2]": lambda: wrc.getStageTimes(
+            stageId=stageId, priority="P2", raw=False
+        ),
+        "getSplitTimesWide": lambda: wrc.getSplitTimesWide(
+            stageId=stageId, extended=True
+        ),
+        "getScaledSplits[pace]": lambda: wrc.getScaledSplits(stageId, None, "pace"),
+        "rebase_splits_wide_with_ult": lambda: wrc.rebase_splits_wide_with_ult(
+            split_times_wide, rebase_driver
+        ),
+        "getStageOverallWide": lambda: wrc.getStageOverallWide(
+            stageId=lastStageId, completed=True, typ="position"
+        ),
+        "getStageOverallResults[completed]": lambda: wrc.getStageOverallResults(
+            stageId=lastStageId, completed=True, raw=False
+        ),
+    }
+
+
+def run(fixture, repeat=20, cases=None, query_report=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        names = list(bench_cases(make_client(fixture, workdir)))
+        for name in names:
+            if cases and name not in cases:
+                continue
+            # Cold: the first call on a new client and db
+            wrc = make_client(fixture, workdir)
+            fn = bench_cases(wrc)[name]
+            if query_report:
+                # Explain every query the case runs
+                wrc.db_manager.query_log.reset()
+                wrc.db_manager.query_log.threshold = 0
+            (cold,) = time_call(fn)
+            # Warm: repeated calls on the same client
+            warm = time_call(fn, repeat=repeat)
+            peak_kib, allocations = measure_memory(fn)
+            results[name] = dict(
+                cold_ms=round(cold * 1000, 2),
+                **summarise(warm),
+                peak_kib=peak_kib,
+                allocations=allocations,
+            )
+            if query_report:
+                print(f"\nQueries for {name}:")
+                print(wrc.db_manager.query_log.report(top=5))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the timing client.")
+    parser.add_argument("cases", nargs="*", help="Only run these cases")
+    parser.add_argument("--repeat", type=int, default=20, help="Warm repeats")
+    parser.add_argument("--fixture", default=str(SEASON_DB))
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the fixture")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument(
+        "--query-report", action="store_true", help="List each case's top queries"
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.rebuild or not Path(args.fixture).is_file():
+        build_season_fixture(args.fixture)
+
+    results = run(
+        args.fixture,
+        repeat=args.repeat,
+        cases=args.cases,
+        query_report=args.query_report,
+    )
+    regressions = compare_to_baseline(
+        results, load_baseline(args.baseline), METRICS, threshold=args.threshold
+    )
+    print_report(results, COLUMNS, regressions)
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        sys.exit(1)
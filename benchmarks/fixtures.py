@@ -0,0 +1,180 @@
+# Build benchmark fixture databases of realistic size
+#
+# The season fixture is made from the bundled single event db: its event
+# is cloned (with new ids) to make a full season, and every stage is given
+# a full set of split points with split times derived from the stage times.
+#
+# Usage:
+#   python benchmarks/fixtures.py [--events 13] [--splits 12] [--out season.db]
+import random
+import sqlite3
+from pathlib import Path
+
+from _harness import APP_DIR, FIXTURES_DIR
+
+SOURCE_DB = APP_DIR / "wrcRbAPITiming.db"
+SEASON_DB = FIXTURES_DIR / "season.db"
+
+# Ids that aren't specific to an event, so are shared by the cloned events
+SHARED_IDS = {
+    "personId",
+    "driverId",
+    "codriverId",
+    "manufacturerId",
+    "entrantId",
+    "groupId",
+    "seasonId",
+    "championshipId",
+    "countryId",
+    "country.countryId",
+    "timeZoneId",
+    "eventProfileId",
+    "trackingEventId",
+}
+
+# Tables of event data, and how to pick out an event's rows
+EVENT_TABLES = {
+    "season_rounds": "eventId={eventId}",
+    "event_date": "eventId={eventId}",
+    "event_rallies": "eventId={eventId}",
+    "event_classes": "eventId={eventId}",
+    "entries": "eventId={eventId}",
+    "startlists": "eventId={eventId}",
+    "itinerary_legs": "eventId={eventId}",
+    "itinerary_sections": "eventId={eventId}",
+    "itinerary_stages": "eventId={eventId}",
+    "itinerary_controls": "eventId={eventId}",
+    "stage_info": "eventId={eventId}",
+    "stage_controls": "eventId={eventId}",
+    "stage_times": "eventId={eventId}",
+    "stage_overall": "eventId={eventId}",
+    "meta_completed_event_tables": "eventId={eventId}",
+    "meta_completed_stage_tables": "stageId IN (SELECT stageId FROM stage_info WHERE eventId={eventId})",
+}
+
+# Each cloned event's ids are offset by a multiple of this
+ID_OFFSET = 1_000_000
+
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _quoted(cols):
+    return ", ".join(f'"{c}"' for c in cols)
+
+
+def clone_event(conn, eventId, n):
+    """Copy an event's rows as the n'th clone of the event."""
+    offset = n * ID_OFFSET
+    for table, where in EVENT_TABLES.items():
+        cols = _columns(conn, table)
+        if not cols:
+            continue
+        exprs = []
+        for c in cols:
+            if c.endswith("Id") and c not in SHARED_IDS:
+                exprs.append(f'"{c}" + {offset}')
+            elif table == "season_rounds" and c == "name":
+                exprs.append(f"\"name\" || ' {n}'")
+            else:
+                exprs.append(f'"{c}"')
+        conn.execute(
+            f'INSERT OR IGNORE INTO "{table}" ({_quoted(cols)}) '
+            f'SELECT {", ".join(exprs)} FROM "{table}" WHERE {where.format(eventId=eventId)}'
+        )
+
+
+def add_splits(conn, splits=12, seed=1):
+    """Give every stage splits evenly spaced split points, with split times."""
+    rng = random.Random(seed)
+    conn.execute("DELETE FROM split_points")
+    conn.execute("DELETE FROM split_times")
+    stages = conn.execute("SELECT stageId, distance FROM stage_info").fetchall()
+    split_points = []
+    for stageId, distance in stages:
+        for i in range(1, splits + 1):
+            split_points.append(
+                (stageId * 100 + i, stageId, i, round(distance * i / (splits + 1), 2))
+            )
+    conn.executemany(
+        "INSERT INTO split_points (splitPointId, stageId, number, distance) VALUES (?,?,?,?)",
+        split_points,
+    )
+
+    times = conn.execute(
+        "SELECT st.stageId, st.entryId, st.eventId, st.rallyId, st.elapsedDurationMs, si.distance FROM stage_times AS st INNER JOIN stage_info AS si ON si.stageId=st.stageId WHERE st.elapsedDurationMs > 0 ORDER BY st.stageId, st.stageTimeId"
+    ).fetchall()
+    split_times = []
+    road_order = {}
+    for stageId, entryId, eventId, rallyId, elapsedMs, distance in times:
+        road_pos = road_order[stageId] = road_order.get(stageId, 0) + 1
+        start = f"2025-01-01T{8 + road_pos // 30:02d}:{(2 * road_pos) % 60:02d}:00"
+        for i in range(1, splits + 1):
+            # Drivers don't run at an even pace through a stage
+            fraction = i / (splits + 1) * (1 + rng.uniform(-0.02, 0.02))
+            split_times.append(
+                (
+                    int(elapsedMs * fraction),
+                    entryId,
+                    stageId * 100 + i,
+                    (stageId * 100 + i) * 1000 + road_pos,
+                    start,
+                    stageId,
+                    eventId,
+                    rallyId,
+                )
+            )
+    conn.executemany(
+        "INSERT INTO split_times (elapsedDurationMs, entryId, splitPointId, splitPointTimeId, startDateTime, stageId, eventId, rallyId) VALUES (?,?,?,?,?,?,?,?)",
+        split_times,
+    )
+
+
+def build_season_fixture(out=SEASON_DB, events=13, splits=12, source=SOURCE_DB):
+    """Build a full season fixture db; returns its path."""
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.exists():
+        out.unlink()
+    with sqlite3.connect(source) as src:
+        src.execute("VACUUM INTO ?", (str(out),))
+
+    conn = sqlite3.connect(out)
+    # Make sure the db has the current schema additions (views etc)
+    from wrc_rallydj.livetiming_api2 import DatabaseManager
+
+    DatabaseManager(str(out)).conn.close()
+
+    (eventId,) = conn.execute("SELECT eventId FROM event_rallies LIMIT 1").fetchone()
+    for n in range(1, events):
+        clone_event(conn, eventId, n)
+    add_splits(conn, splits=splits)
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return out
+
+
+def fixture_events(path):
+    """The (eventId, rallyId, itineraryId) of each event in a fixture db."""
+    with sqlite3.connect(path) as conn:
+        return conn.execute(
+            "SELECT eventId, rallyId, itineraryId FROM event_rallies ORDER BY eventId"
+        ).fetchall()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build benchmark fixture dbs.")
+    parser.add_argument("--out", default=str(SEASON_DB))
+    parser.add_argument("--events", type=int, default=13, help="Events in the season")
+    parser.add_argument("--splits", type=int, default=12, help="Split points per stage")
+    args = parser.parse_args()
+
+    path = build_season_fixture(args.out, events=args.events, splits=args.splits)
+    with sqlite3.connect(path) as conn:
+        for table in ["stage_info", "entries", "stage_times", "stage_overall", "split_times"]:
+            (n,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+            print(f"{table:<16}{n:>10}")
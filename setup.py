@@ -5,7 +5,7 @@ setup(
     version="0.1.0",
     package_dir={"": "src/shinyapp"},
     packages=["wrc_rallydj"], #"otherpackage": "../../somewhere_else/src",
-    install_requires=["numpy", "pandas", "sqlite_utils", "jupyterlite_simple_cors_proxy"],
+    install_requires=["numpy", "pandas", "parse", "pytz", "requests", "sqlite_utils", "jupyterlite_simple_cors_proxy"],
     author="Tony Hirst",
     author_email="tony.hirst@gmail.com",
     description="RallyDatajunkie package for making requests to WRC live timing, results and data APIs.",
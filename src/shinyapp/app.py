@@ -1,6 +1,14 @@
 from shiny import render, reactive
 from shiny.express import ui, input
 from shiny import ui as uis
+
+# Opt-in reactive graph profiling (set WRC_PROFILE_REACTIVE) and tracing (set
+# WRC_TRACE); it has to be installed before any reactive nodes are declared,
+# or render_widget imported
+from reactive_profiler import install_if_enabled
+
+install_if_enabled()
+
 from wrc_rallydj.utils import (
     enrich_stage_winners,
     format_timedelta,
@@ -14,8 +22,14 @@ from .symbolic_analysis import encode_position_symbols, split_position_related_r
 from datetime import datetime
 from icons import question_circle_fill
 from pandas import DataFrame, isna, to_numeric, to_datetime, NA
-from seaborn import heatmap
-from matplotlib.colors import LinearSegmentedColormap, TwoSlopeNorm
+
+# The plotting and mapping stacks are only imported when a panel first needs them
+from lazy_imports import Lazy, lazy_import
+
+heatmap = lazy_import("seaborn", "heatmap")
+LinearSegmentedColormap, TwoSlopeNorm = lazy_import(
+    "matplotlib.colors", "LinearSegmentedColormap", "TwoSlopeNorm"
+)
 
 import math
 
@@ -39,12 +53,12 @@ from rules_processor import (
     process_rally_overall_rules,
 )
 
-from ipyleaflet import Map, Marker, DivIcon
-import matplotlib.pyplot as plt
+Map, Marker, DivIcon = lazy_import("ipyleaflet", "Map", "Marker", "DivIcon")
+plt = lazy_import("matplotlib.pyplot")
 
-from requests_cache import CachedSession
+CachedSession = lazy_import("requests_cache", "CachedSession")
 
-session = CachedSession(expire_after=5)
+session = Lazy(lambda: CachedSession(expire_after=5), "requests_cache session")
 
 ## Heros and banners
 from .app_heroes import (
@@ -99,11 +113,10 @@ from .interpretations import (
 
 # from itables.widget import ITable
 
-from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+from .app_shared import wrc_core
 
-wrc = WRCTimingResultsAPIClientV2(
-    use_cache=True, backend="memory", expire_after=30, liveCatchup=True
-)
+# Session specific client; the API client, caches and db are shared
+wrc = wrc_core.newSession()
 
 wrcapi = WRCDataAPIClient(usegeo=True)
 
@@ -3709,5 +3722,5 @@ def get_rebased_data():
 
 
 ## Start the data collection
-wrc.seedDB()
+# (the db is seeded once, when the shared core is built)
 update_year_select()
@@ -1,8 +1,12 @@
 # Chart functions as used in shiny app
 from pandas import melt
-from matplotlib import pyplot as plt
-from seaborn import barplot, boxplot, lineplot
-from adjustText import adjust_text
+from lazy_imports import lazy_import
+from wrc_rallydj.tracing import traced
+
+# Plotting libraries are imported when the first chart is drawn
+plt = lazy_import("matplotlib.pyplot")
+barplot, boxplot, lineplot = lazy_import("seaborn", "barplot", "boxplot", "lineplot")
+adjust_text = lazy_import("adjustText", "adjust_text")
 
 
 def empty_plot(title=""):
@@ -13,6 +17,7 @@ def empty_plot(title=""):
     ax.axis("off")
     return ax
 
+@traced(tags=())
 def chart_seaborn_linechart_split_positions(wrc, split_times_wide, split_cols):
     split_times_wide[split_cols] = split_times_wide[split_cols].apply(
         lambda col: col.rank(method="min", ascending=True)
@@ -69,6 +74,7 @@ def chart_seaborn_linechart_split_positions(wrc, split_times_wide, split_cols):
     return ax
 
 
+@traced(tags=())
 def chart_seaborn_barplot_splits(
     wrc,
     split_times_wide,
@@ -120,6 +126,7 @@ def chart_seaborn_barplot_splits(
     return ax
 
 
+@traced(tags=())
 def chart_seaborn_linechart_splits(wrc, stageId, split_times_wide, rebase_driver, max_delta=None):
     insert_point = f"{wrc.SPLIT_PREFIX}1"
     insert_loc = None
@@ -225,6 +232,7 @@ def chart_seaborn_linechart_splits(wrc, stageId, split_times_wide, rebase_driver
     return ax
 
 
+@traced(tags=())
 def chart_plot_split_dists(wrc, scaled_splits_wide, splits_section_view):
     split_cols = wrc.getSplitCols(scaled_splits_wide)
     scaled_splits_long = melt(
@@ -246,12 +254,14 @@ def chart_plot_split_dists(wrc, scaled_splits_wide, splits_section_view):
     return ax
 
 
+@traced(tags=())
 def chart_seaborn_linechart_stage_progress_positions(wrc, overall_times_wide):
     return chart_seaborn_linechart_stage_progress_typ(
         wrc, overall_times_wide, typ="position"
     )
 
 
+@traced(tags=())
 def chart_seaborn_linechart_stage_progress_typ(
     wrc, overall_times_wide, typ="position", greyupper=False
 ):
@@ -344,6 +354,7 @@ def chart_seaborn_linechart_stage_progress_typ(
     return ax
 
 
+@traced(tags=())
 def chart_seaborn_barplot_stagetimes(stage_times_df, rebase_reverse_palette):
     rebase_gap_col = "Rebase Gap (s)"
 
@@ -368,6 +379,7 @@ def chart_seaborn_barplot_stagetimes(stage_times_df, rebase_reverse_palette):
     return ax
 
 
+@traced(tags=())
 def chart_plot_driver_stagewins(stage_winners):
     # Get value counts and reset index to create a plotting dataframe
     stage_counts = (
@@ -0,0 +1,54 @@
+# Objects shared by every session of the app
+#
+# Shiny express re-runs app.py for each new session, but modules that
+# it imports are only loaded once per process. So the timing client core,
+# with its API caches, db connection and background refresh worker, lives
+# here, and each session takes a lightweight client of its own from it.
+import os
+from pathlib import Path
+
+from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+
+# Seasons, rounds, championships and completed event results, as built by
+#   python -m wrc_rallydj.seed_db --out wrc_seed.db
+SEED_DB = str(Path(__file__).parent / "wrc_seed.db")
+
+# An archive site serves past seasons from an immutable db, with no API calls
+ARCHIVE_DB = os.environ.get("WRC_ARCHIVE_DB")
+
+if ARCHIVE_DB:
+    wrc_core = WRCTimingResultsAPIClientV2(dbname=ARCHIVE_DB, archive=True)
+else:
+    # With WRC_WRITE_BEHIND set, API results are written to the db by a
+    # background writer (reads of just fetched tables still wait for it)
+    wrc_core = WRCTimingResultsAPIClientV2(
+        use_cache=True,
+        backend="memory",
+        expire_after=30,
+        liveCatchup=True,
+        writeBehind=bool(os.environ.get("WRC_WRITE_BEHIND")),
+    )
+
+# Point the app at a replay server, and / or record the API responses
+#   python -m wrc_rallydj.replay serve rally.jsonl --speed 10 --simulate
+if os.environ.get("WRC_API_BASE"):
+    wrc_core.api_client.RED_BULL_LIVETIMING_API_BASE = os.environ["WRC_API_BASE"]
+if os.environ.get("WRC_RECORD"):
+    from wrc_rallydj.replay import ResponseRecorder
+
+    wrc_core.api_client.recorder = ResponseRecorder(os.environ["WRC_RECORD"])
+
+# Seed the db once per process, rather than for every session;
+# each session starts from the core's season
+wrc_core.seedDB(seed=SEED_DB)
+
+# Expose the fetch, cache and db write metrics as Prometheus text on a port,
+# and / or log a summary of them every so many seconds
+if os.environ.get("WRC_METRICS_PORT"):
+    from wrc_rallydj.metrics import REGISTRY
+
+    REGISTRY.serve(int(os.environ["WRC_METRICS_PORT"]))
+if os.environ.get("WRC_METRICS_LOG"):
+    from wrc_rallydj.metrics import REGISTRY
+
+    REGISTRY.log_periodically(float(os.environ["WRC_METRICS_LOG"]))
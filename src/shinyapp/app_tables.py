@@ -1,6 +1,10 @@
 from pandas import DataFrame, isna
-from matplotlib.colors import LinearSegmentedColormap, TwoSlopeNorm
-from seaborn.utils import relative_luminance
+from lazy_imports import lazy_import
+
+LinearSegmentedColormap, TwoSlopeNorm = lazy_import(
+    "matplotlib.colors", "LinearSegmentedColormap", "TwoSlopeNorm"
+)
+relative_luminance = lazy_import("seaborn.utils", "relative_luminance")
 
 
 def df_color_gradient_styler(
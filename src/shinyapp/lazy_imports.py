@@ -0,0 +1,150 @@
+# Deferred imports for the app
+#
+# The plotting (seaborn, matplotlib, adjustText) and map (ipyleaflet,
+# geopandas, shapely) stacks are slow to import, particularly under
+# pyodide, and most sessions never open a panel that needs them.
+# Lazy stand-ins for these imports only load the module on first use.
+#
+# The import time budget for the app can be reported with:
+#   python lazy_imports.py [--budget MS] [module ...]
+import importlib
+import subprocess
+import sys
+import time
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+# Time (s) taken by each deferred import when it was first used
+IMPORT_TIMES = {}
+
+# Modules the app imports at startup, or defers, that we want to keep an eye on
+APP_MODULES = [
+    "pandas",
+    "shiny",
+    "shinywidgets",
+    "inflect",
+    "wrc_rallydj.livetiming_api2",
+    "wrcapi_rallydj.data_api",
+    "wrcapi_rallydj.geotools",
+    "seaborn",
+    "matplotlib.pyplot",
+    "adjustText",
+    "ipyleaflet",
+    "requests_cache",
+]
+
+
+def timed_import(module):
+    """Import a module, noting how long it took if it wasn't already loaded."""
+    if module in sys.modules:
+        return sys.modules[module]
+    t0 = time.perf_counter()
+    _module = importlib.import_module(module)
+    IMPORT_TIMES[module] = time.perf_counter() - t0
+    logger.info(f"Deferred import of {module} took {IMPORT_TIMES[module]:.2f}s")
+    return _module
+
+
+class Lazy:
+    """Stand in for an object that is only created on first use."""
+
+    def __init__(self, factory, label=""):
+        self._factory = factory
+        self._label = label
+        self._obj = None
+
+    def _resolve(self):
+        if self._obj is None:
+            self._obj = self._factory()
+        return self._obj
+
+    def __getattr__(self, attr):
+        # Only called for attributes not found on the proxy itself
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._resolve(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self._obj is not None else "deferred"
+        return f"<Lazy {self._label} ({state})>"
+
+
+def lazy_import(module, *names):
+    """
+    Deferred equivalent of `import module` or `from module import name, ...`
+
+    Returns a single stand in for `import module` or a single name,
+    else a tuple of stand ins, one per name.
+    """
+    if not names:
+        return Lazy(lambda: timed_import(module), module)
+    stand_ins = tuple(
+        Lazy(lambda name=name: getattr(timed_import(module), name), f"{module}.{name}")
+        for name in names
+    )
+    return stand_ins[0] if len(stand_ins) == 1 else stand_ins
+
+
+def import_time_report(modules=None, budget_ms=None):
+    """
+    Break down the cold import time of some modules by top level package.
+
+    Runs the imports in a fresh interpreter with `-X importtime`, so it
+    isn't available under pyodide; use IMPORT_TIMES there.
+
+    Returns a list of (package, cumulative ms, over budget) tuples, slowest first.
+    """
+    modules = modules if modules else APP_MODULES
+    cmd = "\n".join(
+        f"try:\n    import {m}\nexcept ImportError:\n    pass" for m in modules
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", cmd],
+        capture_output=True,
+        text=True,
+    )
+    # Lines look like: import time:  self [us] | cumulative | imported package
+    packages = {m.split(".")[0] for m in modules}
+    totals = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented; we just want the top level ones
+        if len(name) - len(name.lstrip()) == 1:
+            package = name.strip().split(".")[0]
+            if package not in packages:
+                # Interpreter start up imports, eg site, encodings
+                continue
+            totals[package] = totals.get(package, 0) + int(cumulative) / 1000
+    report = [
+        (package, round(ms, 1), bool(budget_ms) and ms > budget_ms)
+        for package, ms in totals.items()
+    ]
+    return sorted(report, key=lambda r: r[1], reverse=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report app import times.")
+    parser.add_argument("modules", nargs="*", help="Modules to import")
+    parser.add_argument(
+        "--budget", type=float, default=None, help="Per package budget (ms)"
+    )
+    args = parser.parse_args()
+
+    report = import_time_report(args.modules, budget_ms=args.budget)
+    total = sum(ms for _, ms, _ in report)
+    for package, ms, over in report:
+        flag = "  OVER BUDGET" if over else ""
+        print(f"{package:<30}{ms:>10.1f} ms{flag}")
+    print(f"{'TOTAL':<30}{total:>10.1f} ms")
+    if any(over for _, _, over in report):
+        sys.exit(1)
@@ -1,15 +1,13 @@
-import kml2geojson
 from ipyleaflet import Map
 
 from shinywidgets import render_widget 
 import requests
 
-from io import StringIO
+from wrcapi_rallydj.kmltools import read_kml_placemarks, placemarks_to_geojson
 
 
 def kml_url_to_json(kml_url):
-    text = StringIO(requests.get(kml_url).text)
-    return kml2geojson.main.convert(text)
+    return placemarks_to_geojson(read_kml_placemarks(requests.get(kml_url).content))
 
 # ## Stage Metadata From JSON
 #
@@ -0,0 +1,368 @@
+# Opt-in profiling and tracing of the app's reactive graph
+#
+# With WRC_PROFILE_REACTIVE set, every @reactive.calc, @reactive.effect and
+# @render.* (and @render_widget) node declared after install() is wrapped
+# so that each time it runs we record, per session:
+#   - the run count and wall time (total, and self time less nested calcs);
+#   - the inputs that had changed since the previous node run, ie the likely
+#     invalidating inputs;
+#   - how many runs returned a result identical to the node's previous one,
+#     which is recomputation that was wasted.
+# When the session ends, a summary table is logged and, if WRC_PROFILE_REACTIVE
+# is a directory, written there along with a folded stack file
+# (<session>.folded, for flamegraph.pl or speedscope).
+#
+# With WRC_TRACE set, each node run is also traced as a span, tagged with
+# the session id, so that the spans nested in it (API fetches, db reads, ...)
+# give a per-render breakdown of where the time goes (see wrc_rallydj.tracing).
+#
+# @render.express nodes are not wrapped (their bodies are rewritten by shiny),
+# and render.plot timings only cover building the figure, not rendering it.
+#
+# Summarise the folded stacks from several sessions with:
+#   python reactive_profiler.py [--top 30] DIR
+import contextvars
+import functools
+import inspect
+import os
+import pickle
+import time
+from collections import Counter
+from pathlib import Path
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+# The node decorators that are wrapped, by module attribute
+RENDERERS = [
+    "ui",
+    "data_frame",
+    "plot",
+    "table",
+    "text",
+    "code",
+    "image",
+    "download",
+]
+
+# Profiles by session id
+PROFILES = {}
+
+# The nodes running in the current task, outermost first
+_frames = contextvars.ContextVar("reactive_profiler_frames", default=())
+
+_installed = False
+
+
+def fingerprint(value):
+    """A hashable fingerprint of a node result, or None if it can't be had cheaply."""
+    from pandas import DataFrame, Series
+    from pandas.util import hash_pandas_object
+
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return (type(value).__name__, value)
+    if isinstance(value, (DataFrame, Series)):
+        try:
+            columns = tuple(value.columns) if isinstance(value, DataFrame) else value.name
+            return (columns, value.shape, int(hash_pandas_object(value).sum()))
+        except TypeError:
+            # Unhashable cell values (eg lists)
+            return None
+    if isinstance(value, (tuple, list)):
+        parts = tuple(fingerprint(v) for v in value)
+        return None if None in parts else (type(value).__name__, parts)
+    if isinstance(value, dict):
+        parts = tuple((k, fingerprint(v)) for k, v in value.items())
+        return None if any(p is None for _, p in parts) else ("dict", parts)
+    try:
+        return hash(pickle.dumps(value))
+    except Exception:
+        return None
+
+
+class NodeStats:
+    def __init__(self, kind):
+        self.kind = kind
+        self.runs = 0
+        self.total = 0
+        self.self_time = 0
+        self.identical = 0
+        self.errors = 0
+        self.triggers = Counter()
+        self.last = None
+
+
+class SessionProfile:
+    """The node stats, and folded stack times, for a session."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.started = time.time()
+        self.nodes = {}
+        self.folded = Counter()
+        self.inputs = {}
+        self.changed = ()
+
+    def input_changes(self, session):
+        """The inputs that changed since we last looked, or else those
+        that changed before then (nodes run in the same flush share them)."""
+        from shiny import reactive
+
+        # Inputs._map is private to shiny; without it, there's no input attribution
+        inputs = getattr(session.input, "_map", None)
+        if not isinstance(inputs, dict):
+            return ()
+        values = {}
+        with reactive.isolate():
+            for name, value in inputs.items():
+                try:
+                    values[name] = value() if value.is_set() else None
+                except Exception:
+                    values[name] = None
+        changed = tuple(
+            sorted(k for k in values if self.inputs.get(k, None) != values[k])
+        )
+        self.inputs = values
+        if changed:
+            self.changed = changed
+        return self.changed
+
+    def record(self, name, kind, path, duration, child_time, result, error, triggers):
+        stats = self.nodes.get(name)
+        if stats is None:
+            stats = self.nodes[name] = NodeStats(kind)
+        stats.runs += 1
+        stats.total += duration
+        stats.self_time += duration - child_time
+        stats.triggers.update(triggers or ("(none)",))
+        if error:
+            stats.errors += 1
+        else:
+            fp = fingerprint(result)
+            if fp is not None and fp == stats.last:
+                stats.identical += 1
+            stats.last = fp
+        self.folded[";".join(path)] += duration - child_time
+
+    def summary(self, top=None):
+        """A table of the nodes, by total time."""
+        rows = sorted(self.nodes.items(), key=lambda kv: -kv[1].total)[:top]
+        lines = [
+            f"Reactive profile for session {self.session_id} "
+            f"({time.time() - self.started:.0f}s)",
+            f"{'node':<48}{'kind':>8}{'runs':>6}{'total_ms':>10}{'self_ms':>10}"
+            f"{'mean_ms':>9}{'same':>6}  triggers",
+        ]
+        for name, s in rows:
+            triggers = ", ".join(f"{t} ({n})" for t, n in s.triggers.most_common(3))
+            lines.append(
+                f"{name:<48}{s.kind:>8}{s.runs:>6}{s.total * 1000:>10.0f}"
+                f"{s.self_time * 1000:>10.0f}{s.total / s.runs * 1000:>9.1f}"
+                f"{s.identical:>6}  {triggers}"
+            )
+        return "\n".join(lines)
+
+    def folded_stacks(self):
+        """Self time (in ms) by stack, in the folded stack format."""
+        return "\n".join(
+            f"{path} {round(t * 1000)}" for path, t in sorted(self.folded.items())
+        )
+
+    def dump(self, outdir=None):
+        logger.info(self.summary(top=30))
+        if outdir:
+            outdir = Path(outdir)
+            outdir.mkdir(parents=True, exist_ok=True)
+            (outdir / f"{self.session_id}.txt").write_text(self.summary() + "\n")
+            (outdir / f"{self.session_id}.folded").write_text(self.folded_stacks() + "\n")
+
+
+def _session_profile():
+    from shiny.session import get_current_session
+
+    session = get_current_session()
+    if session is None:
+        return None, None
+    profile = PROFILES.get(session.id)
+    if profile is None:
+        profile = PROFILES[session.id] = SessionProfile(session.id)
+        outdir = os.environ.get("WRC_PROFILE_REACTIVE")
+        outdir = outdir if outdir and outdir not in ("1", "true", "True") else None
+
+        def _ended():
+            PROFILES.pop(session.id, None)
+            profile.dump(outdir)
+
+        session.on_ended(_ended)
+    return session, profile
+
+
+def profiled(fn, kind):
+    """Wrap a reactive node function to record its runs in the session profile."""
+    name = getattr(fn, "__name__", repr(fn))
+    label = f"{kind}:{name}"
+
+    def _start():
+        session, profile = _session_profile()
+        if profile is None:
+            return None
+        triggers = profile.input_changes(session)
+        frames = _frames.get()
+        # [label, time spent in nested nodes]
+        frame = [label, 0]
+        token = _frames.set(frames + (frame,))
+        return profile, triggers, frames, frame, token, time.perf_counter()
+
+    def _finish(run, result=None, error=False):
+        profile, triggers, frames, frame, token, t0 = run
+        duration = time.perf_counter() - t0
+        _frames.reset(token)
+        path = [f[0] for f in frames] + [label]
+        profile.record(name, kind, path, duration, frame[1], result, error, triggers)
+        if frames:
+            # Our bookkeeping isn't the parent's self time either
+            frames[-1][1] += time.perf_counter() - t0
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            run = _start()
+            if run is None:
+                return await fn(*args, **kwargs)
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                _finish(run, error=True)
+                raise
+            _finish(run, result)
+            return result
+
+    else:
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            run = _start()
+            if run is None:
+                return fn(*args, **kwargs)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                _finish(run, error=True)
+                raise
+            _finish(run, result)
+            return result
+
+    return wrapper
+
+
+def traced_node(fn, kind):
+    """Wrap a reactive node function so each run is a trace span (see
+    wrc_rallydj.tracing), tagged with the session id."""
+    from wrc_rallydj.tracing import span
+
+    label = f"{kind}:{getattr(fn, '__name__', repr(fn))}"
+
+    def _tags():
+        from shiny.session import get_current_session
+
+        session = get_current_session()
+        return {"session": session.id if session is not None else None}
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(label, tags=_tags()):
+                return await fn(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label, tags=_tags()):
+                return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def _node_decorator(decorator, kind, wrap):
+    """Wrap a node decorator, used bare or with arguments, so its function is wrapped."""
+
+    @functools.wraps(decorator, updated=())
+    def wrapped(fn=None, *args, **kwargs):
+        if callable(fn):
+            return decorator(wrap(fn, kind), *args, **kwargs)
+        inner = decorator(*args, **kwargs) if fn is None else decorator(fn, *args, **kwargs)
+        return lambda fn: inner(wrap(fn, kind))
+
+    return wrapped
+
+
+def install(profile=True, trace=False):
+    """Profile, and / or trace, the reactive nodes declared from now on."""
+    global _installed
+    if _installed:
+        return
+    from shiny import reactive, render
+
+    def wrap(fn, kind):
+        if trace:
+            fn = traced_node(fn, kind)
+        if profile:
+            fn = profiled(fn, kind)
+        return fn
+
+    reactive.calc = _node_decorator(reactive.calc, "calc", wrap)
+    reactive.effect = _node_decorator(reactive.effect, "effect", wrap)
+    for renderer in RENDERERS:
+        if hasattr(render, renderer):
+            setattr(
+                render, renderer, _node_decorator(getattr(render, renderer), "render", wrap)
+            )
+    try:
+        import shinywidgets
+
+        shinywidgets.render_widget = _node_decorator(
+            shinywidgets.render_widget, "widget", wrap
+        )
+    except ImportError:
+        pass
+    _installed = True
+    logger.info(f"Reactive node profiling: {profile}, tracing: {trace}")
+
+
+def install_if_enabled():
+    profile = bool(os.environ.get("WRC_PROFILE_REACTIVE"))
+    trace = bool(os.environ.get("WRC_TRACE"))
+    if profile or trace:
+        install(profile=profile, trace=trace)
+
+
+def summarise_folded(paths, top=30):
+    """Total self time (ms) by node over some folded stack files."""
+    totals = Counter()
+    for path in paths:
+        for line in Path(path).read_text().splitlines():
+            stack, _, ms = line.rpartition(" ")
+            if stack:
+                totals[stack.split(";")[-1]] += int(ms)
+    return totals.most_common(top)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Summarise reactive profiles across sessions."
+    )
+    parser.add_argument("dir", help="WRC_PROFILE_REACTIVE output directory")
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args()
+
+    sessions = sorted(Path(args.dir).glob("*.folded"))
+    print(f"{len(sessions)} sessions")
+    for node, ms in summarise_folded(sessions, top=args.top):
+        print(f"{node:<56}{ms:>10} ms")
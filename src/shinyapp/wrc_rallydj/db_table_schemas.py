@@ -507,3 +507,54 @@ CREATE TABLE "meta_completed_event_tables" (
 );
 
 """
+
+# Change counters, bumped whenever dbfy writes to a table.
+# Created separately so it can be added to existing dbs.
+SETUP_TABLE_VERSIONS_Q = """
+CREATE TABLE IF NOT EXISTS "meta_table_versions" (
+  "tableName" TEXT PRIMARY KEY,
+  "version" INTEGER
+);
+"""
+
+SETUP_V2_Q += SETUP_TABLE_VERSIONS_Q
+
+# Ranked views over the stage and overall times.
+# Positions, gaps and diffs within each stage, or within each priority class
+# on a stage, are computed by window functions rather than in pandas.
+# Each view uses a single window, partitioned by event, rally and stage,
+# so SQLite can push a WHERE on those columns down into the view.
+# Rows with no position (eg DNS, DNF) are ranked last.
+_RANKED_SELECT = """
+SELECT {a}.*,
+  ROW_NUMBER() OVER w AS categoryPosition,
+  ROUND({a}.diffFirstMs / 1000.0, 1) AS Gap,
+  ROUND({a}.diffPrevMs / 1000.0, 1) AS Diff,
+  LEAD(ROUND({a}.diffPrevMs / 1000.0, 1)) OVER w AS Chase,
+  {a}.{timeMs} - FIRST_VALUE({a}.{timeMs}) OVER w AS categoryDiffFirstMs,
+  {a}.{timeMs} - LAG({a}.{timeMs}) OVER w AS categoryDiffPrevMs
+FROM {table} AS {a}
+LEFT JOIN entries AS e ON {a}.entryId=e.entryId
+WINDOW w AS (
+  PARTITION BY {a}.eventId, {a}.rallyId, {a}.stageId{by_class}
+  ORDER BY {a}.position IS NULL, {a}.position, {a}.{tiebreak})
+"""
+
+RANKED_VIEWS = {
+    f"{table}{suffix}": _RANKED_SELECT.format(
+        table=table, a=a, timeMs=timeMs, tiebreak=tiebreak, by_class=by_class
+    )
+    for table, a, timeMs, tiebreak in [
+        ("stage_times", "st", "elapsedDurationMs", "stageTimeId"),
+        ("stage_overall", "o", "totalTimeMs", "entryId"),
+    ]
+    for suffix, by_class in [("_ranked", ""), ("_class_ranked", ", e.priority")]
+}
+
+# Created separately so they can be added to existing dbs.
+SETUP_RANKED_VIEWS_Q = "".join(
+    f'CREATE VIEW IF NOT EXISTS "{name}" AS {select};\n'
+    for name, select in RANKED_VIEWS.items()
+)
+
+SETUP_V2_Q += SETUP_RANKED_VIEWS_Q
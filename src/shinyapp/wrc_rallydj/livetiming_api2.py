@@ -10,13 +10,34 @@ logger.setLevel(logging.DEBUG)
 
 from urllib.parse import urljoin
 from datetime import datetime, timedelta, date
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+import atexit
+import contextvars
+import copy
+import queue
+import threading
+import time
+import sys
+import requests
+from requests.adapters import HTTPAdapter
 from sqlite_utils import Database
 from jupyterlite_simple_cors_proxy.cacheproxy import CorsProxy, create_cached_proxy
 import os
 import re
+from pathlib import Path
 import sqlite3
-from wrc_rallydj.db_table_schemas import SETUP_V2_Q
+from wrc_rallydj.db_table_schemas import (
+    SETUP_V2_Q,
+    SETUP_TABLE_VERSIONS_Q,
+    SETUP_RANKED_VIEWS_Q,
+    RANKED_VIEWS,
+)
 from wrc_rallydj.utils import is_date_in_range, dateNow, timeNow
+from wrc_rallydj.metrics import REGISTRY, BYTES_BUCKETS, endpoint_template
+from wrc_rallydj.query_log import QueryLog
+from wrc_rallydj.tracing import span, traced
 from pandas import (
     read_sql,
     DataFrame,
@@ -30,27 +51,106 @@ from pandas import (
     isna,
 )
 
-from numpy import nan, where
+from numpy import nan
+
+
+# A batch of rows bound for a table, as queued for the write-behind writer
+RowBatch = namedtuple("RowBatch", ["seq", "table", "records", "pk", "if_exists", "clear"])
+
+
+class WriteBehindError(Exception):
+    """Rows queued for the write-behind writer could not be written."""
+
+
+class _GroupedConnection:
+    """Wrap a connection so that sqlite_utils' `with conn:` blocks don't commit.
+    This lets several table writes share one transaction."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
 
 
 class DatabaseManager:
-    def __init__(self, dbname, newdb=False, dbReadOnly=False):
+    # How many times the writer tries a transaction before writing its
+    # tables one at a time through the synchronous path
+    WRITE_ATTEMPTS = 2
+
+    def __init__(
+        self, dbname, newdb=False, dbReadOnly=False, archive=False, writeBehind=False
+    ):
         self.dbname = dbname
+        # An archive db is never written to, by us or anyone else
+        self.archive = archive
+        # The connection may be shared with background refresh threads,
+        # so serialise access to it
+        self.lock = threading.RLock()
+        # Per thread connections for an archive db
+        self._local = threading.local()
+        self.dbReadOnly = dbReadOnly or archive
         self.conn = self.setup_db(newdb=newdb)
-        self.dbReadOnly = dbReadOnly
+        # Seed databases already loaded into this one
+        self._seeded = set()
+        # Table change counters, as last read, and the data_version they were read at
+        self._table_versions = {}
+        self._data_version = None
+        # Ranked views, and whether the db has them
+        self._views = {}
+        # db write metrics (see wrc_rallydj.metrics)
+        self.metrics = REGISTRY
+        # Query timings, and plans for the slow ones
+        self.query_log = QueryLog()
+
+        # Write-behind: dbfy() queues rows for a single writer thread
+        # that commits them on its own connection (not available under pyodide)
+        self.writeBehind = (
+            writeBehind and not self.dbReadOnly and sys.platform != "emscripten"
+        )
+        self._queue = queue.SimpleQueue()
+        self._queued_seq = 0
+        self._committed_seq = 0
+        self._committed = threading.Condition()
+        # Tables the writer could not write, as {table: (last lost seq, error)}
+        self.write_failures = {}
+        if self.writeBehind:
+            # Let readers carry on while the writer commits
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            threading.Thread(
+                target=self._writer, name="wrc-db-writer", daemon=True
+            ).start()
+            atexit.register(self.flush)
 
     def setup_db(self, newdb=False):
         logger.info("Initialising the database...")
+        if self.archive:
+            if not os.path.isfile(self.dbname):
+                raise FileNotFoundError(f"No archive database {self.dbname}")
+            return self._archive_conn()
         if os.path.isfile(self.dbname) and newdb:
             os.remove(self.dbname)
 
         if not os.path.isfile(self.dbname):
             newdb = True
 
-        conn = sqlite3.connect(self.dbname, timeout=10)
+        conn = sqlite3.connect(self.dbname, timeout=10, check_same_thread=False)
 
         if newdb:
             self.initialize_db(conn)
+        elif not self.dbReadOnly:
+            # Older dbs predate the table change counters and ranked views
+            # (a read only db is left as it is, and view() falls back to subqueries)
+            try:
+                conn.executescript(SETUP_TABLE_VERSIONS_Q + SETUP_RANKED_VIEWS_Q)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Could not update db schema: {e}")
 
         return conn
 
@@ -59,13 +159,66 @@ class DatabaseManager:
         c = conn.cursor()
         c.executescript(SETUP_V2_Q)
 
+    def _archive_conn(self):
+        """Return this thread's immutable, read only connection to an archive db."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"{Path(self.dbname).resolve().as_uri()}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True)
+            self._local.conn = conn
+        return conn
+
     def read_sql(self, query):
-        return read_sql(query, self.conn)
+        if self.archive:
+            # Nothing can change an immutable db, so there's no need to lock
+            return self._timed_read_sql(query, self._archive_conn())
+        if self.writeBehind:
+            self._wait_for_own_writes(query)
+        with self.lock:
+            return self._timed_read_sql(query, self.conn)
+
+    def _timed_read_sql(self, query, conn):
+        t0 = time.perf_counter()
+        with span("db.read_sql", query=query):
+            df = read_sql(query, conn)
+        self.query_log.record(query, time.perf_counter() - t0, conn=conn, rows=len(df))
+        return df
 
-    def dbfy(self, df, table, if_exists="upsert", pk=None, index=False, clear=False):
+    def dbfy(
+        self, df, table, if_exists="upsert", pk=None, index=False, clear=False, alter=False
+    ):
+        """
+        Write a dataframe to a db table.
+
+        Columns the table doesn't have are dropped, unless alter is set,
+        in which case they are added to the table (upsert only).
+        """
         if self.dbReadOnly:
             return
 
+        # Schema changes are always made straight away
+        if self.writeBehind and not alter:
+            with span("db.enqueue", table=table, rows=len(df)):
+                self._enqueue(df, table, if_exists=if_exists, pk=pk, clear=clear)
+            return
+
+        with span("db.dbfy", table=table, rows=len(df)), self.lock, self.metrics.timer(
+            "wrc_db_write_seconds", table=table, writer="sync"
+        ):
+            self._dbfy(
+                df,
+                table,
+                if_exists=if_exists,
+                pk=pk,
+                index=index,
+                clear=clear,
+                alter=alter,
+            )
+
+    def _dbfy(
+        self, df, table, if_exists="upsert", pk=None, index=False, clear=False, alter=False
+    ):
+
         if if_exists == "upsert" and not pk:
             return
 
@@ -80,20 +233,273 @@ class DatabaseManager:
             df.drop(columns="", inplace=True)
 
         for c in df.columns:
-            if c not in cols:
+            if c not in cols and not alter:
                 df.drop(columns=[c], inplace=True)
 
         if if_exists == "upsert":
             logger.info(f"Upserting {table}...")
             DB = Database(self.conn)
-            DB[table].upsert_all(df.to_dict(orient="records"), pk=pk)
+            DB[table].upsert_all(df.to_dict(orient="records"), pk=pk, alter=alter)
         else:
             logger.info(f"Inserting {table} (if_exists: {if_exists})...")
             df.to_sql(table, self.conn, if_exists=if_exists, index=index)
 
+        with self.conn:
+            self._bump_table_version(self.conn, table)
+        # data_version doesn't change for our own commits, so force a re-read
+        self._data_version = None
+
+    def _enqueue(self, df, table, if_exists="upsert", pk=None, clear=False):
+        if if_exists == "upsert" and not pk:
+            return
+        if if_exists == "replace":
+            clear = True
+            if_exists = "append"
+        # Snapshot the rows now; the caller may go on to modify the frame
+        records = df.drop(columns="", errors="ignore").to_dict(orient="records")
+        pk = (pk,) if isinstance(pk, str) else tuple(pk) if pk else None
+        with self._committed:
+            self._queued_seq += 1
+            seq = self._queued_seq
+            self._queue.put(RowBatch(seq, table, records, pk, if_exists, clear))
+        # Note what this thread is waiting to see written
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            pending = self._local.pending = {}
+        pending[table] = seq
+
+    def _wait_for_own_writes(self, query):
+        """Block until any rows this thread queued for tables in the query are committed."""
+        pending = getattr(self._local, "pending", None)
+        if not pending:
+            return
+        seq = max((s for t, s in pending.items() if t in query), default=0)
+        if seq > self._committed_seq:
+            with self._committed:
+                self._committed.wait_for(lambda: self._committed_seq >= seq)
+        lost = []
+        for t in [t for t, s in pending.items() if s <= self._committed_seq]:
+            failure = self.write_failures.get(t)
+            if failure and failure[0] >= pending[t]:
+                lost.append((t, failure[1]))
+            del pending[t]
+        if lost:
+            raise WriteBehindError(
+                "; ".join(f"Rows queued for {t} were not written: {e}" for t, e in lost)
+            )
+
+    def flush(self):
+        """Wait until everything queued so far has been committed (or has failed;
+        see write_failures)."""
+        if not self.writeBehind:
+            return
+        with self._committed:
+            seq = self._queued_seq
+            self._committed.wait_for(lambda: self._committed_seq >= seq)
+
+    @staticmethod
+    def _coalesce(batches):
+        """Merge queued batches per table, keeping the last version of each row."""
+        merged = {}
+        for batch in batches:
+            key = (batch.table, batch.if_exists, batch.pk)
+            if batch.clear or key not in merged:
+                # A clear throws away whatever was queued ahead of it
+                merged[key] = {"clear": batch.clear, "rows": {}, "n": 0, "seq": 0}
+            merged[key]["seq"] = max(merged[key]["seq"], batch.seq)
+            rows = merged[key]["rows"]
+            for record in batch.records:
+                if batch.if_exists == "upsert":
+                    rowkey = tuple(record.get(k) for k in batch.pk)
+                else:
+                    rowkey = merged[key]["n"]
+                    merged[key]["n"] += 1
+                rows[rowkey] = record
+        return merged
+
+    def _write_batches(self, conn, DB, cols, merged):
+        """Write coalesced batches to the db in one transaction."""
+        conn.execute("BEGIN")
+        try:
+            for (table, if_exists, pk), group in merged.items():
+                if group["clear"]:
+                    conn.execute(f'DELETE FROM "{table}"')
+                records = self._known_columns(conn, cols, table, group["rows"].values())
+                if not records:
+                    continue
+                logger.info(f"Writing {len(records)} rows to {table} ({if_exists})...")
+                with self.metrics.timer(
+                    "wrc_db_write_seconds", table=table, writer="write_behind"
+                ):
+                    if if_exists == "upsert":
+                        DB[table].upsert_all(records, pk=pk)
+                    else:
+                        DB[table].insert_all(records)
+                self._bump_table_version(conn, table)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _known_columns(self, conn, cols, table, records):
+        """Records cut down to the table's columns, as the sync path does.
+        The columns are re-read if a record has keys we haven't seen, in case
+        the table has since been created or altered (eg by dbfy(alter=True))."""
+        records = list(records)
+        keys = set().union(*records) if records else set()
+        if table not in cols or not keys <= cols[table]:
+            cols[table] = {r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')}
+        return [{k: v for k, v in r.items() if k in cols[table]} for r in records]
+
+    def _write_sync(self, key, group):
+        """Write a coalesced batch through the synchronous dbfy path."""
+        table, if_exists, pk = key
+        with self.lock, self.metrics.timer(
+            "wrc_db_write_seconds", table=table, writer="sync"
+        ):
+            self._dbfy(
+                DataFrame(list(group["rows"].values())),
+                table,
+                if_exists=if_exists,
+                pk=list(pk) if pk else None,
+                clear=group["clear"],
+            )
+
+    def _writer(self):
+        conn = sqlite3.connect(self.dbname, timeout=30)
+        DB = Database(_GroupedConnection(conn))
+        cols = {}
+        while True:
+            batches = [self._queue.get()]
+            # Take everything else queued up so it goes in the same transaction
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            merged = self._coalesce(batches)
+            for attempt in range(1, self.WRITE_ATTEMPTS + 1):
+                try:
+                    self._write_batches(conn, DB, cols, merged)
+                    break
+                except Exception as e:
+                    logger.warning(
+                        f"Write-behind batch failed (attempt {attempt}): {e}"
+                    )
+                    # The schema may have changed under us
+                    cols.clear()
+            else:
+                # Write each table on its own, so one bad table doesn't lose the rest
+                for key, group in merged.items():
+                    try:
+                        self._write_sync(key, group)
+                    except Exception as e:
+                        logger.error(f"Write-behind rows for {key[0]} lost: {e}")
+                        self.metrics.inc("wrc_db_write_errors_total", table=key[0])
+                        self.write_failures[key[0]] = (group["seq"], e)
+            with self._committed:
+                self._committed_seq = max(b.seq for b in batches)
+                self._committed.notify_all()
+
+    @staticmethod
+    def _bump_table_version(conn, table):
+        conn.execute(
+            """INSERT INTO meta_table_versions (tableName, version) VALUES (?, 1)
+            ON CONFLICT(tableName) DO UPDATE SET version=version+1;""",
+            (table,),
+        )
+
+    def table_versions(self, tables):
+        """
+        Return the change counter for each of some tables.
+
+        The counters are bumped by dbfy, whichever process does the writing.
+        They are only re-read when PRAGMA data_version shows that another
+        connection has committed since we last looked, so this is cheap
+        to call before every cache lookup.
+        """
+        if self.archive:
+            # Nothing ever changes
+            return {}
+        if self.writeBehind:
+            # Make sure we see our own queued writes to these tables
+            self._wait_for_own_writes(" ".join(tables))
+        with self.lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                try:
+                    self._table_versions = dict(
+                        self.conn.execute(
+                            "SELECT tableName, version FROM meta_table_versions"
+                        ).fetchall()
+                    )
+                except sqlite3.OperationalError:
+                    # A read only db without the counters table
+                    self._table_versions = {}
+                self._data_version = data_version
+            return {t: self._table_versions.get(t, 0) for t in tables}
+
+    def view(self, name):
+        """
+        Return something to select a ranked view FROM.
+
+        That's the view itself, or, for a db without it (eg an older
+        archive db), the view's query as a subquery.
+        """
+        if name not in self._views:
+            conn = self._archive_conn() if self.archive else self.conn
+            with self.lock:
+                found = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='view' AND name=?",
+                    (name,),
+                ).fetchone()
+            self._views[name] = name if found else f"({RANKED_VIEWS[name]})"
+        return self._views[name]
+
+    def load_seed(self, seed):
+        """
+        Copy the rows of a (read only) seed database into this database.
+
+        Rows we already have are left alone. Returns True if the seed was loaded.
+        """
+        if self.dbReadOnly or not seed or not os.path.isfile(seed):
+            return False
+        with self.lock:
+            if seed in self._seeded:
+                return True
+            logger.info(f"Loading seed database {seed}...")
+            c = self.conn.cursor()
+            c.execute("ATTACH DATABASE ? AS seed", (seed,))
+            try:
+                tables = [
+                    r[0]
+                    for r in c.execute(
+                        "SELECT name FROM seed.sqlite_master WHERE type='table'"
+                    ).fetchall()
+                ]
+                for table in tables:
+                    _cols = [
+                        r[1] for r in c.execute(f'PRAGMA main.table_info("{table}")')
+                    ]
+                    _seed_cols = {
+                        r[1] for r in c.execute(f'PRAGMA seed.table_info("{table}")')
+                    }
+                    cols = ", ".join(f'"{col}"' for col in _cols if col in _seed_cols)
+                    if not cols:
+                        continue
+                    c.execute(
+                        f'INSERT OR IGNORE INTO main."{table}" ({cols}) SELECT {cols} FROM seed."{table}"'
+                    )
+                self.conn.commit()
+            finally:
+                c.execute("DETACH DATABASE seed")
+            self._seeded.add(seed)
+        return True
+
     def cleardbtable(self, table):
-        c = self.conn.cursor()
-        c.execute(f'DELETE FROM "{table}"')
+        with self.lock:
+            c = self.conn.cursor()
+            c.execute(f'DELETE FROM "{table}"')
 
 
 # TO DO
@@ -108,41 +514,311 @@ class APIClient:
 
     ITINERARY_REFRESH_PERIOD = 30
 
-    def __init__(self, db_manager=None, use_cache=False, **cache_kwargs):
+    # The db tables that hold each of the recently referenced feeds
+    FEED_TABLES = {
+        "itinerary_json": [
+            "itinerary_legs",
+            "itinerary_stages",
+            "itinerary_sections",
+            "itinerary_controls",
+        ],
+        "stages_json": ["stage_info", "split_points", "stage_controls"],
+    }
+
+    # Endpoint path templates
+    STUBS = {
+        "stages": "events/{eventId}/stages.json",
+        "entries": "events/{eventId}/rallies/{rallyId}/entries.json",
+        "itinerary": "events/{eventId}/itineraries/{itineraryId}.json",
+        "startlist": "events/{eventId}/startLists/{startListId}.json",
+        "stagetimes": "events/{eventId}/stages/{stageId}/stagetimes.json?rallyId={rallyId}",
+        "splittimes": "events/{eventId}/stages/{stageId}/splittimes.json?rallyId={rallyId}",
+        "results": "events/{eventId}/stages/{stageId}/results.json?rallyId={rallyId}",
+    }
+
+    # Size of the keep-alive connection pool and of the concurrent fetch pool
+    MAX_CONCURRENT_REQUESTS = 8
+    # How long (s) a prefetched response is held waiting to be consumed
+    PREFETCH_TTL = 10
+
+    def __init__(self, db_manager=None, use_cache=False, offline=False, **cache_kwargs):
         self.db_manager = db_manager
+        # If offline, never call the API
+        self.offline = offline
         self.proxy = create_cached_proxy(**cache_kwargs) if use_cache else CorsProxy()
+        # Reuse pooled keep-alive connections rather than a new connection per call
+        self.proxy.session = self._pooled_session(
+            self.proxy.session if use_cache else requests.Session()
+        )
+        # Recently fetched itinerary / stages results, keyed by (feed, key)
         self.lastreferenced = {}
+        self._lastreferenced_lock = threading.Lock()
+        self._executor = None
+        self._prefetched = {}
+        self._prefetched_lock = threading.Lock()
+        # In-flight requests, keyed by url, for single-flight coalescing
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # Optional ResponseRecorder (see wrc_rallydj.replay) for API responses
+        self.recorder = None
+        # Fetch, cache and db write metrics (see wrc_rallydj.metrics)
+        self.metrics = REGISTRY
 
     def dbfy(self, *args, **kwargs):
         self.db_manager.dbfy(*args, **kwargs)
 
+    def _feed_versions(self, feed):
+        if self.db_manager is None:
+            return {}
+        return self.db_manager.table_versions(self.FEED_TABLES.get(feed, []))
+
+    def _recent(self, feed, key, peek=False):
+        """Return a result fetched within the refresh period, else None.
+        A result is dropped if another worker has since written to its tables.
+        A peek just looks, without counting a cache hit or miss."""
+        with self._lastreferenced_lock:
+            cached = self.lastreferenced.get((feed, key))
+        if not cached or (timeNow(typ="s") - cached["t"]) >= self.ITINERARY_REFRESH_PERIOD:
+            if not peek:
+                self.metrics.inc("wrc_cache_total", cache="memory", key=feed, result="miss")
+            return None
+        if cached["versions"] != self._feed_versions(feed):
+            logger.debug(f"Cached {feed} {key} invalidated by a db change")
+            with self._lastreferenced_lock:
+                self.lastreferenced.pop((feed, key), None)
+            if not peek:
+                self.metrics.inc(
+                    "wrc_cache_total", cache="memory", key=feed, result="invalidated"
+                )
+            return None
+        if not peek:
+            self.metrics.inc("wrc_cache_total", cache="memory", key=feed, result="hit")
+        return cached["value"]
+
+    def _remember(self, feed, key, value):
+        versions = self._feed_versions(feed)
+        with self._lastreferenced_lock:
+            self.lastreferenced[(feed, key)] = {
+                "t": timeNow(typ="s"),
+                "value": value,
+                "versions": versions,
+            }
+        return value
+
+    def _pooled_session(self, session):
+        adapter = HTTPAdapter(
+            pool_connections=self.MAX_CONCURRENT_REQUESTS,
+            pool_maxsize=self.MAX_CONCURRENT_REQUESTS,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @staticmethod
+    def canUseThreads():
+        """Threads are not available in the pyodide / shinylive runtime."""
+        return sys.platform != "emscripten"
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.MAX_CONCURRENT_REQUESTS, thread_name_prefix="wrc-api"
+            )
+        return self._executor
+
+    def stub(self, name, **kwargs):
+        """Format an endpoint path from its template."""
+        return self.STUBS[name].format(**kwargs)
+
+    async def _WRC_RedBull_json_async(self, path, base=None):
+        """Return JSON from API without blocking the event loop."""
+        if not self.canUseThreads():
+            return self._WRC_RedBull_json(path, base=base)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), self._WRC_RedBull_json, path, base
+        )
+
+    async def gather_json(self, paths, base=None):
+        """Concurrently fetch several endpoints; returns a {path: json} dict."""
+        paths = list(dict.fromkeys(paths))
+        results = await asyncio.gather(
+            *[self._WRC_RedBull_json_async(path, base=base) for path in paths]
+        )
+        return dict(zip(paths, results))
+
+    def fetch_many(self, paths, base=None):
+        """Synchronous counterpart of gather_json() that is safe to call from
+        inside a running event loop (eg a Shiny reactive calc)."""
+        paths = list(dict.fromkeys(paths))
+        if len(paths) < 2 or not self.canUseThreads():
+            return {path: self._WRC_RedBull_json(path, base=base) for path in paths}
+        executor = self._get_executor()
+        # Run each fetch in a copy of our context, so its trace span nests in ours
+        contexts = [contextvars.copy_context() for _ in paths]
+        results = executor.map(
+            lambda path, ctx: ctx.run(self._WRC_RedBull_json, path, base=base),
+            paths,
+            contexts,
+        )
+        return dict(zip(paths, results))
+
+    def prefetch(self, paths, base=None):
+        """Fetch several endpoints concurrently so that the following
+        _getX() calls are served from the prefetched responses.
+        The parsing and db writes still happen serially on the calling thread."""
+        if self.offline:
+            return
+        base = self.RED_BULL_LIVETIMING_API_BASE if base is None else base
+        t = timeNow(typ="s")
+        fetched = self.fetch_many(paths, base=base)
+        with self._prefetched_lock:
+            for path, json_data in fetched.items():
+                self._prefetched[urljoin(base, path)] = (t, json_data)
+
+    def _pop_prefetched(self, url):
+        t = timeNow(typ="s")
+        with self._prefetched_lock:
+            if not self._prefetched:
+                return None
+            for k in [
+                k for k, (t0, _) in self._prefetched.items() if t - t0 > self.PREFETCH_TTL
+            ]:
+                self._prefetched.pop(k, None)
+            hit = self._prefetched.pop(url, None)
+        return hit[1] if hit else None
+
+    async def fetch_event_async(self, eventId, rallyId, itineraryId):
+        """Concurrently fetch the stages, entries and itinerary feeds for an event."""
+        return await self.gather_json(self.eventStubs(eventId, rallyId, itineraryId))
+
+    async def fetch_start_lists_async(self, eventId, startListIds):
+        return await self.gather_json(self.startListStubs(eventId, startListIds))
+
+    async def fetch_stage_times_async(
+        self, eventId, rallyId, stageIds, feeds=("stagetimes", "splittimes", "results")
+    ):
+        """Concurrently fetch stage times, split times and/or overall results for several stages."""
+        return await self.gather_json(
+            self.stageTimesStubs(eventId, rallyId, stageIds, feeds=feeds)
+        )
+
+    def eventStubs(self, eventId, rallyId, itineraryId, skip_recent=False):
+        """The event feeds; with skip_recent, leave out those that would be
+        served from the recently fetched results rather than the API."""
+        stubs = []
+        if not (skip_recent and self._recent("stages_json", eventId, peek=True)):
+            stubs.append(self.stub("stages", eventId=eventId))
+        stubs.append(self.stub("entries", eventId=eventId, rallyId=rallyId))
+        if not (
+            skip_recent
+            and self._recent("itinerary_json", f"{eventId}_{itineraryId}", peek=True)
+        ):
+            stubs.append(self.stub("itinerary", eventId=eventId, itineraryId=itineraryId))
+        return stubs
+
+    def startListStubs(self, eventId, startListIds):
+        return [
+            self.stub("startlist", eventId=eventId, startListId=startListId)
+            for startListId in startListIds
+            if not isna(startListId) and startListId
+        ]
+
+    def stageTimesStubs(
+        self, eventId, rallyId, stageIds, feeds=("stagetimes", "splittimes", "results")
+    ):
+        return [
+            self.stub(feed, eventId=eventId, rallyId=rallyId, stageId=stageId)
+            for stageId in stageIds
+            for feed in feeds
+        ]
+
     def _WRC_RedBull_json(self, path, base=None, retUrl=False):
         """Return JSON from API."""
         base = self.RED_BULL_LIVETIMING_API_BASE if base is None else base
         url = urljoin(base, path)
-        print(url)
+        logger.debug(f"Fetching {url}")
         if retUrl:
             return url
-        # print(f"Fetching: {url}")
+        if self.offline:
+            return {}
+        # The fetch is timed by endpoint, and by where the response came from
+        endpoint = endpoint_template(path)
+        with span("api.fetch", endpoint=endpoint), self.metrics.timer(
+            "wrc_api_fetch_seconds", endpoint=endpoint, source="prefetched"
+        ) as labels:
+            prefetched = self._pop_prefetched(url)
+            if prefetched is not None:
+                return prefetched
+            json_data = self._single_flight(url, labels=labels)
+        if self.recorder is not None:
+            self.recorder.record(path, json_data)
+        return json_data
+
+    def _single_flight(self, url, labels=None):
+        """Coalesce concurrent fetches of the same url into a single request.
+        The first caller makes the request; any others arriving before it
+        completes wait on, and share, its parsed result."""
+        labels = {} if labels is None else labels
+        with self._inflight_lock:
+            future = self._inflight.get(url)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[url] = future
+        if not leader:
+            logger.debug(f"Coalesced request for {url}")
+            labels["source"] = "coalesced"
+            return future.result()
+        try:
+            rj = self._fetch_json(url, labels=labels)
+            future.set_result(rj)
+            return rj
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(url, None)
+
+    def _fetch_json(self, url, labels=None):
+        """Fetch and decode a url; labels (for the fetch metrics) are
+        updated with where the response came from."""
+        labels = {} if labels is None else labels
+        endpoint = labels.get("endpoint", url)
+        labels["source"] = "upstream"
         try:
             r = self.proxy.cors_proxy_get(url)
         except:
             print("Error trying to load data.")
+            self.metrics.inc("wrc_api_errors_total", endpoint=endpoint, reason="request")
             return {}
         # r = requests.get(url)
+        # A requests_cache response may be served from, or revalidated against, the cache
+        if getattr(r, "revalidated", False):
+            labels["source"] = "revalidated"
+        elif getattr(r, "from_cache", False):
+            labels["source"] = "http_cache"
         if r.status_code!=200:
             logger.info(f"Not ok response from {url}")
+            self.metrics.inc("wrc_api_errors_total", endpoint=endpoint, reason="status")
             return {}
 
+        self.metrics.observe(
+            "wrc_api_payload_bytes", len(r.content), buckets=BYTES_BUCKETS, endpoint=endpoint
+        )
         try:
-            rj = r.json()
+            with self.metrics.timer("wrc_api_json_decode_seconds", endpoint=endpoint):
+                rj = r.json()
         except ValueError:
             # .json() failed to decode
             logger.info(f"Failed to parse JSON from {url}")
+            self.metrics.inc("wrc_api_errors_total", endpoint=endpoint, reason="decode")
             return {}
         if not rj:
             logger.info(f"Empty JSON from {url}")
-            
+            self.metrics.inc("wrc_api_errors_total", endpoint=endpoint, reason="empty")
+
         return rj
 
     def _getSeasons(self, updateDB=False):
@@ -364,7 +1040,7 @@ class APIClient:
                 DataFrame(),
                 DataFrame(),
             )
-        stub = f"events/{eventId}/rallies/{rallyId}/entries.json"
+        stub = self.stub("entries", eventId=eventId, rallyId=rallyId)
         json_data = self._WRC_RedBull_json(stub)
         entries_df = DataFrame(json_data)
         if entries_df.empty:
@@ -423,7 +1099,7 @@ class APIClient:
         if not eventId or isna(startListId) or not startListId:
             return DataFrame()
 
-        stub = f"events/{eventId}/startLists/{startListId}.json"
+        stub = self.stub("startlist", eventId=eventId, startListId=startListId)
         json_data = self._WRC_RedBull_json(stub)
         if "startListItems" not in json_data:
             return DataFrame()
@@ -461,30 +1137,13 @@ class APIClient:
         # TO DO -if the event is completed,  can add this to completed...
         # In fact, we can have a generic test that if the event is completed
         # we can add to the db and not have to fetch again.
-        if "itinerary_json" not in self.lastreferenced:
-            self.itineraryLegs_df = DataFrame()
-            self.itinerarySections2_df = DataFrame()
-            self.itineraryControls_df = DataFrame()
-            self.itineraryStages_df = DataFrame()
-            self.lastreferenced["itinerary_json"] = {'key':None, "t": 0}
-        _key=f"{eventId}_{itineraryId}"
-        if self.lastreferenced["itinerary_json"]["key"]!=_key:
-            self.lastreferenced["itinerary_json"]["key"] = _key
-            self.lastreferenced["itinerary_json"]["t"] = 0
-        if (timeNow(typ="s") - self.lastreferenced["itinerary_json"]["t"]) < (
-            self.ITINERARY_REFRESH_PERIOD
-        ):
-            return (
-                self.itineraryLegs_df,
-                self.itinerarySections2_df,
-                self.itineraryControls_df,
-                self.itineraryStages_df,
-            )
-        else:
-            self.lastreferenced["itinerary_json"]["t"] = timeNow(typ="s")
+        _key = f"{eventId}_{itineraryId}"
+        cached = self._recent("itinerary_json", _key)
+        if cached is not None:
+            return cached
         if not eventId or not itineraryId:
             return DataFrame(), DataFrame(), DataFrame(), DataFrame()
-        stub = f"events/{eventId}/itineraries/{itineraryId}.json"
+        stub = self.stub("itinerary", eventId=eventId, itineraryId=itineraryId)
         json_data = self._WRC_RedBull_json(stub)
         if "itineraryLegs" not in json_data:
             return DataFrame(), DataFrame(), DataFrame(), DataFrame()
@@ -536,22 +1195,25 @@ class APIClient:
             itineraryLegs_df["startListId"] = itineraryLegs_df["startListId"].astype(
                 "Int64"
             )
+            # Fetch the start lists concurrently, then process them in turn
+            self.prefetch(
+                self.startListStubs(eventId, itineraryLegs_df["startListId"].tolist())
+            )
             for _, row in itineraryLegs_df.iterrows():
                 startListId = row["startListId"]
                 self._getStartLists(
                     eventId=eventId, startListId=startListId, updateDB=updateDB
                 )
 
-        self.itineraryLegs_df = itineraryLegs_df
-        self.itinerarySections2_df = itinerarySections2_df
-        self.itineraryControls_df = itineraryControls_df
-        self.itineraryStages_df = itineraryStages_df
-
-        return (
-            itineraryLegs_df,
-            itinerarySections2_df,
-            itineraryControls_df,
-            itineraryStages_df,
+        return self._remember(
+            "itinerary_json",
+            _key,
+            (
+                itineraryLegs_df,
+                itinerarySections2_df,
+                itineraryControls_df,
+                itineraryStages_df,
+            ),
         )
 
     def _getControlTimes(self, eventId, controlId, updateDB=False):
@@ -581,27 +1243,14 @@ class APIClient:
         return shakedownTimes_df
 
     def _getStages(self, eventId, updateDB=False):
-        if "stages_json" not in self.lastreferenced:
-            self.stages_df  = DataFrame()
-            self.stage_split_points_df  = DataFrame()
-            self.stage_controls_df = DataFrame()
-            self.lastreferenced["stages_json"] = {"key": None, "t": 0}
-
-        if self.lastreferenced["stages_json"]["key"]!=eventId:
-            self.lastreferenced["stages_json"]["key"] = eventId
-            self.lastreferenced["stages_json"]["t"] = 0
-
-        if (timeNow(typ="s") - self.lastreferenced["stages_json"]["t"]) < (
-            self.ITINERARY_REFRESH_PERIOD
-        ):
-            return (self.stages_df, self.stage_split_points_df, self.stage_controls_df)
-        else:
-            self.lastreferenced["stages_json"]["t"] = timeNow(typ="s")
+        cached = self._recent("stages_json", eventId)
+        if cached is not None:
+            return cached
 
         if not eventId:
             return DataFrame(), DataFrame(), DataFrame()
 
-        stub = f"events/{eventId}/stages.json"
+        stub = self.stub("stages", eventId=eventId)
         json_data = self._WRC_RedBull_json(stub)
         stages_df = DataFrame(json_data)
 
@@ -629,17 +1278,15 @@ class APIClient:
             self.dbfy(stage_split_points_df, "split_points", pk="splitPointId")
             self.dbfy(stage_controls_df, "stage_controls", pk="controlId")
 
-        self.stages_df =stages_df
-        self.stage_split_points_df = stage_split_points_df
-        self.stage_controls_df =stage_controls_df
-
-        return stages_df, stage_split_points_df, stage_controls_df
+        return self._remember(
+            "stages_json", eventId, (stages_df, stage_split_points_df, stage_controls_df)
+        )
 
     def _getStageTimes(self, eventId, rallyId, stageId=None, updateDB=False):
         if not eventId or not stageId or not rallyId:
             return DataFrame()
 
-        stub = f"events/{eventId}/stages/{stageId}/stagetimes.json?rallyId={rallyId}"     
+        stub = self.stub("stagetimes", eventId=eventId, rallyId=rallyId, stageId=stageId)
         json_data = self._WRC_RedBull_json(stub)
         stagetimes_df = DataFrame(json_data)
         if stagetimes_df.empty:
@@ -658,7 +1305,7 @@ class APIClient:
         if not eventId or not stageId or not rallyId:
             return DataFrame()
 
-        stub = f"events/{eventId}/stages/{stageId}/splittimes.json?rallyId={rallyId}"
+        stub = self.stub("splittimes", eventId=eventId, rallyId=rallyId, stageId=stageId)
         json_data = self._WRC_RedBull_json(stub)
         splitTimes_df = DataFrame(json_data)
         if splitTimes_df.empty:
@@ -691,7 +1338,7 @@ class APIClient:
         if not eventId or not stageId or not rallyId:
             return DataFrame()
 
-        stub = f"events/{eventId}/stages/{stageId}/results.json?rallyId={rallyId}"
+        stub = self.stub("results", eventId=eventId, rallyId=rallyId, stageId=stageId)
         if by_championship and championshipId:
             stub = stub + f"&championshipId={championshipId}"
         json_data = self._WRC_RedBull_json(stub)
@@ -761,6 +1408,30 @@ class WRCTimingResultsAPIClientV2:
     SPLIT_PREFIX = "SP"
     SPLIT_FINAL = "FINAL"
     STAGE_FINAL = "FINAL"
+    # How many stages' worth of category rebased stage times to keep
+    REBASED_CACHE_SIZE = 64
+    # Rally progression values kept in wide progression_{typ} tables
+    PROGRESSION_TYPES = ["position", "timeInS", "Gap", "Diff", "Chase"]
+    PROGRESSION_INDEX = ["carNo", "driverName", "entryId"]
+    # The selection state each session client holds for itself (see
+    # newSession()); the rest (db, API client, caches and refresh worker)
+    # is the core shared by every session
+    SESSION_STATE = [
+        "year",
+        "championship",
+        "championshipLookup",
+        "category",
+        "seasonId",
+        "rallyId",
+        "eventId",
+        "eventName",
+        "championshipId",
+        "championshipName",
+        "itineraryId",
+        "stageId",
+        "stageName",
+        "stageCode",
+    ]
 
     def __init__(
         self,
@@ -772,10 +1443,42 @@ class WRCTimingResultsAPIClientV2:
         dbReadOnly: bool = False,
         newDB: bool = False,
         liveCatchup: bool = False,
+        staleWhileRevalidate: bool = False,
+        archive: bool = False,
+        writeBehind: bool = False,
         use_cache: bool = False,
         **cache_kwargs,
     ):
+        # An archive client serves completed seasons from an immutable db
+        # and never checks liveness or calls the API
+        self.archive = archive
+        if archive:
+            liveCatchup = False
+            dbReadOnly = True
+            newDB = False
         self.liveCatchup = liveCatchup
+        # In stale-while-revalidate mode, live timing reads are served
+        # from the db straight away and refreshed in the background
+        self.staleWhileRevalidate = staleWhileRevalidate
+        # When each live timing table was last refreshed in the db, by
+        # (table, eventId, rallyId, stageId); guarded, as is the set of
+        # refreshes in progress, by the revalidate lock
+        self._freshness = {}
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        # Stage times rebased to each category leader, by stage, least
+        # recently used first; shared by every session
+        self._rebased_cache = OrderedDict()
+        self._rebased_cache_lock = threading.Lock()
+        # Stage statuses and completed stage table flags, by event
+        self._completed_status = {}
+        self._completed_status_lock = threading.Lock()
+        # A single worker keeps the refreshes, and the db writes, in order
+        self._revalidate_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="wrc-revalidate")
+            if APIClient.canUseThreads()
+            else None
+        )
 
         # Initialize the proxy with caching if requested
         if use_cache:
@@ -801,17 +1504,54 @@ class WRCTimingResultsAPIClientV2:
 
         # DB setup
         self.dbReadOnly = dbReadOnly
-        self.db_manager = DatabaseManager(dbname, newdb=newDB, dbReadOnly=dbReadOnly)
+        self.db_manager = DatabaseManager(
+            dbname,
+            newdb=newDB,
+            dbReadOnly=dbReadOnly,
+            archive=archive,
+            writeBehind=writeBehind,
+        )
 
         self.api_client = APIClient(
-            db_manager=self.db_manager, use_cache=use_cache, **cache_kwargs
+            db_manager=self.db_manager,
+            use_cache=use_cache,
+            offline=archive,
+            **cache_kwargs,
         )
 
         # DB initialise
         if newDB:
             self.seedDB()
 
-    def seedDB(self):
+    def newSession(self):
+        """
+        Return a lightweight client for a new viewer session.
+
+        The session client shares this client's core (its API client and
+        caches, database connection and background refresh worker), but
+        holds its own copy of the SESSION_STATE season / event / stage
+        selection, so sessions looking at different rallies don't trample
+        on each other.
+        """
+        session = copy.copy(self)
+        for name in self.SESSION_STATE:
+            setattr(session, name, copy.deepcopy(getattr(self, name)))
+        return session
+
+    def seedDB(self, seed=None):
+        # If we have a seed database, we only need to go to the API
+        # for the current season if it still has rounds to run.
+        # An archive already has everything it is ever going to have.
+        if self.archive or (seed and self.db_manager.load_seed(seed)):
+            _seasons = self._getSeason(self.getSeasons())
+            if not _seasons.empty:
+                self.seasonId = _seasons.iloc[0]["seasonId"]
+                if not self.archive and not self.isSeasonCompleted():
+                    self._getSeasonDetail(updateDB=True)
+                return
+            if self.archive:
+                return
+
         # Populate the database with seasons info
         # self._getSeasons(updateDB=True)
         # Initialise the seasonId
@@ -897,6 +1637,75 @@ class WRCTimingResultsAPIClientV2:
             if not inplace:
                 return times
 
+    @staticmethod
+    def rebaseToCategoryLeaders(times, timeCol, categoryCol="priority"):
+        """
+        Rebase gaps, diffs, pace deltas and positions to the leader of each category.
+
+        All the categories are rebased together in one grouped pass.
+        Returns a copy of the times with the Gap, Diff, categoryPosition
+        and, if there is a pace column, pace diff (s/km) columns recomputed.
+        """
+        times = times.copy()
+        ranked = times.sort_values(["position", timeCol], na_position="last")
+        grouped = ranked.groupby(categoryCol, sort=False, dropna=False)
+        categoryPosition = grouped.cumcount() + 1
+        leader = grouped[timeCol].transform("first")
+        diff = (ranked[timeCol] - grouped[timeCol].shift(1)).where(
+            categoryPosition > 1, 0
+        )
+        times["categoryPosition"] = categoryPosition
+        times["Gap"] = ((ranked[timeCol] - leader) / 1000).round(1)
+        times["Diff"] = (diff / 1000).round(1)
+        if "pace (s/km)" in times:
+            leader_pace = grouped["pace (s/km)"].transform("first")
+            times["pace diff (s/km)"] = (ranked["pace (s/km)"] - leader_pace).round(2)
+        return times
+
+    def _getCategoryRebasedStageTimes(self, stageId, omitDNS=True, updateDB=False):
+        """
+        Stage times for every category on a stage, rebased to each category leader.
+
+        The rebased times are cached per stage, until the stage times in the db
+        change. Callers get their own copy of the cached times.
+        """
+        key = (self.eventId, self.rallyId, stageId, omitDNS)
+        refresh = updateDB or self.liveCatchup
+        if refresh:
+            # Refresh the db first, so that any new stage times invalidate the cache
+            self._revalidate(
+                "stage_times",
+                stageId,
+                self._refreshStageTimes,
+                stageId=stageId,
+                updateDB=updateDB,
+            )
+        versions = self.db_manager.table_versions(["stage_times"])
+        with self._rebased_cache_lock:
+            cached = self._rebased_cache.get(key)
+            if cached and cached[0] == versions:
+                self._rebased_cache.move_to_end(key)
+                return cached[1].copy()
+
+        times = self.getStageTimes(
+            stageId=stageId,
+            omitDNS=omitDNS,
+            rebaseToCategory=False,
+            raw=False,
+            updateDB=updateDB,
+            # We've just refreshed it
+            revalidate=not refresh,
+        )
+        if times.empty:
+            return times
+        times = self.rebaseToCategoryLeaders(times, "elapsedDurationMs")
+        with self._rebased_cache_lock:
+            self._rebased_cache[key] = (versions, times)
+            while len(self._rebased_cache) > self.REBASED_CACHE_SIZE:
+                # Drop the least recently used entry
+                self._rebased_cache.popitem(last=False)
+        return times.copy()
+
     @staticmethod
     def rebaseWithDummyValues(times, replacementVals, rebaseCols=None):
         """
@@ -938,6 +1747,23 @@ class WRCTimingResultsAPIClientV2:
 
         return times
 
+    def _getSeason(self, seasons_df):
+        """
+        The season for the championship and year. An archive may not have
+        the year asked for (by default, the current year), in which case
+        we fall back to, and set the year to, its latest season.
+        """
+        _seasons = self._getSeasonsSubQuery(seasons_df, self.championship, self.year)
+        if _seasons.empty and self.archive:
+            _seasons = self._getSeasonsSubQuery(seasons_df, self.championship)
+            if not _seasons.empty:
+                _seasons = _seasons.sort_values("year").iloc[[-1]]
+                logger.info(
+                    f"No {self.year} season in the archive; using {_seasons.iloc[0]['year']}"
+                )
+                self.year = int(_seasons.iloc[0]["year"])
+        return _seasons
+
     def _getSeasonsSubQuery(self, seasons_df, championship=None, year=None):
         if championship is not None:
             if championship.lower() == "wrc":
@@ -966,13 +1792,22 @@ class WRCTimingResultsAPIClientV2:
     # TO DO Need to check this e.g. for WRC and ERC
     # TO DO if we set from seasonId,
     def setSeason(self, seasonId=None):
-        _seasons = self._getSeasons(updateDB=True)
         if seasonId:
             self.seasonId = seasonId
         else:
-            self.seasonId = self._getSeasonsSubQuery(
-                _seasons, self.championship, self.year
-            ).iloc[0]["seasonId"]
+            _seasons = (
+                self.getSeasons() if self.archive else self._getSeasons(updateDB=True)
+            )
+            self.seasonId = self._getSeason(_seasons).iloc[0]["seasonId"]
+
+    def isSeasonCompleted(self, seasonId=None):
+        """Return True if every round of a season we know about has finished."""
+        seasonId = seasonId if seasonId else self.seasonId
+        if not seasonId:
+            return False
+        q = f"""SELECT COUNT(*) AS rounds, SUM(finishDate < "{dateNow()}") AS completed FROM season_rounds WHERE seasonId={seasonId};"""
+        r = self.db_manager.read_sql(q).iloc[0]
+        return bool(r["rounds"]) and r["rounds"] == r["completed"]
 
     # This datafeed is partial at the start of the season
     # and needs to be regularly updated
@@ -1522,6 +2357,7 @@ class WRCTimingResultsAPIClientV2:
         # Get the base stage name
         stages_df["_name"] = stages_df["name"].apply(lambda x: re.sub(r"\s\d+$", "", x))
 
+    @traced()
     def getStageInfo(
         self,
         on_event=True,
@@ -1665,9 +2501,26 @@ class WRCTimingResultsAPIClientV2:
         """This also sets self.rallyId, self.itineraryId"""
         kwargs["eventId"] = self.eventId
 
-        eventData_df, eventRallies_df, eventClasses_df = self.api_client._getEvent(
-            *args, **kwargs
-        )
+        if self.archive:
+            eventData_df = self.db_manager.read_sql(
+                f"SELECT * FROM event_date WHERE eventId={self.eventId};"
+            )
+            eventRallies_df = self.db_manager.read_sql(
+                f"SELECT * FROM event_rallies WHERE eventId={self.eventId};"
+            )
+            eventClasses_df = self.db_manager.read_sql(
+                f"SELECT * FROM event_classes WHERE eventId={self.eventId};"
+            )
+            if eventRallies_df.empty:
+                return eventData_df, eventRallies_df, eventClasses_df
+            # The flag comes back from the db as text
+            eventRallies_df["isMain"] = (
+                eventRallies_df["isMain"].astype(str).isin(["1", "True", "true"])
+            )
+        else:
+            eventData_df, eventRallies_df, eventClasses_df = (
+                self.api_client._getEvent(*args, **kwargs)
+            )
 
         _event_df = eventRallies_df[eventRallies_df["isMain"] == True].iloc[0]
         self.rallyId = int(_event_df["rallyId"])
@@ -1681,6 +2534,15 @@ class WRCTimingResultsAPIClientV2:
             self.eventName = r.iloc[0]["name"]
             # Get the event info
             self._getEvent(updateDB=updateDB)
+            if self.archive:
+                # Everything else we need is already in the db
+                return
+            # The remaining event feeds are independent, so fetch them concurrently
+            self.api_client.prefetch(
+                self.api_client.eventStubs(
+                    self.eventId, self.rallyId, self.itineraryId, skip_recent=True
+                )
+            )
             self._getStages(updateDB=updateDB)
             self._getEntries(updateDB=updateDB)
             self._getEventItineraries(updateDB=updateDB)
@@ -1803,8 +2665,11 @@ class WRCTimingResultsAPIClientV2:
         ]
         return stage_info
 
+    @traced()
     def isStageLive(self, stageId=None, stage_code=None):
         """Flag that shows a stage is live, so we need to keep updating stage related data."""
+        if self.archive:
+            return False
         stageId = self.stageId if not stageId and not stage_code else stageId
         # TO DO handle stagecode
         if stageId or stage_code:
@@ -1848,6 +2713,8 @@ class WRCTimingResultsAPIClientV2:
 
     def isRallyLive(self):
         """Flag to show that rally is live."""
+        if self.archive:
+            return False
         season = self.getSeasonRounds()
         event_ = season[season["eventId"] == self.eventId]
         if not event_.empty:
@@ -1876,6 +2743,96 @@ class WRCTimingResultsAPIClientV2:
 
         return False
 
+    def getFreshness(self, table="stage_times", stageId=None):
+        """Return the time (unix seconds) a table was last refreshed for a stage."""
+        stageId = stageId if stageId else self.stageId
+        with self._revalidate_lock:
+            return self._freshness.get((table, self.eventId, self.rallyId, stageId))
+
+    def getDataAge(self, table="stage_times", stageId=None):
+        """Return how old (s) the cached data for a stage is, or None if never refreshed."""
+        refreshed = self.getFreshness(table=table, stageId=stageId)
+        return None if refreshed is None else time.time() - refreshed
+
+    def _markFresh(self, table, stageId):
+        stageId = stageId if stageId else self.stageId
+        with self._revalidate_lock:
+            self._freshness[(table, self.eventId, self.rallyId, stageId)] = time.time()
+
+    def _pollIfEmpty(self, table, stageId):
+        """Should an empty db read fall back to a blocking API call?"""
+        if self.archive:
+            return False
+        # If we have already refreshed it and it's still empty, don't keep polling
+        return not self.staleWhileRevalidate or self.getFreshness(table, stageId) is None
+
+    def _revalidate(self, table, stageId, refresh, /, **kwargs):
+        """
+        Refresh the db copy of a live timing table, by calling refresh(**kwargs)
+        (which will usually include the stageId again).
+
+        Normally the refresh blocks. In stale-while-revalidate mode
+        the refresh is run in the background and the caller reads
+        whatever was last committed to the db.
+        """
+        if self.archive:
+            self.api_client.metrics.inc(
+                "wrc_cache_total", cache="db", key=table, result="archive"
+            )
+            return
+        if not self.staleWhileRevalidate:
+            refresh(**kwargs)
+            self._markFresh(table, stageId)
+            return
+        # The read is served from the db while the refresh runs
+        self.api_client.metrics.inc(
+            "wrc_cache_total", cache="db", key=table, result="stale"
+        )
+
+        eventId, rallyId = self.eventId, self.rallyId
+        key = (table, eventId, rallyId, stageId if stageId else self.stageId)
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def _job():
+            try:
+                # Don't bother if the event has changed since we were queued
+                if (self.eventId, self.rallyId) == (eventId, rallyId):
+                    refresh(**kwargs)
+                    with self._revalidate_lock:
+                        self._freshness[key] = time.time()
+            except Exception as e:
+                logger.error(f"Background refresh of {table} ({stageId}) failed: {e}")
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+
+        if self._revalidate_executor is not None:
+            self._revalidate_executor.submit(_job)
+        else:
+            # No threads under pyodide; defer to the event loop if we can
+            try:
+                asyncio.get_running_loop().call_soon(_job)
+            except RuntimeError:
+                _job()
+
+    def _refreshStageTimes(self, stageId=None, stageIds=None, completed=False, running=False, updateDB=False):
+        if completed or running:
+            # Check availability of every stage required
+            for stageId in stageIds:
+                updateDB = updateDB or self.isStageLive(stageId=stageId)
+                if not self.handleStageCompleted(stageId, tables="stage_times"):
+                    self._getStageTimes(stageId=stageId, updateDB=updateDB)
+        else:
+            logger.debug(
+                f"getStageTimes updateDB: {updateDB}, liveCatchup: {self.liveCatchup}"
+            )
+            updateDB = updateDB or self.isStageLive(stageId=stageId)
+            self._getStageTimes(stageId=stageId, updateDB=updateDB)
+
+    @traced()
     def getStageTimes(
         self,
         stageId=None,
@@ -1887,7 +2844,26 @@ class WRCTimingResultsAPIClientV2:
         on_event=True,
         raw=True,
         updateDB=False,
+        revalidate=True,
     ):
+        priority = None if priority == "P0" else priority
+        if rebaseToCategory and priority and not raw and not completed:
+            # Rebase every category on the stage in one go, and cache that,
+            # rather than re-querying and recomputing for each category
+            stageId = stageId if stageId else self.stageId
+            times = self._getCategoryRebasedStageTimes(
+                stageId, omitDNS=omitDNS, updateDB=updateDB
+            )
+            if times.empty:
+                return times
+            times = times[times["priority"].str.endswith(priority, na=False)].copy()
+            # Road order things are relative to the cars in the category
+            times["roadPos"] = range(1, len(times) + 1)
+            times["Chase"] = times["Diff"].shift(-1)
+            if "timeInS" in times:
+                times["timeToCarBehind"] = times["timeInS"].diff(-1).round(1)
+            return times
+
         # The assumption below is for on_event
         stageIds = (
             self.getCompletedStages(
@@ -1896,24 +2872,24 @@ class WRCTimingResultsAPIClientV2:
             if completed
             else {}  # TO DO map for the default stageId
         )
-        if updateDB or self.liveCatchup:
-            if completed or running:
-                # Check availability of every stage required
-                for stageId in stageIds:
-                    updateDB = updateDB or self.isStageLive(stageId=stageId)
-                    if not self.handleStageCompleted(stageId, tables="stage_times"):
-                        self._getStageTimes(stageId=stageId, updateDB=updateDB)
-            else:
-                logger.debug(
-                    f"getStageTimes updateDB: {updateDB}, liveCatchup: {self.liveCatchup}"
-                )
-                updateDB = updateDB or self.isStageLive(stageId=stageId)
-                self._getStageTimes(stageId=stageId, updateDB=updateDB)
+        if (updateDB or self.liveCatchup) and revalidate:
+            self._revalidate(
+                "stage_times",
+                stageId,
+                self._refreshStageTimes,
+                stageId=stageId,
+                stageIds=stageIds,
+                completed=completed,
+                running=running,
+                updateDB=updateDB,
+            )
+            if (completed or running) and stageIds:
+                # As before, the stage of interest is the last one checked
+                stageId = list(stageIds)[-1]
 
         stageId = stageId if stageId else self.stageId
         if stageId and self.eventId and self.rallyId:
             _entry_join = f"INNER JOIN entries AS e ON st.entryId=e.entryId"
-            priority = None if priority == "P0" else priority
             on_event_ = f"AND st.eventId={self.eventId} AND st.rallyId={self.rallyId}"
             if completed and stageIds:
                 stage_ids_str = ",".join(str(sid) for sid in stageIds)
@@ -1922,8 +2898,13 @@ class WRCTimingResultsAPIClientV2:
                 on_stage_ = f"AND st.stageId={stageId}" if stageId else ""
             priority_ = f"""AND e.priority LIKE "%{priority}" """ if priority else ""
             omit_dns_ = """AND st.status!="DNS" """ if omitDNS else ""
+            # Rank within the class if we're filtering on one
+            _stage_times = self.db_manager.view(
+                "stage_times_class_ranked" if priority else "stage_times_ranked"
+            )
+            # The rows are returned in road order
             if raw:
-                sql = f"""SELECT st.* FROM stage_times AS st {_entry_join} WHERE 1=1 {on_event_} {priority_} {on_stage_};"""
+                sql = f"""SELECT st.* FROM {_stage_times} AS st {_entry_join} WHERE 1=1 {on_event_} {priority_} {on_stage_} ORDER BY st.stageTimeId;"""
             else:
                 _driver_join = (
                     f"INNER JOIN entries_drivers AS d ON e.driverId=d.personId"
@@ -1936,13 +2917,14 @@ class WRCTimingResultsAPIClientV2:
                 )
                 _manufacturer_join = f"INNER JOIN manufacturers AS m ON e.manufacturerId=m.manufacturerId"
                 _entrants_join = f"INNER JOIN entrants AS n ON e.entrantId=n.entrantId"
-                sql = f"""SELECT d.code AS driverCode, d.fullName AS driverName, cd.fullName AS codriverName, m.name AS manufacturerName, n.name AS entrantName, e.vehicleModel, e.identifier AS carNo, e.priority, e.eligibility, si.code AS stageCode, st.* FROM stage_times AS st {_entry_join} {_driver_join} {_codriver_join} {_manufacturer_join} {_entrants_join} {_stage_info_join} WHERE 1=1 {omit_dns_} {on_event_} {on_stage_} {priority_};"""
+                sql = f"""SELECT d.code AS driverCode, d.fullName AS driverName, cd.fullName AS codriverName, m.name AS manufacturerName, n.name AS entrantName, e.vehicleModel, e.identifier AS carNo, e.priority, e.eligibility, si.code AS stageCode, st.* FROM {_stage_times} AS st {_entry_join} {_driver_join} {_codriver_join} {_manufacturer_join} {_entrants_join} {_stage_info_join} WHERE 1=1 {omit_dns_} {on_event_} {on_stage_} {priority_} ORDER BY st.stageTimeId;"""
                 # TO DO have a query where we return DNS (did not start)
             r = self.db_manager.read_sql(sql)
             # Hack to poll API if empty
-            if r.empty:
+            if r.empty and self._pollIfEmpty("stage_times", stageId):
                 logger.debug(f"getStageTimes empty read hack")
                 self._getStageTimes(stageId=stageId, updateDB=True)
+                self._markFresh("stage_times", stageId)
                 r = self.db_manager.read_sql(sql)
         else:
             r = DataFrame()
@@ -1954,25 +2936,12 @@ class WRCTimingResultsAPIClientV2:
         df_stageTimes = r
 
         df_stageTimes["roadPos"] = range(1, len(df_stageTimes) + 1)
-        df_stageTimes.sort_values("position", inplace=True)
-        df_stageTimes["categoryPosition"] = range(1, len(df_stageTimes) + 1)
-        df_stageTimes.sort_values("roadPos", inplace=True)
 
-        # TO DO  - we need to rebase times to category / categoryPositionLeader
-        if rebaseToCategory:
-            pass
-            # TO DO - need to initialise things back to category leader
         if "pos" in df_stageTimes:
             df_stageTimes["pos"] = df_stageTimes["pos"].astype("Int64")
 
-        if "diffFirst" in df_stageTimes:
-            df_stageTimes["Gap"] = df_stageTimes["diffFirstMs"].apply(
-                lambda x: round(x / 1000, 1) if notnull(x) else nan
-            )
-        if "diffPrev" in df_stageTimes:
-            df_stageTimes["Diff"] = df_stageTimes["diffPrevMs"].apply(
-                lambda x: round(x / 1000, 1) if notnull(x) else nan
-            )
+        # Gap and Diff come from the ranked view
+        if "Diff" in df_stageTimes:
             df_stageTimes["Chase"] = df_stageTimes["Diff"].shift(-1)
         if "elapsedDurationMs" in df_stageTimes:
             # df_stageTimes["timeInS"] = df_stageTimes["elapsedDurationMs"].apply(
@@ -2018,10 +2987,20 @@ class WRCTimingResultsAPIClientV2:
 
         return self.api_client._getSplitTimes(*args, **kwargs)
 
+    def _refreshSplitTimes(self, stageId=None, updateDB=False):
+        updateDB = updateDB or self.isStageLive(stageId=stageId)
+        self._getSplitTimes(stageId=stageId, updateDB=updateDB)
+
+    @traced()
     def getSplitTimes(self, stageId=None, priority=None, raw=True, updateDB=False):
         if updateDB or self.liveCatchup:
-            updateDB = updateDB or self.isStageLive(stageId=stageId)
-            self._getSplitTimes(stageId=stageId, updateDB=updateDB)
+            self._revalidate(
+                "split_times",
+                stageId,
+                self._refreshSplitTimes,
+                stageId=stageId,
+                updateDB=updateDB,
+            )
         stageId = stageId if stageId else self.stageId
 
         if stageId and self.eventId and self.rallyId:
@@ -2043,8 +3022,9 @@ class WRCTimingResultsAPIClientV2:
 
             r = self.db_manager.read_sql(sql)
             # Hack to poll API if empty
-            if r.empty:
+            if r.empty and self._pollIfEmpty("split_times", stageId):
                 self._getSplitTimes(stageId=stageId, updateDB=True)
+                self._markFresh("split_times", stageId)
                 r = self.db_manager.read_sql(sql)
         else:
             print(f"No getSplitTimes? {self.eventId} {self.stageId} {self.rallyId}")
@@ -2052,6 +3032,7 @@ class WRCTimingResultsAPIClientV2:
 
         return r
 
+    @traced()
     def getSplitTimesWide(
         self,
         stageId=None,
@@ -2118,6 +3099,7 @@ class WRCTimingResultsAPIClientV2:
 
     # TO DO below but one this as getStageWide and generalise names inside function
     # and maybe introduce a convenience getStageOverallWide
+    @traced()
     def getStageTimesWide(
         self,
         stageId=None,
@@ -2137,6 +3119,98 @@ class WRCTimingResultsAPIClientV2:
             updateDB=updateDB,
         )
 
+    def _materializeProgression(self, stageId):
+        """
+        Add a completed stage's overall results to the wide progression tables.
+
+        There's one table per progression value type, with a row per entry
+        and a column per stage, so the progression can be read without a pivot.
+        """
+        _stage_overall = self.db_manager.view("stage_overall_ranked")
+        sql = f"""SELECT o.entryId, e.identifier AS carNo, d.fullName AS driverName, si.code AS stageCode, o.position, o.totalTimeMs, o.Gap, o.Diff, o.Chase FROM {_stage_overall} AS o INNER JOIN entries AS e ON o.entryId=e.entryId INNER JOIN entries_drivers AS d ON e.driverId=d.personId INNER JOIN stage_info AS si ON si.stageId=o.stageId WHERE o.eventId={self.eventId} AND o.rallyId={self.rallyId} AND o.stageId={stageId} AND o.position IS NOT NULL;"""
+        overall = self.db_manager.read_sql(sql)
+        if overall.empty:
+            return False
+        overall["timeInS"] = (overall["totalTimeMs"] / 1000).round(1)
+        for typ in self.PROGRESSION_TYPES:
+            wide = pivot(
+                overall, index=self.PROGRESSION_INDEX, columns="stageCode", values=typ
+            ).reset_index()
+            wide["eventId"] = self.eventId
+            wide["rallyId"] = self.rallyId
+            self.dbfy(wide, f"progression_{typ}", pk=["rallyId", "entryId"], alter=True)
+        return True
+
+    def _getProgressionWide(
+        self, stageId=None, priority=None, running=False, typ="position", updateDB=False
+    ):
+        """
+        Read the rally progression from the wide progression tables.
+
+        Completed stages that have yet to be added are added now. Any stage
+        still running is pivoted from the overall results as usual.
+        Returns None if the progression tables can't be used.
+        """
+        stages = self.getCompletedStages(
+            stageId=stageId, completed=True, running=running
+        )
+        if not stages:
+            return None
+
+        def _materialized():
+            completed = self.getCompletedStatus()["completed"]
+            return {sid for sid in stages if (sid, "progression") in completed}
+
+        materialized = _materialized()
+        if len(materialized) < len(stages):
+            for sid in stages:
+                if sid not in materialized:
+                    # Fetches and materializes the stage if it has completed
+                    self.handleStageCompleted(sid)
+            materialized = _materialized()
+        if not materialized:
+            return None
+
+        codes = [code for sid, code in stages.items() if sid in materialized]
+        cols_ = ", ".join(f'p."{code}"' for code in codes)
+        priority_ = f"""AND e.priority LIKE "%{priority}" """ if priority else ""
+        sql = f"""SELECT p.carNo, p.driverName, p.entryId, {cols_} FROM "progression_{typ}" AS p INNER JOIN entries AS e ON p.entryId=e.entryId WHERE p.eventId={self.eventId} AND p.rallyId={self.rallyId} {priority_} ORDER BY p.carNo, p.driverName;"""
+        try:
+            wide = self.db_manager.read_sql(sql)
+        except Exception as e:
+            logger.warning(f"Can't read progression_{typ}: {e}")
+            return None
+        # Entries that have no position on any of these stages
+        wide = wide.dropna(subset=codes, how="all")
+
+        live = [sid for sid in stages if sid not in materialized]
+        if live:
+            live_times = self.getStageOverallResults(
+                raw=False,
+                stageId=live,
+                priority=priority,
+                completed=True,
+                running=running,
+                updateDB=updateDB,
+            )
+            if not live_times.empty:
+                live_wide = pivot(
+                    live_times.dropna(subset=["position"]),
+                    index=self.PROGRESSION_INDEX,
+                    columns="stageCode",
+                    values=typ,
+                ).reset_index()
+                wide = wide.merge(live_wide, on=self.PROGRESSION_INDEX, how="outer")
+
+        stage_order = [code for code in stages.values() if code in wide.columns]
+        wide = wide[self.PROGRESSION_INDEX + stage_order]
+        # Match the pivot: one value dtype across the stages, float if any are missing
+        if wide[stage_order].isna().any().any():
+            wide = wide.astype({code: float for code in stage_order})
+        wide.columns.name = "stageCode"
+        return wide
+
+    @traced()
     def getStageOverallWide(
         self,
         stageId=None,
@@ -2150,6 +3224,25 @@ class WRCTimingResultsAPIClientV2:
         # typ: position, totalTimeInS
         if self.eventId and self.rallyId and stageId:
             priority = None if priority == "P0" else priority
+        if (
+            extent == "overall"
+            and completed
+            and typ in self.PROGRESSION_TYPES
+            # Chase within a category isn't the overall chase
+            and not (priority and typ == "Chase")
+            and not self.db_manager.dbReadOnly
+            and self.eventId
+            and self.rallyId
+        ):
+            overall_times_wide = self._getProgressionWide(
+                stageId=stageId,
+                priority=priority,
+                running=running,
+                typ=typ,
+                updateDB=updateDB,
+            )
+            if overall_times_wide is not None:
+                return overall_times_wide
         if extent == "stage":
             overall_times = self.getStageTimes(
                 stageId=stageId,
@@ -2260,6 +3353,7 @@ class WRCTimingResultsAPIClientV2:
 
         return diff_df
 
+    @traced()
     def getScaledSplits(self, stageId, priority, view, id_col=None):
         id_col = ["carNo", "driverName"] if not id_col else id_col
 
@@ -2327,6 +3421,7 @@ class WRCTimingResultsAPIClientV2:
 
         return scaled_splits_wide
 
+    @traced()
     def rebase_splits_wide_with_ult(
         self, split_times_wide, rebase_driver, use_split_durations=True
     ):
@@ -2396,6 +3491,35 @@ class WRCTimingResultsAPIClientV2:
         )
         return completed_stages
 
+    def getCompletedStatus(self, eventId=None):
+        """
+        Get the stage statuses and completed stage table flags for an event.
+
+        Everything is loaded in one query and kept in memory until stage_info
+        or meta_completed_stage_tables change. Returns a dict with:
+            stages: {stageId: lower case status}
+            completed: set of (stageId, tableType) for the stored completed tables
+        """
+        eventId = eventId if eventId else self.eventId
+        _tables = ["stage_info", "meta_completed_stage_tables"]
+        versions = self.db_manager.table_versions(_tables)
+        with self._completed_status_lock:
+            cached = self._completed_status.get(eventId)
+        if cached and cached["versions"] == versions:
+            return cached
+
+        sql = f"""SELECT si.stageId, si.status, meta.tableType FROM stage_info AS si LEFT JOIN meta_completed_stage_tables AS meta ON meta.stageId=si.stageId WHERE si.eventId={eventId};"""
+        r = self.db_manager.read_sql(sql)
+        flags = r.dropna(subset=["tableType"])
+        cached = {
+            "versions": versions,
+            "stages": dict(zip(r["stageId"], r["status"].fillna("").str.lower())),
+            "completed": set(zip(flags["stageId"], flags["tableType"])),
+        }
+        with self._completed_status_lock:
+            self._completed_status[eventId] = cached
+        return cached
+
     def _updateCompletedStagesStatus(self, stageId, table, status):
         self.dbfy(
             DataFrame(
@@ -2404,9 +3528,24 @@ class WRCTimingResultsAPIClientV2:
             "meta_completed_stage_tables",
             pk=["tableType", "stageId"],
         )
+        # Update the in memory flags rather than reloading them; the flags
+        # are replaced rather than changed, as other sessions may be reading them
+        _versions = self.db_manager.table_versions(["meta_completed_stage_tables"])
+        with self._completed_status_lock:
+            for eventId, cached in list(self._completed_status.items()):
+                if int(stageId) in cached["stages"]:
+                    self._completed_status[eventId] = {
+                        "versions": {**cached["versions"], **_versions},
+                        "stages": cached["stages"],
+                        "completed": cached["completed"] | {(int(stageId), table)},
+                    }
 
     def checkCompletedStageTableStatus(self, stageId, table):
         """Return a True flag if we have stored this table."""
+        completed_status = self.getCompletedStatus()
+        if int(stageId) in completed_status["stages"]:
+            return (int(stageId), table) in completed_status["completed"]
+        # A stage on some other event
         sql = f"""SELECT meta.* FROM meta_completed_stage_tables AS meta WHERE stageId={stageId} AND tableType="{table}";"""
         _result = self.query(sql=sql)
         status = not _result.empty
@@ -2417,33 +3556,70 @@ class WRCTimingResultsAPIClientV2:
 
         def _isStageCompleted(stageId):
             """Check to see if the stage is listed as completed or cancelled."""
-            stage_info = self.getStageInfo()
-            status = stage_info[stage_info["stageId"] == int(stageId)]
-            if status.empty:
+            status = self.getCompletedStatus()["stages"].get(int(stageId))
+            if status is None:
                 return False, None
-            status = status["status"].iloc[0].lower()
             completed = status in ["completed", "cancelled"]
             return completed, status
 
         if tables is None:
-            tables = ["stage_overall"]  # add splits etc
+            tables = ["stage_overall", "progression"]  # add splits etc
         if isinstance(tables, str):
             tables = [tables]
         stage_completed, stage_status = _isStageCompleted(stageId)
         if stage_completed:
             for table in tables:
-                if not self.checkCompletedStageTableStatus(stageId, table):
+                served = self.checkCompletedStageTableStatus(stageId, table)
+                # Completed stage tables are served from the db
+                self.api_client.metrics.inc(
+                    "wrc_cache_total",
+                    cache="db",
+                    key=table,
+                    result="hit" if served else "miss",
+                )
+                if not served:
                     # Update the db with the completed data
                     # completed also includes cancelled
                     if table == "stage_overall":
                         self._getStageOverallResults(stageId=stageId, updateDB=True)
                     elif table == "stage_times":
                         self._getStageTimes(stageId=stageId, updateDB=True)
+                    elif table == "progression":
+                        # Derived from the stage_overall results
+                        if not self._materializeProgression(stageId):
+                            continue
                     # also other tables?
                     self._updateCompletedStagesStatus(stageId, table, stage_status)
             return True
         return False
 
+    def _refreshStageOverallResults(self, stageId=None, stageIds=None, completed=False, running=False, updateDB=False):
+        logger.debug(
+            f"getStageOverallResults: completed: {completed} running: {running} updateDB:{updateDB} liveCatchup: {self.liveCatchup} isStageLive: {self.isStageLive(stageId=stageId)}"
+        )
+        if completed:
+            # Check availability of every stage required
+            for stageId in stageIds:
+                updateDB = updateDB or self.isStageLive(stageId=stageId)
+                # TO DO we only want to request data from API if we don't already
+                # have it in the db as completed
+                # Need a new table / completed_status table to say what completed datasets
+                # have been downloaded.
+                # If a stage status is completed, download that result then add
+                # a flag to the completed_status table
+                # CREATE TABLE "completed_tables" (
+                # "tableType" TEXT,
+                # "tableId" INTEGER,
+                #  PRIMARY KEY ("tableType", "tableId"),
+                # )
+                if not self.handleStageCompleted(stageId):
+                    self._getStageOverallResults(stageId=stageId, updateDB=updateDB)
+        else:
+            for stageId in stageIds:
+                updateDB = updateDB or self.isStageLive(stageId=stageId)
+                self._getStageOverallResults(stageId=stageId, updateDB=updateDB)
+
+    @traced()
     def getStageOverallResults(
         self, stageId=None, priority=None, completed=False, running=False, last=False, on_event=True, raw=True, updateDB=False
     ):
@@ -2457,30 +3633,19 @@ class WRCTimingResultsAPIClientV2:
             stageIds = []  # TO DO map for the default stageId
         # print("stageIds - ", stageIds)
         if updateDB or self.liveCatchup:
-            logger.debug(
-                f"getStageOverallResults: completed: {completed} running: {running} updateDB:{updateDB} liveCatchup: {self.liveCatchup} isStageLive: {self.isStageLive(stageId=stageId)}"
+            self._revalidate(
+                "stage_overall",
+                stageId,
+                self._refreshStageOverallResults,
+                stageId=stageId,
+                stageIds=stageIds,
+                completed=completed,
+                running=running,
+                updateDB=updateDB,
             )
-            if completed:
-                # Check availability of every stage required
-                for stageId in stageIds:
-                    updateDB = updateDB or self.isStageLive(stageId=stageId)
-                    # TO DO we only want to request data from API if we don't already
-                    # have it in the db as completed
-                    # Need a new table / completed_status table to say what completed datasets
-                    # have been downloaded.
-                    # If a stage status is completed, download that result then add
-                    # a flag to the completed_status table
-                    # CREATE TABLE "completed_tables" (
-                    # "tableType" TEXT,
-                    # "tableId" INTEGER,
-                    #  PRIMARY KEY ("tableType", "tableId"),
-                    # )
-                    if not self.handleStageCompleted(stageId):
-                        self._getStageOverallResults(stageId=stageId, updateDB=updateDB)
-            else:
-                for stageId in stageIds:
-                    updateDB = updateDB or self.isStageLive(stageId=stageId)
-                    self._getStageOverallResults(stageId=stageId, updateDB=updateDB)
+            if stageIds:
+                # As before, the stage of interest is the last one checked
+                stageId = list(stageIds)[-1]
 
         stageIds = stageIds if stageIds else [self.stageId]
         # TO DO if stageId and completed treat that as up to?
@@ -2507,8 +3672,12 @@ class WRCTimingResultsAPIClientV2:
                 else ""
             )
 
+            # Rank within the class if we're filtering on one
+            _stage_overall = self.db_manager.view(
+                "stage_overall_class_ranked" if priority else "stage_overall_ranked"
+            )
             if raw:
-                sql = f"""SELECT o.* FROM stage_overall AS o {_entry_join} {_stage_info_join} WHERE 1=1 {on_event_} {on_stage_} {priority_} {completed_};"""
+                sql = f"""SELECT o.* FROM {_stage_overall} AS o {_entry_join} {_stage_info_join} WHERE 1=1 {on_event_} {on_stage_} {priority_} {completed_};"""
             else:
                 _driver_join = (
                     f"INNER JOIN entries_drivers AS d ON e.driverId=d.personId"
@@ -2518,20 +3687,26 @@ class WRCTimingResultsAPIClientV2:
                 )
                 _manufacturer_join = f"INNER JOIN manufacturers AS m ON e.manufacturerId=m.manufacturerId"
                 _entrants_join = f"INNER JOIN entrants AS n ON e.entrantId=n.entrantId"
-                sql = f"""SELECT d.code AS driverCode, d.fullName AS driverName, e.vehicleModel, e.identifier AS carNo, cd.fullName AS codriverName, m.name AS manufacturerName, n.name AS entrantName, e.priority, e.eligibility, si.code AS stageCode, si.number AS stageOrder, o.* FROM stage_overall AS o {_entry_join} {_driver_join} {_codriver_join} {_manufacturer_join} {_entrants_join} {_stage_info_join} WHERE 1=1 {on_event_} {on_stage_} {priority_} {completed_} ORDER BY stageOrder, o.position ASC;"""
+                sql = f"""SELECT d.code AS driverCode, d.fullName AS driverName, e.vehicleModel, e.identifier AS carNo, cd.fullName AS codriverName, m.name AS manufacturerName, n.name AS entrantName, e.priority, e.eligibility, si.code AS stageCode, si.number AS stageOrder, o.* FROM {_stage_overall} AS o {_entry_join} {_driver_join} {_codriver_join} {_manufacturer_join} {_entrants_join} {_stage_info_join} WHERE 1=1 {on_event_} {on_stage_} {priority_} {completed_} ORDER BY stageOrder, o.position ASC;"""
 
             r = self.db_manager.read_sql(sql)
 
             # Hack to poll API if empty
-            if r.empty or (not r.empty and
+            if (r.empty or (not r.empty and
                 completed and len(r["stageCode"].unique().tolist()) < len(stageIds)
-            ):
+            )) and self._pollIfEmpty("stage_overall", stageId):
 
                 if completed:
+                    self.api_client.prefetch(
+                        self.api_client.stageTimesStubs(
+                            self.eventId, self.rallyId, stageIds, feeds=["results"]
+                        )
+                    )
                     for stageId in stageIds:
                         self._getStageOverallResults(stageId=stageId, updateDB=True)
                 else:
                     self._getStageOverallResults(stageId=stageId, updateDB=True)
+                self._markFresh("stage_overall", stageId)
                 r = self.db_manager.read_sql(sql)
         else:
             print(
@@ -2547,29 +3722,8 @@ class WRCTimingResultsAPIClientV2:
 
         sort_keys_ = ["stageOrder", "position"] if "stageOrder" in overall_df.columns else ["position"]
         overall_df.sort_values(sort_keys_, inplace=True)
-        # overall_df["categoryPosition"] = range(1, len(overall_df) + 1)
-        overall_df["categoryPosition"] = overall_df.groupby(["stageId"]).cumcount() + 1
-        # overall_df.sort_values(sort_keys_, inplace=True)
-
-        # if we were working wihtin groups, eg for class position
-        # overall_df["Diff"] = overall_df.groupby("stageCode")["diffPrevMs"].apply(
-        #     lambda group: group.apply(
-        #         lambda x: round(x / 1000, 1) if notnull(x) else nan
-        #     )
-        # )
-        if "diffFirstMs" in overall_df:
-            overall_df["Gap"] = overall_df.groupby("stageId")[
-                "diffFirstMs"
-            ].transform(
-                lambda group: where(notnull(group), group.div(1000).round(1), nan)
-            )
-        if "diffPrevMs" in overall_df:
-            overall_df["Diff"] = overall_df.groupby("stageId")[
-                "diffPrevMs"
-            ].transform(
-                lambda group: where(notnull(group), group.div(1000).round(1), nan)
-            )
-            overall_df["Chase"] = overall_df["Diff"].shift(-1)
+        # categoryPosition, Gap, Diff and Chase, within the stage or class,
+        # come from the ranked view
         if "totalTimeMs" in overall_df:
             # df_stageTimes["timeInS"] = df_stageTimes["elapsedDurationMs"].apply(
             #    lambda x: x / 1000 if notnull(x) else nan
@@ -0,0 +1,231 @@
+# In-process metrics for the live timing client
+#
+# The API client and db manager count and time their fetches, cache lookups
+# and db writes into a metrics registry (by default, the shared REGISTRY),
+# labelled by endpoint template, feed or table. The registry can be rendered
+# as Prometheus text, served over HTTP, or dumped to the log periodically:
+#   REGISTRY.serve(9100)                  # GET http://localhost:9100/metrics
+#   REGISTRY.log_periodically(60)
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+HELP = {
+    "wrc_api_fetch_seconds": "API fetch latency, by endpoint and where the response came from",
+    "wrc_api_payload_bytes": "API response payload size",
+    "wrc_api_json_decode_seconds": "API response JSON decode time",
+    "wrc_api_errors_total": "Failed API fetches, by endpoint and reason",
+    "wrc_cache_total": "Cache lookups, by cache, key and result",
+    "wrc_db_write_seconds": "Time writing rows to a db table",
+    "wrc_db_write_errors_total": "Write-behind rows that could not be written, by table",
+}
+
+
+def endpoint_template(path):
+    """The endpoint template for an API path, with ids and query values elided.
+    For example, events/535/stages/1/stagetimes.json?rallyId=583 is
+    events/{id}/stages/{id}/stagetimes.json?rallyId"""
+    path, _, query = path.partition("?")
+    path = re.sub(r"(?<=/)\d+(?=/|\.json$)", "{id}", path)
+    if query:
+        keys = "&".join(q.split("=")[0] for q in query.split("&"))
+        path = f"{path}?{keys}"
+    return path
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """An estimate (the bucket upper bound) of the q quantile (0-1)."""
+        if not self.count:
+            return None
+        n = 0
+        for bound, count in zip(self.buckets, self.counts):
+            n += count
+            if n >= q * self.count:
+                return bound
+        return self.max
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels, **extra):
+    items = list(labels) + [(k, str(v)) for k, v in extra.items()]
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+class MetricsRegistry:
+    """Thread safe counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._httpd = None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time a block into a histogram; yields the labels, which the block may update."""
+        t0 = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _labels(labels)), 0)
+
+    def histogram(self, name, **labels):
+        with self._lock:
+            return self._histograms.get((name, _labels(labels)))
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+            lines = []
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    typed.add(name)
+                    if name in HELP:
+                        lines.append(f"# HELP {name} {HELP[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_label_text(labels)} {value}")
+            for (name, labels), h in histograms:
+                if name not in typed:
+                    typed.add(name)
+                    if name in HELP:
+                        lines.append(f"# HELP {name} {HELP[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                n = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    n += count
+                    lines.append(f"{name}_bucket{_label_text(labels, le=bound)} {n}")
+                lines.append(f'{name}_bucket{_label_text(labels, le="+Inf")} {h.count}')
+                lines.append(f"{name}_sum{_label_text(labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """A one line per series summary of the metrics, for the log."""
+        with self._lock:
+            lines = [
+                f"{name}{_label_text(labels)} {value}"
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            for (name, labels), h in sorted(self._histograms.items(), key=lambda kv: kv[0]):
+                if not h.count:
+                    continue
+                scale, unit = (1000, "ms") if name.endswith("_seconds") else (1, "")
+                lines.append(
+                    f"{name}{_label_text(labels)} n={h.count} "
+                    f"mean={h.sum / h.count * scale:.1f}{unit} "
+                    f"p95<={h.quantile(0.95) * scale:g}{unit} "
+                    f"max={h.max * scale:.1f}{unit}"
+                )
+        return "\n".join(lines)
+
+    def log_periodically(self, interval=60, log=logger):
+        """Log a summary every interval seconds, in a background thread.
+        Returns an Event to set to stop logging (None if threads aren't available)."""
+        if sys.platform == "emscripten":
+            # No threads under pyodide
+            return None
+        stop = threading.Event()
+
+        def _dump():
+            while not stop.wait(interval):
+                log.info(f"Metrics:\n{self.summary()}")
+
+        threading.Thread(target=_dump, daemon=True, name="wrc-metrics-log").start()
+        return stop
+
+    def serve(self, port=9100, host="localhost"):
+        """Serve the metrics as Prometheus text at /metrics, in a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self._httpd
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+# The registry shared by every client in the process
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,173 @@
+# Slow query log for the timing db
+#
+# DatabaseManager.read_sql() times every query into a QueryLog, keyed by the
+# query's fingerprint (its text with literal values elided). The first time a
+# query fingerprint runs slower than the threshold, its EXPLAIN QUERY PLAN is
+# captured, and any full scans of the big timing tables are flagged.
+#
+#   print(wrc.db_manager.query_log.report())
+#
+# The threshold (ms) can be set with the WRC_SLOW_QUERY_MS environment variable.
+import os
+import re
+import threading
+from collections import deque
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("WRC_SLOW_QUERY_MS", 50))
+
+# Tables that grow with the season, so that shouldn't be scanned in full
+WATCHED_TABLES = ("stage_times", "split_times", "stage_overall")
+
+# Durations kept per fingerprint for the percentiles
+DURATIONS_KEPT = 500
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+# Double quoted values compared against (rather than quoted identifiers)
+_DQ_VALUE = re.compile(r'((?:=|!=|<>|\bLIKE|\bIN\s*\(|,)\s*)"[^"]*"', re.IGNORECASE)
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN)\s+"?([\w.]+)"?(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|INNER\b|LEFT\b|JOIN\b|GROUP\b|ORDER\b|LIMIT\b|USING\b)(\w+))?',
+    re.IGNORECASE,
+)
+
+
+def fingerprint(query):
+    """A query's text with literals elided and whitespace normalised."""
+    query = _STRING.sub("?", query)
+    query = _DQ_VALUE.sub(r"\1?", query)
+    query = _NUMBER.sub("?", query)
+    query = _IN_LIST.sub("IN (?...)", query)
+    return " ".join(query.split()).rstrip(";")
+
+
+def table_aliases(sql):
+    """The tables referred to in some SQL, as {alias or name: {table, ...}}."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases.setdefault(table, set()).add(table)
+        if alias:
+            aliases.setdefault(alias, set()).add(table)
+    return aliases
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.rows = 0
+        self.durations = deque(maxlen=DURATIONS_KEPT)
+        self.plan = None
+        self.full_scans = []
+        self.example = None
+
+    def percentile(self, p):
+        durations = sorted(self.durations)
+        if not durations:
+            return None
+        return durations[min(len(durations) - 1, int(p / 100 * len(durations)))]
+
+
+class QueryLog:
+    """Latency stats, and query plans for the slow ones, by query fingerprint."""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, watched=WATCHED_TABLES):
+        self.threshold = threshold_ms / 1000
+        self.watched = watched
+        self.stats = {}
+        self._lock = threading.Lock()
+        # View definitions, by view name, for resolving scans inside views
+        self._views = None
+
+    def record(self, query, duration, conn=None, rows=0):
+        """Record a query run; conn is used to explain it if it was slow."""
+        key = fingerprint(query)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = QueryStats()
+            stats.count += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            stats.rows += rows
+            stats.durations.append(duration)
+            explain = duration > self.threshold and stats.plan is None and conn is not None
+            if explain:
+                # Only the first slow run of a query is explained
+                stats.plan = []
+                stats.example = query
+        if explain:
+            stats.plan, stats.full_scans = self.explain(query, conn)
+            logger.info(
+                f"Slow query ({duration * 1000:.0f}ms): {key}\n"
+                + "\n".join(stats.plan)
+            )
+
+    def _view_sql(self, conn):
+        if self._views is None:
+            self._views = dict(
+                conn.execute("SELECT name, sql FROM sqlite_master WHERE type='view'")
+            )
+        return self._views
+
+    def explain(self, query, conn):
+        """A query's plan, as indented lines, and the watched tables it fully scans."""
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        except Exception as e:
+            return [f"(could not explain: {e})"], []
+
+        # Resolve aliases in the query, or in a view for the parts of the
+        # plan that run a view's query
+        views = self._view_sql(conn)
+        scopes = {None: table_aliases(query)}
+        scope = {0: None}
+        depth = {0: -1}
+        plan, full_scans = [], []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            scope[node_id] = scope.get(parent)
+            plan.append("  " * depth[node_id] + detail)
+            match = re.match(r"(?:MATERIALIZE|CO-ROUTINE) (\w+)$", detail)
+            if match and match.group(1) in views:
+                scope[node_id] = match.group(1)
+                if scope[node_id] not in scopes:
+                    scopes[scope[node_id]] = table_aliases(views[scope[node_id]])
+                continue
+            # A SCAN reads every row, even USING an index (eg for ORDER BY);
+            # only a SEARCH is limited by the index
+            match = re.match(r"SCAN (\S+)", detail)
+            if match:
+                aliases = scopes[scope[node_id]]
+                tables = aliases.get(match.group(1), {match.group(1)})
+                full_scans.extend(t for t in tables if t in self.watched)
+        return plan, sorted(set(full_scans))
+
+    def report(self, top=20):
+        """The queries taking the most time in total, with their plans if slow."""
+        with self._lock:
+            offenders = sorted(self.stats.items(), key=lambda kv: -kv[1].total)[:top]
+        lines = []
+        for key, s in offenders:
+            flag = f"  FULL SCAN {', '.join(s.full_scans)}" if s.full_scans else ""
+            lines.append(
+                f"{s.total * 1000:8.0f}ms total  {s.count:5d} runs  "
+                f"mean {s.total / s.count * 1000:.1f}ms  "
+                f"p95 {s.percentile(95) * 1000:.1f}ms  "
+                f"max {s.max * 1000:.1f}ms  rows {s.rows // s.count}{flag}"
+            )
+            lines.append(f"    {key}")
+            if s.plan:
+                lines.extend(f"      {line}" for line in s.plan)
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self._views = None
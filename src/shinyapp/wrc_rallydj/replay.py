@@ -0,0 +1,312 @@
+# Record live timing API responses, and replay them as if a rally were live
+#
+# The only source of live timing data is the Red Bull API, so live stage
+# behaviour (polling load, caching, db contention) can only be seen on a
+# rally weekend. This module records API responses with a timestamp, and
+# serves them back from a local server at N times speed.
+#
+# Record responses while the app runs by setting a recorder on the API client:
+#   wrc.api_client.recorder = ResponseRecorder("rally.jsonl")
+# or poll an event directly:
+#   python -m wrc_rallydj.replay record --out rally.jsonl --year 2025 --event-id 535
+#
+# Replay them, optionally simulating the stages running one after another:
+#   python -m wrc_rallydj.replay serve rally.jsonl --speed 10 [--simulate]
+# then point the app at it with WRC_API_BASE=http://localhost:8765/
+import json
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+REPLAY_PORT = 8765
+
+STAGES_PATH = re.compile(r"^events/(?P<eventId>\d+)/stages\.json$")
+ITINERARY_PATH = re.compile(r"^events/(?P<eventId>\d+)/itineraries/\d+\.json$")
+STAGE_FEED_PATH = re.compile(
+    r"^events/(?P<eventId>\d+)/stages/(?P<stageId>\d+)/(?P<feed>stagetimes|splittimes|results)\.json"
+)
+SEASON_DETAIL_PATH = re.compile(r"^season-detail\.json")
+
+
+class ResponseRecorder:
+    """Append API responses, with the time they were fetched, to a JSONL file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, path, json_data):
+        if not json_data:
+            # Failed or empty requests
+            return
+        line = json.dumps({"t": time.time(), "path": path, "json": json_data})
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+def load_recording(path):
+    """Load a recording as {path: [(t, json), ...]}, each list in time order."""
+    snapshots = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                snapshots.setdefault(r["path"], []).append((r["t"], r["json"]))
+    for path_snapshots in snapshots.values():
+        path_snapshots.sort(key=lambda s: s[0])
+    return snapshots
+
+
+class ReplayClock:
+    """Map wall clock time onto recording time, running at speed times real time."""
+
+    def __init__(self, t0, speed=1.0):
+        self.t0 = t0
+        self.speed = speed
+        self.started = time.time()
+
+    def now(self):
+        return self.t0 + (time.time() - self.started) * self.speed
+
+
+class StageSimulator:
+    """
+    Run an event's stages one after another on the replay clock.
+
+    Each stage is ToRun, then Running for stage_minutes, then Completed,
+    with gap_minutes between stages. While a stage is running, the stage
+    feeds only carry the share of the entries that would have finished.
+    """
+
+    def __init__(self, clock, stages, events=(), stage_minutes=20, gap_minutes=10):
+        self.clock = clock
+        self.events = set(events)
+        self.stage_s = stage_minutes * 60
+        self.gap_s = gap_minutes * 60
+        # stageId -> start time, in stage order; the first stage starts after a gap
+        ordered = sorted(stages, key=lambda s: s.get("number", 0))
+        self.starts = {
+            s["stageId"]: clock.t0 + self.gap_s + i * (self.stage_s + self.gap_s)
+            for i, s in enumerate(ordered)
+        }
+
+    def progress(self, stageId):
+        """Fraction of the stage run, from 0 (to run) to 1 (completed)."""
+        start = self.starts.get(int(stageId))
+        if start is None:
+            return 1
+        return min(max((self.clock.now() - start) / self.stage_s, 0), 1)
+
+    def status(self, stageId):
+        progress = self.progress(stageId)
+        if progress <= 0:
+            return "ToRun"
+        return "Running" if progress < 1 else "Completed"
+
+    def rewrite(self, path, json_data):
+        """Rewrite a response to match the simulated state of the stages."""
+        if STAGES_PATH.match(path):
+            return [
+                dict(s, status=self.status(s["stageId"]))
+                if s["stageId"] in self.starts
+                else s
+                for s in json_data
+            ]
+        if ITINERARY_PATH.match(path):
+            json_data = json.loads(json.dumps(json_data))
+            for leg in json_data.get("itineraryLegs", []):
+                for section in leg.get("itinerarySections", []):
+                    for stage in section.get("stages", []):
+                        if stage.get("stageId") in self.starts:
+                            stage["status"] = self.status(stage["stageId"])
+            return json_data
+        match = STAGE_FEED_PATH.match(path)
+        if match and isinstance(json_data, list):
+            progress = self.progress(match["stageId"])
+            return json_data[: int(len(json_data) * progress)]
+        if SEASON_DETAIL_PATH.match(path):
+            # Make the simulated events look like they're on today
+            json_data = json.loads(json.dumps(json_data))
+            today = date.today()
+            for season_round in json_data.get("seasonRounds", []):
+                event = season_round.get("event", {})
+                if event.get("eventId") in self.events:
+                    event["startDate"] = today.isoformat()
+                    event["finishDate"] = (today + timedelta(days=1)).isoformat()
+            return json_data
+        return json_data
+
+
+class ReplayServer:
+    """Serve recorded API responses as they were at the replay clock time."""
+
+    def __init__(
+        self,
+        recording,
+        speed=1.0,
+        simulate=False,
+        stage_minutes=20,
+        gap_minutes=10,
+        host="localhost",
+        port=REPLAY_PORT,
+    ):
+        self.snapshots = (
+            load_recording(recording) if isinstance(recording, str) else recording
+        )
+        t0 = min(s[0][0] for s in self.snapshots.values())
+        self.clock = ReplayClock(t0, speed=speed)
+        self.simulator = None
+        if simulate:
+            stages = []
+            events = set()
+            for path, path_snapshots in self.snapshots.items():
+                match = STAGES_PATH.match(path)
+                if match:
+                    events.add(int(match["eventId"]))
+                    stages.extend(path_snapshots[-1][1])
+            self.simulator = StageSimulator(
+                self.clock,
+                stages,
+                events=events,
+                stage_minutes=stage_minutes,
+                gap_minutes=gap_minutes,
+            )
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.requests = 0
+
+    @property
+    def base(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def response(self, path):
+        """Return the response for a path at the current replay time, else None."""
+        path_snapshots = self.snapshots.get(path)
+        if not path_snapshots:
+            return None
+        now = self.clock.now()
+        # The latest snapshot we have by now, else the first one
+        json_data = path_snapshots[0][1]
+        for t, _json in path_snapshots:
+            if t > now:
+                break
+            json_data = _json
+        if self.simulator:
+            json_data = self.simulator.rewrite(path, json_data)
+        return json_data
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                json_data = server.response(self.path.lstrip("/"))
+                body = json.dumps({} if json_data is None else json_data).encode()
+                self.send_response(404 if json_data is None else 200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread; returns the server base URL."""
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self.base
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def record_event(out, year, eventId, interval=30, duration=0, dbname=None):
+    """
+    Record the season, event and stage feeds for an event.
+
+    The event feeds are polled every interval seconds for duration seconds
+    (or just once if duration is 0).
+    """
+    import os
+    import tempfile
+
+    from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+
+    dbname = dbname if dbname else os.path.join(tempfile.mkdtemp(), "record.db")
+    wrc = WRCTimingResultsAPIClientV2(year=year, dbname=dbname)
+    wrc.api_client.recorder = ResponseRecorder(out)
+    wrc.seedDB()
+    wrc.setEventById(eventId)
+
+    api = wrc.api_client
+    finish = time.time() + duration
+    while True:
+        stages = api.fetch_many(api.eventStubs(wrc.eventId, wrc.rallyId, wrc.itineraryId))
+        stageIds = [s["stageId"] for s in stages.get(api.stub("stages", eventId=wrc.eventId), [])]
+        api.fetch_many(api.stageTimesStubs(wrc.eventId, wrc.rallyId, stageIds))
+        logger.info(f"Recorded event {eventId} ({len(stageIds)} stages)")
+        if time.time() + interval > finish:
+            break
+        time.sleep(interval)
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Record and replay the live timing API.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Record an event's feeds")
+    record_parser.add_argument("--out", required=True, help="Recording (JSONL) path")
+    record_parser.add_argument("--year", type=int, default=date.today().year)
+    record_parser.add_argument("--event-id", type=int, required=True)
+    record_parser.add_argument("--interval", type=float, default=30, help="Poll period (s)")
+    record_parser.add_argument("--duration", type=float, default=0, help="Poll for (s)")
+
+    serve_parser = subparsers.add_parser("serve", help="Replay a recording")
+    serve_parser.add_argument("recording", help="Recording (JSONL) path")
+    serve_parser.add_argument("--speed", type=float, default=1.0)
+    serve_parser.add_argument("--port", type=int, default=REPLAY_PORT)
+    serve_parser.add_argument(
+        "--simulate", action="store_true", help="Run the stages as if live"
+    )
+    serve_parser.add_argument("--stage-minutes", type=float, default=20)
+    serve_parser.add_argument("--gap-minutes", type=float, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "record":
+        record_event(
+            args.out,
+            args.year,
+            args.event_id,
+            interval=args.interval,
+            duration=args.duration,
+        )
+    else:
+        server = ReplayServer(
+            args.recording,
+            speed=args.speed,
+            simulate=args.simulate,
+            stage_minutes=args.stage_minutes,
+            gap_minutes=args.gap_minutes,
+            port=args.port,
+        )
+        print(f"Replaying {args.recording} at {args.speed}x on {server.base}")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,96 @@
+# Build a compact, read-only seed database for the app
+#
+# Seasons, season rounds and championships, along with the results
+# of completed events, don't change once they are published.
+# Bundling them with the app means that at start up we only need
+# to go to the network for rounds that have not yet completed.
+#
+# Usage:
+#   python -m wrc_rallydj.seed_db [--out wrc_seed.db] [--years 2024 2025] [--events]
+import os
+
+from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+from wrc_rallydj.utils import dateNow
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+SEED_DB = "wrc_seed.db"
+
+# Completed stage tables to carry in the seed for completed events
+SEED_STAGE_TABLES = ["stage_overall", "stage_times"]
+
+
+def build_seed_db(out=SEED_DB, years=None, championships=("wrc", "erc"), events=False):
+    """
+    Build the seed database.
+
+    Args:
+        out: path of the seed database to create
+        years: list of season years to include (default: all)
+        championships: championship codes to include
+        events: if True, also include the results of completed events
+    """
+    _build = f"{out}.build"
+    if os.path.isfile(_build):
+        os.remove(_build)
+
+    # A new db is seeded with the seasons feed and the current season
+    wrc = WRCTimingResultsAPIClientV2(dbname=_build, newDB=True)
+
+    seasons_df = wrc.getSeasons()
+    seasons_df = seasons_df[
+        seasons_df["name"].map(wrc.CHAMPIONSHIP_CODES).isin(championships)
+    ]
+    if years:
+        seasons_df = seasons_df[seasons_df["year"].isin([int(y) for y in years])]
+
+    today = dateNow()
+    for seasonId in seasons_df["seasonId"].tolist():
+        logger.info(f"Seeding season {seasonId}...")
+        wrc.setSeason(seasonId=seasonId)
+        season_rounds = wrc.getSeasonRounds(updateDB=True)
+        if not events or season_rounds.empty:
+            continue
+
+        completed_rounds = season_rounds[season_rounds["finishDate"] < today]
+        for eventId in completed_rounds["eventId"].tolist():
+            logger.info(f"Seeding completed event {eventId}...")
+            wrc.setEventById(eventId)
+            stages_df = wrc.getStageInfo(completed=True)
+            for stageId in stages_df["stageId"].tolist():
+                wrc.handleStageCompleted(stageId, tables=SEED_STAGE_TABLES)
+
+    # Write out a compacted copy of the db
+    if os.path.isfile(out):
+        os.remove(out)
+    with wrc.db_manager.lock:
+        wrc.db_manager.conn.execute("VACUUM INTO ?", (out,))
+    wrc.db_manager.conn.close()
+    os.remove(_build)
+
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the app seed database.")
+    parser.add_argument("--out", default=SEED_DB, help="Seed database path")
+    parser.add_argument("--years", nargs="*", type=int, help="Season years")
+    parser.add_argument(
+        "--championships", nargs="*", default=["wrc", "erc"], help="Championships"
+    )
+    parser.add_argument(
+        "--events", action="store_true", help="Include completed event results"
+    )
+    args = parser.parse_args()
+
+    build_seed_db(
+        out=args.out,
+        years=args.years,
+        championships=args.championships,
+        events=args.events,
+    )
@@ -0,0 +1,192 @@
+# Lightweight nested tracing spans, written to a JSON-lines trace file
+#
+# With WRC_TRACE=trace.jsonl set, spans around the API fetches, db reads and
+# writes, the timing client's getters and the app's render functions are
+# written to the trace file, one Chrome trace event per line. Each span is
+# tagged with the ids (session, stageId, ...) of the spans it is nested in.
+#
+# View a trace as a timeline (in chrome://tracing or https://ui.perfetto.dev)
+# after converting it to a trace event array:
+#   python -m wrc_rallydj.tracing chrome trace.jsonl > trace.json
+# or break down where the time goes in each kind of render:
+#   python -m wrc_rallydj.tracing summary trace.jsonl
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+# The span the current task is in, as (span id, tags)
+_current = contextvars.ContextVar("wrc_trace_span", default=(None, {}))
+
+# Span ids are unique to the process and run, as runs append to the same
+# trace file (and a container's app may always have the same pid)
+_RUN = os.urandom(4).hex()
+_ids = itertools.count(1)
+
+
+def _span_id():
+    return f"{os.getpid()}-{_RUN}-{next(_ids)}"
+
+
+class Tracer:
+    """Append finished spans to a JSON-lines trace file."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def write(self, event):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", buffering=1)
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+TRACER = Tracer(os.environ.get("WRC_TRACE"))
+
+
+@contextmanager
+def _span(name, tags, attrs):
+    parent, parent_tags = _current.get()
+    span_id = _span_id()
+    tags = {**parent_tags, **{k: v for k, v in tags.items() if v is not None}}
+    token = _current.set((span_id, tags))
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - t0
+        _current.reset(token)
+        TRACER.write(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": round(start * 1e6),
+                "dur": round(duration * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": {"id": span_id, "parent": parent, **tags, **attrs},
+            }
+        )
+
+
+def span(name, tags=None, **attrs):
+    """
+    A context manager that traces a block as a span.
+
+    Tags (eg session, stageId) are inherited by the spans nested in this one;
+    attrs are only recorded on this span. When tracing is off this is a no-op.
+    """
+    if not TRACER.enabled:
+        return nullcontext()
+    return _span(name, tags or {}, attrs)
+
+
+def traced(name=None, tags=("stageId",)):
+    """
+    Decorate a function (or method) so that each call is traced as a span.
+
+    Each of the tags is taken from the call's keyword arguments or,
+    failing that, from the attribute of that name on the method's object.
+    """
+
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            _tags = {}
+            for tag in tags:
+                value = kwargs.get(tag)
+                if value is None and args:
+                    value = getattr(args[0], "__dict__", {}).get(tag)
+                _tags[tag] = value
+            with _span(span_name, _tags, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def breakdown(events):
+    """
+    Where the time goes in each kind of root span (eg each render function).
+
+    Returns {root name: {"count": n, "total": us, "self": {span name: us}}},
+    where self is the time spent in each span name, less its nested spans.
+    """
+    by_id = {e["args"]["id"]: e for e in events}
+    children = {}
+    for e in events:
+        children.setdefault(e["args"].get("parent"), []).append(e)
+
+    def root(e):
+        while e["args"].get("parent") in by_id:
+            e = by_id[e["args"]["parent"]]
+        return e
+
+    roots = {}
+    for e in events:
+        r = root(e)
+        summary = roots.setdefault(r["name"], {"count": 0, "total": 0, "self": {}})
+        if r is e:
+            summary["count"] += 1
+            summary["total"] += e["dur"]
+        self_time = e["dur"] - sum(c["dur"] for c in children.get(e["args"]["id"], []))
+        summary["self"][e["name"]] = summary["self"].get(e["name"], 0) + max(self_time, 0)
+    return roots
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="View a WRC_TRACE trace file.")
+    parser.add_argument("command", choices=["chrome", "summary"])
+    parser.add_argument("trace", help="JSON-lines trace file")
+    parser.add_argument("--top", type=int, default=20, help="Root spans to summarise")
+    args = parser.parse_args()
+
+    events = read_trace(args.trace)
+    if args.command == "chrome":
+        print(json.dumps({"traceEvents": events}))
+    else:
+        roots = sorted(breakdown(events).items(), key=lambda kv: -kv[1]["total"])
+        for name, summary in roots[: args.top]:
+            count = max(summary["count"], 1)
+            print(
+                f"{name}: {summary['count']} calls, "
+                f"mean {summary['total'] / count / 1000:.1f}ms"
+            )
+            for child, us in sorted(summary["self"].items(), key=lambda kv: -kv[1]):
+                share = us / summary["total"] * 100 if summary["total"] else 0
+                print(f"    {child:<56}{us / count / 1000:>9.1f}ms {share:>5.1f}%")
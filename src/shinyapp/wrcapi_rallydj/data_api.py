@@ -3,15 +3,15 @@ import datetime
 from requests_cache import CachedSession
 from datetime import timedelta
 import pandas as pd
-from geopandas import GeoDataFrame
-from io import StringIO
-import kml2geojson
 from typing import Dict, Any
 import re
 import io
 import zipfile
 import json
 
+from .kmltools import read_kml_placemarks, placemarks_to_geojson
+from .telemetry_store import TelemetryStore
+
 import logging
 
 # LOCAL_DATA_STUB = "http://localhost:8126/app1/resources"
@@ -27,11 +27,77 @@ logger = logging.getLogger(__name__)
 
 import gzip
 import base64
+import multiprocessing
+import os
+import sys
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
 
 # TO DO - maybe see what we can learn from
 # https://webapps2.wrc.com/2020/obc/js/wrc/api.js
 
 
+def decode_telemetry(text, merged=False):
+    """
+    Decode a telemetry payload: JSON or, for merged telemetry, base64 encoded
+    gzipped JSON. Returns None if there is no payload or it can't be decoded.
+    """
+    if not text:
+        return None
+    try:
+        if merged:
+            return json.loads(gzip.decompress(base64.b64decode(text)))
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+def telemetry_frame(telemetrydata, **meta):
+    """A frame of decoded telemetry entries, with some metadata columns."""
+    if telemetrydata is None:
+        return pd.DataFrame()
+    df_telemetrydata = pd.DataFrame(telemetrydata["_entries"])
+    for key, value in meta.items():
+        df_telemetrydata[key] = value
+    return (
+        df_telemetrydata.dropna(how="all", axis=1)
+        .dropna(how="all", axis=0)
+        .drop_duplicates()
+    )
+
+
+def decode_telemetry_frame(text, merged=False, **meta):
+    """
+    Decode a telemetry payload into a frame (in a decode worker process).
+    Returns the frame, and whether the payload was decoded.
+    """
+    telemetrydata = decode_telemetry(text, merged)
+    return telemetry_frame(telemetrydata, **meta), telemetrydata is not None
+
+
+def simple_stage_list(stages):
+    """The stages a route runs as, from its name (eg SS 2/5 Lousã is SS2 and SS5)."""
+    if stages.startswith("SS"):
+        # Match SS (or SSS, or SS-) + one or more number parts separated by / or -
+        match = re.match(r"S?SS\s*-?\s*(\d+(?:\s*[-/]\s*\d+)*)", stages)
+        if not match:
+            return []
+
+        segment = match.group(1)
+
+        # Split on - or /, keep only endpoints
+        numbers = re.split(r"[-/]", segment)
+        stages = [f"SS{int(n.strip())}" for n in numbers if n.strip().isdigit()]
+
+        return stages
+    else:
+        return [stages]
+
+
 class WRCDataAPIClient:
     """Client for accessing WRC Telemetry Rally API data."""
 
@@ -40,17 +106,29 @@ class WRCDataAPIClient:
     # We can use the WRC_ASSETS_PATH to retrieve the get_rallies_data "logo"
     WRC_KML_PATH = WRC_ASSETS_PATH + "/live/kml/{kmlfile}.xml"
     CATEGORY_MAP = {"ALL": "all", "WRC": "wrc", "WRC2": "wrc2", "WRC3": "wrc3"}
-
-    def __init__(self, year: int = datetime.date.today().year, usegeo: bool = False):
+    TELEMETRY_STUB = "https://webappsdata.wrc.com/srv/fs/pull{}"
+
+    # Concurrent telemetry downloads, and telemetry decode worker processes
+    # (leaving a CPU for the app; with none to spare, decode in the calling thread)
+    MAX_CONCURRENT_REQUESTS = 6
+    DECODE_WORKERS = min(4, (os.cpu_count() or 1) - 1)
+
+    def __init__(
+        self,
+        year: int = datetime.date.today().year,
+        usegeo: bool = False,
+        telemetry_store=None,
+    ):
         """
         Initialize the WRC Data API client.
-        """
-        if usegeo:
-            from .geotools import RallyGeoTools
 
-            self.GeoTools = RallyGeoTools()
-        else:
-            self.GeoTools = None
+        Decoded telemetry is kept in telemetry_store (a TelemetryStore, or
+        the path of its directory), if given, rather than fetched again.
+        """
+        # The geo stack (geopandas, shapely, ipyleaflet) is slow to import,
+        # so only load it when something first needs it
+        self.usegeo = usegeo
+        self._geotools = None
 
         self.year = year
         self.championshipType = None
@@ -61,14 +139,36 @@ class WRCDataAPIClient:
         self.r = CachedSession("demo_cache", expire_after=timedelta(hours=1))
         self.alldata = {}
 
+        if telemetry_store is not None and not isinstance(
+            telemetry_store, TelemetryStore
+        ):
+            telemetry_store = TelemetryStore(telemetry_store)
+        self.telemetry_store = telemetry_store
+        self._fetch_executor = None
+        self._decode_executor = None
+
+    @property
+    def GeoTools(self):
+        if self.usegeo and self._geotools is None:
+            from .geotools import RallyGeoTools
+
+            self._geotools = RallyGeoTools()
+        return self._geotools
+
+    def _empty_stages(self):
+        if not self.GeoTools:
+            return {}
+        from geopandas import GeoDataFrame
+
+        return GeoDataFrame()
+
     def initialise(self, year=None):
         """Initialise with the calendar."""
         if year:
             self.year = year
 
-    def kmlfile_to_json(self, kmlfile):
-        if not isinstance(kmlfile, str) or not kmlfile:
-            return {}
+    def _local_geojson(self, kmlfile):
+        """Try to retrieve a pre-converted, zipped geojson version of a KML file."""
         # Try local lookup first
         try:
             from shiny import req
@@ -112,45 +212,52 @@ class WRCDataAPIClient:
                         return geojson
                 except:
                     pass
+        return {}
 
+    def kmlfile_to_placemarks(self, kmlfile):
+        """Stream the KML route file into placemarks with numpy coordinate arrays."""
+        if not isinstance(kmlfile, str) or not kmlfile:
+            return []
         kmlurl = self.WRC_KML_PATH.format(kmlfile=kmlfile)
         logger.info(f"Trying KML XML url {kmlurl}")
-        text = StringIO(
-            re.sub(
-                r"[\u200b\u200e\u200f]",
-                "",
-                self.r.get(kmlurl).content.decode("utf-8"),
-            )
-        )
-        return kml2geojson.main.convert(text)
-
-    def read_kmlfile(self, kmlfile):
-        def _simpleStageList(stages):
-            if stages.startswith("SS"):
-                # Match SS + one or more number parts separated by / or -
-                match = re.match(r"SS\s*(\d+(?:\s*[-/]\s*\d+)*)", stages)
-                if not match:
-                    return []
+        r = self.r.get(kmlurl)
+        if r.status_code != 200 or not r.content:
+            return []
+        try:
+            return read_kml_placemarks(r.content)
+        except Exception as e:
+            logger.info(f"Failed to parse KML from {kmlurl}: {e}")
+            return []
 
-                segment = match.group(1)
+    def kmlfile_to_json(self, kmlfile):
+        if not isinstance(kmlfile, str) or not kmlfile:
+            return {}
+        geojson = self._local_geojson(kmlfile)
+        if geojson:
+            return geojson
 
-                # Split on - or /, keep only endpoints
-                numbers = re.split(r"[-/]", segment)
-                stages = [f"SS{int(n.strip())}" for n in numbers if n.strip().isdigit()]
+        return placemarks_to_geojson(self.kmlfile_to_placemarks(kmlfile))
 
-                return stages
-            else:
-                return [stages]
+    def read_kmlfile(self, kmlfile):
         if not isinstance(kmlfile, str) or not kmlfile:
-            return GeoDataFrame() if self.GeoTools else {}
+            return self._empty_stages()
 
-        gj = self.kmlfile_to_json(kmlfile)
+        gj = self._local_geojson(kmlfile)
         if not gj:
-            return GeoDataFrame() if self.GeoTools else {}
+            # Fall back to streaming the KML, without intermediate GeoJSON dicts
+            placemarks = self.kmlfile_to_placemarks(kmlfile)
+            if not placemarks:
+                return self._empty_stages()
+            for placemark in placemarks:
+                placemark["stages"] = simple_stage_list(placemark["name"])
+            if self.GeoTools:
+                return self.GeoTools.placemarks_to_gpd(placemarks)
+            return placemarks_to_geojson(placemarks)[0]
+
         gj=gj[0]
         for feature in gj["features"]:
             stage = feature["properties"].get("name", "")
-            feature["properties"]["stages"] = _simpleStageList(stage)
+            feature["properties"]["stages"] = simple_stage_list(stage)
 
         if self.GeoTools:
             _gdf = self.GeoTools.geojson_to_gpd(gj)
@@ -686,37 +793,27 @@ class WRCDataAPIClient:
     # the name can come from the _record_name in df_stagedata
 
     # Note that the telemetry does not appear to include hybrid status
+    def _fetch_telemetry_text(self, telemetryID, stub_telemetry=None):
+        if stub_telemetry is None:
+            stub_telemetry = self.TELEMETRY_STUB
+        return self.r.get(stub_telemetry.format(telemetryID), verify=False).text
+
     def _get_telemetry_data(self, df_stagedata, name="Neuville", stub_telemetry=None):
-        print("Checking telemetry...")
+        logger.debug("Checking telemetry...")
         _rally_stage_id, _car_entry_id, _telemetryID, _telemetrymergedID = (
             self.get_telemetry_id(df_stagedata, name)
         )
-        # print("_rally_stage_id, _car_entry_id, _telemetryID, _telemetrymergedID")
-        if stub_telemetry is None:
-            stub_telemetry = "https://webappsdata.wrc.com/srv/fs/pull{}"
-            # print(stub_telemetry.format(_telemetryID))
-        telemetrydata = self.r.get(stub_telemetry.format(_telemetryID), verify=False)
-
-        if telemetrydata.text:
-            try:
-                telemetrydata = telemetrydata.json()
-            except:
-                # print(telemetrydata.text)
-                telemetrydata = None
-        else:
-            telemetrydata = None
+        telemetrydata = decode_telemetry(
+            self._fetch_telemetry_text(_telemetryID, stub_telemetry)
+        )
 
         # https://stackoverflow.com/a/28642346/454773
         telemetrymergeddata = None
         if _telemetrymergedID:
-            r = self.r.get(stub_telemetry.format(_telemetrymergedID), verify=False)
-            if r.text:
-                try:
-                    telemetrymergeddata = json.loads(
-                        gzip.decompress(base64.b64decode(r.text))
-                    )
-                except:
-                    telemetrymergeddata = {"_entries": []}
+            telemetrymergeddata = decode_telemetry(
+                self._fetch_telemetry_text(_telemetrymergedID, stub_telemetry),
+                merged=True,
+            )
         return (
             _rally_stage_id,
             _car_entry_id,
@@ -730,16 +827,41 @@ class WRCDataAPIClient:
     # _get_telemetry_data(df_stagedata)
     # -
 
-    def _process_driver_telemetry_data(self, telemetrydata):  # , _rallyID):
-        df_telemetrydata = pd.DataFrame()
-        if telemetrydata is None:
-            return df_telemetrydata
-        _df_telemetrydata = pd.DataFrame(telemetrydata["_entries"])
-        df_telemetrydata = pd.concat([df_telemetrydata, _df_telemetrydata], sort=False)
+    def _stored_telemetry(self, df_stagedata, name):
+        """The stored (telemetry, merged) traces for a driver on a stage,
+        or None if either has yet to be stored."""
+        if self.telemetry_store is None:
+            return None
+        _rally_stage_id, _car_entry_id, _, _telemetrymergedID = self.get_telemetry_id(
+            df_stagedata, name
+        )
+        kinds = ["telemetry", "merged"] if _telemetrymergedID else ["telemetry"]
+        if not all(
+            self.telemetry_store.has(_rally_stage_id, _car_entry_id, kind)
+            for kind in kinds
+        ):
+            return None
+        return tuple(
+            self.telemetry_store.get(_rally_stage_id, _car_entry_id, kind)
+            for kind in ["telemetry", "merged"]
+        )
 
-        return df_telemetrydata
+    @staticmethod
+    def _stored_frames(stored):
+        frames = []
+        for trace in stored:
+            if trace is None:
+                frames.append(pd.DataFrame())
+                continue
+            with trace:
+                frames.append(trace.to_frame())
+        return tuple(frames)
 
     def process_driver_telemetry_data(self, df_stagedata, name="Neuville"):
+        stored = self._stored_telemetry(df_stagedata, name)
+        if stored is not None:
+            return self._stored_frames(stored)
+
         (
             _rally_stage_id,
             _car_entry_id,
@@ -748,31 +870,176 @@ class WRCDataAPIClient:
             telemetrydata,
             telemetrymergeddata,
         ) = self._get_telemetry_data(df_stagedata, name)
-        if telemetrydata is not None:
-            df_telemetrydata = self._process_driver_telemetry_data(telemetrydata)
-            df_telemetrydata["_rally_stageid"] = _rally_stage_id
-            df_telemetrydata["_carentryid"] = _car_entry_id
-            df_telemetrydata["_telemetryID"] = _telemetryID
-            df_telemetrydata["_name"] = name
-        else:
-            df_telemetrydata = pd.DataFrame()
+        df_telemetrydata = telemetry_frame(
+            telemetrydata,
+            _rally_stageid=_rally_stage_id,
+            _carentryid=_car_entry_id,
+            _telemetryID=_telemetryID,
+            _name=name,
+        )
+        df_telemetrymergeddata = telemetry_frame(
+            telemetrymergeddata,
+            _rally_stageid=_rally_stage_id,
+            _carentryid=_car_entry_id,
+            _telemetrymergedID=_telemetrymergedID,
+            _name=name,
+        )
+
+        # Only keep what was fetched and decoded, so failures are retried;
+        # an empty trace is kept too, so it isn't fetched again
+        if self.telemetry_store is not None and telemetrydata is not None:
+            self.telemetry_store.put(_rally_stage_id, _car_entry_id, df_telemetrydata)
+            if telemetrymergeddata is not None:
+                self.telemetry_store.put(
+                    _rally_stage_id, _car_entry_id, df_telemetrymergeddata, "merged"
+                )
 
-        if telemetrymergeddata is not None:
-            df_telemetrymergeddata = self._process_driver_telemetry_data(
-                telemetrymergeddata
+        return df_telemetrydata, df_telemetrymergeddata
+
+    def get_driver_telemetry(self, df_stagedata, name="Neuville"):
+        """
+        A driver's (telemetry, merged) traces on a stage, from the telemetry
+        store (fetching them into it first if need be), for lazy column access
+        and windowing; either may be None if there is no such trace.
+        """
+        if self.telemetry_store is None:
+            raise ValueError("No telemetry_store set")
+        stored = self._stored_telemetry(df_stagedata, name)
+        if stored is None:
+            self.process_driver_telemetry_data(df_stagedata, name)
+            _rally_stage_id, _car_entry_id, _, _ = self.get_telemetry_id(
+                df_stagedata, name
             )
-            df_telemetrymergeddata["_rally_stageid"] = _rally_stage_id
-            df_telemetrymergeddata["_carentryid"] = _car_entry_id
-            df_telemetrymergeddata["_telemetrymergedID"] = _telemetrymergedID
-            df_telemetrymergeddata["_name"] = name
-        else:
-            df_telemetrymergeddata = pd.DataFrame()
+            stored = tuple(
+                self.telemetry_store.get(_rally_stage_id, _car_entry_id, kind)
+                for kind in ["telemetry", "merged"]
+            )
+        return stored
 
-        return (
-            df_telemetrydata.dropna(how="all", axis=1)
-            .dropna(how="all", axis=0)
-            .drop_duplicates(),
-            df_telemetrymergeddata.dropna(how="all", axis=1)
-            .dropna(how="all", axis=0)
-            .drop_duplicates(),
-        )
+    @staticmethod
+    def canUseThreads():
+        """Threads (and processes) are not available in the pyodide / shinylive runtime."""
+        return sys.platform != "emscripten"
+
+    def _get_fetch_executor(self):
+        if self._fetch_executor is None:
+            self._fetch_executor = ThreadPoolExecutor(
+                max_workers=self.MAX_CONCURRENT_REQUESTS,
+                thread_name_prefix="wrc-telemetry",
+            )
+        return self._fetch_executor
+
+    def _get_decode_executor(self):
+        if self._decode_executor is None:
+            # Spawn, rather than fork, the workers: forking a process with
+            # threads running (eg the app's db writer) can deadlock the child
+            self._decode_executor = ProcessPoolExecutor(
+                max_workers=self.DECODE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._decode_executor
+
+    def _submit_decode(self, text, merged, meta):
+        """Decode a telemetry payload in a decode worker if there are any,
+        else straight away; returns a future of decode_telemetry_frame()."""
+        if self.DECODE_WORKERS >= 1:
+            return self._get_decode_executor().submit(
+                decode_telemetry_frame, text, merged, **meta
+            )
+        future = Future()
+        try:
+            future.set_result(decode_telemetry_frame(text, merged, **meta))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _car_key(self, df_stagedata, name):
+        rows = df_stagedata[df_stagedata["_record_name"] == name]
+        key = "nr" if "nr" in rows.columns else "_carentryid"
+        return rows[key].values[0]
+
+    def get_cars_telemetry(self, df_stagedata, names=None):
+        """
+        Several drivers' (by default, all the drivers') telemetry on a stage,
+        as (telemetry, merged telemetry) frames keyed by car, ie indexed by
+        (car number, row).
+
+        The payloads are downloaded concurrently, and each is decoded as soon
+        as it has arrived, in a pool of worker processes if there are CPUs to
+        spare, else in the calling thread while the other downloads carry on
+        (where threads aren't available, one after another). Traces
+        already in the telemetry store are read from it, and new ones stored.
+        """
+        if names is None:
+            names = df_stagedata["_record_name"].dropna().unique().tolist()
+        names = list(dict.fromkeys(names))
+        frames = {}
+        jobs = {}
+        for name in names:
+            stored = self._stored_telemetry(df_stagedata, name)
+            if stored is not None:
+                frames[name] = self._stored_frames(stored)
+                continue
+            frames[name] = (pd.DataFrame(), pd.DataFrame())
+            _rally_stage_id, _car_entry_id, _telemetryID, _telemetrymergedID = (
+                self.get_telemetry_id(df_stagedata, name)
+            )
+            meta = dict(_rally_stageid=_rally_stage_id, _carentryid=_car_entry_id)
+            for kind, telemetryID in (
+                ("telemetry", _telemetryID),
+                ("merged", _telemetrymergedID),
+            ):
+                if not telemetryID:
+                    continue
+                id_col = "_telemetryID" if kind == "telemetry" else "_telemetrymergedID"
+                jobs[(name, kind)] = (
+                    telemetryID,
+                    kind == "merged",
+                    {**meta, id_col: telemetryID, "_name": name},
+                )
+
+        if jobs:
+            if self.canUseThreads() and len(jobs) > 1:
+                # The fetch threads only fetch; each payload is handed on
+                # to be decoded as it arrives, while the others download
+                fetches = {
+                    self._get_fetch_executor().submit(
+                        self._fetch_telemetry_text, telemetryID
+                    ): key
+                    for key, (telemetryID, _, _) in jobs.items()
+                }
+                decodes = {}
+                for fetch in as_completed(fetches):
+                    key = fetches[fetch]
+                    _, merged, meta = jobs[key]
+                    decodes[key] = self._submit_decode(fetch.result(), merged, meta)
+                results = {key: decodes[key].result() for key in jobs}
+            else:
+                results = {
+                    key: decode_telemetry_frame(
+                        self._fetch_telemetry_text(telemetryID), merged, **meta
+                    )
+                    for key, (telemetryID, merged, meta) in jobs.items()
+                }
+            for (name, kind), (df, decoded) in results.items():
+                telemetry, merged = frames[name]
+                frames[name] = (df, merged) if kind == "telemetry" else (telemetry, df)
+                # As for a single driver, only keep what was fetched and decoded
+                if self.telemetry_store is not None and decoded:
+                    _, _, meta = jobs[(name, kind)]
+                    self.telemetry_store.put(
+                        meta["_rally_stageid"], meta["_carentryid"], df, kind
+                    )
+
+        keys = {name: self._car_key(df_stagedata, name) for name in names}
+        results = []
+        for i in (0, 1):
+            cars = {
+                keys[name]: frames[name][i]
+                for name in names
+                if not frames[name][i].empty
+            }
+            results.append(
+                pd.concat(cars, names=["car", None]) if cars else pd.DataFrame()
+            )
+        return tuple(results)
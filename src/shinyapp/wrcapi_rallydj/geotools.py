@@ -1,11 +1,13 @@
 import geopandas as gpd
 from pandas import DataFrame
 from shapely.geometry import Point, LineString, MultiLineString
+from shapely import force_2d, transform
 from ipyleaflet import Map, Marker, GeoData, GeoJSON, Popup, DivIcon, Polyline
 
 # from ipywidgets import HTML
 
 import json
+import re
 try:
     import osmnx as ox
 except:
@@ -13,6 +15,57 @@ except:
 import numpy as np
 
 
+# Simplification tolerances (in degrees) for the map geometry pyramid.
+# Level 0 is full resolution; the others are roughly 1m, 5m, 20m and 100m.
+MAP_PYRAMID_TOLERANCES = (0, 0.00001, 0.00005, 0.0002, 0.001)
+# Decimal places kept in map coordinates (5dp is about 1m)
+MAP_COORD_PRECISION = 5
+# Nominal map widget width in pixels, used to pick a pyramid level
+MAP_WIDTH_PX = 800
+
+
+class GeometryPyramid:
+    """Simplified, quantized 2D map geometries at several tolerances.
+
+    Levels are indexed like the geometries they are built from, and are
+    built as they are first asked for. A pyramid is never changed once
+    built, so copies of a geodataframe (in its attrs) share it.
+    """
+
+    def __init__(
+        self, geometry, tolerances=MAP_PYRAMID_TOLERANCES, precision=MAP_COORD_PRECISION
+    ):
+        self.tolerances = tuple(tolerances)
+        self.precision = precision
+        self.crs = geometry.crs
+        self.index = geometry.index
+        self._geoms = force_2d(geometry.values)
+        self._levels = {}
+
+    def covers(self, index):
+        return self.index.is_unique and index.isin(self.index).all()
+
+    def level(self, level):
+        """The geometries at a pyramid level, as a GeoSeries."""
+        if level not in self._levels:
+            tolerance = self.tolerances[level]
+            geoms = gpd.GeoSeries(self._geoms, index=self.index, crs=self.crs)
+            if tolerance:
+                geoms = geoms.simplify(tolerance, preserve_topology=True)
+            self._levels[level] = gpd.GeoSeries(
+                transform(geoms.values, lambda c: np.round(c, self.precision)),
+                index=self.index,
+                crs=self.crs,
+            )
+        return self._levels[level]
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
 class RallyGeoTools:
     def __init__(self):
         pass
@@ -34,7 +87,8 @@ class RallyGeoTools:
         x, y, z = zip(*list(self.explode(f["geometry"]["coordinates"])))
         return [[min(y), min(x)], [max(y), max(x)]]
 
-    def geojson_to_gpd(self, gj, crs="EPSG:4326"):
+    def _finalise_stages_gdf(self, _gdf):
+        """Tidy stage names and stage lists on a stages geodataframe."""
 
         def fix_encoding(text):
             if isinstance(text, str):
@@ -66,15 +120,12 @@ class RallyGeoTools:
             result = []
 
             for stage in stages_list:
-                if "-" in stage:
-                    # Extract the prefix (SS) and the numbers
-                    # TO DO - need handlers for badly behaved names
-                    prefix = (
-                        stage[: stage.find("0")]
-                        if "0" in stage and "SS" not in stage
-                        else "SS"
-                    )
-                    start, end = map(int, stage[len(prefix) :].split("-"))
+                # Extract the prefix (SS) and the numbers; anything else with
+                # a hyphen in it (eg "SD Start - Finish") is kept as it is
+                match = re.fullmatch(r"(\D*?)\s*(\d+)\s*-\s*(\d+)", stage.strip())
+                if match:
+                    prefix = match.group(1) or "SS"
+                    start, end = int(match.group(2)), int(match.group(3))
                     # Add start and end stages with proper prefix
                     result.extend([f"{prefix}{start}", f"{prefix}{end}"])
                 else:
@@ -82,14 +133,97 @@ class RallyGeoTools:
 
             return result
 
-        _gdf = gpd.GeoDataFrame.from_features(gj["features"], crs=crs)
         _gdf = self.add_start_end_coords(_gdf)
         if "name" in _gdf.columns:
             _gdf["name"] = _gdf["name"].apply(fix_encoding)
         retcols = ["name", "stages", "start", "finish", "geometry"]
         retcols = [c for c in retcols if c in _gdf.columns]
         _gdf["stages"] = _gdf["stages"].apply(expand_hyphenated_stages)
-        return _gdf[retcols]
+        return self.add_geometry_pyramid(_gdf[retcols])
+
+    @staticmethod
+    def add_geometry_pyramid(
+        gdf, tolerances=MAP_PYRAMID_TOLERANCES, precision=MAP_COORD_PRECISION
+    ):
+        """Attach a map geometry pyramid to a stages geodataframe.
+
+        The pyramid is kept in gdf.attrs, rather than as extra geometry
+        columns, so the geodataframe still serialises as GeoJSON. It is
+        shared by (not copied into) the frames filtered from this one.
+        """
+        if gdf.empty or "geometry" not in gdf:
+            return gdf
+        gdf = gdf.copy()
+        gdf.attrs["geometry_pyramid"] = GeometryPyramid(
+            gdf.geometry, tolerances=tolerances, precision=precision
+        )
+        return gdf
+
+    @staticmethod
+    def pyramid_level(bounds, zoom=None, tolerances=MAP_PYRAMID_TOLERANCES):
+        """Pick the coarsest pyramid level that stays below a pixel on the map."""
+        if zoom:
+            deg_per_px = 360 / (256 * 2**zoom)
+        else:
+            minx, miny, maxx, maxy = bounds
+            deg_per_px = max(maxx - minx, maxy - miny) / MAP_WIDTH_PX
+        level = 0
+        for i, tolerance in enumerate(tolerances):
+            if tolerance <= deg_per_px:
+                level = i
+        return level
+
+    @staticmethod
+    def map_stages_gdf(stages_gdf, bounds=None, zoom=None):
+        """Return a lightweight copy of the stages geodataframe for map widgets."""
+        # Non-geometry, JSON friendly columns to send to the browser
+        cols = [c for c in ["name"] if c in stages_gdf.columns]
+        if stages_gdf.empty:
+            return stages_gdf[cols + ["geometry"]]
+        pyramid = stages_gdf.attrs.get("geometry_pyramid")
+        if pyramid is None or not pyramid.covers(stages_gdf.index):
+            # Eg a frame that lost its attrs along the way
+            pyramid = GeometryPyramid(stages_gdf.geometry)
+        bounds = stages_gdf.total_bounds if bounds is None else bounds
+        level = min(
+            RallyGeoTools.pyramid_level(bounds, zoom=zoom, tolerances=pyramid.tolerances),
+            len(pyramid.tolerances) - 1,
+        )
+        gdf = gpd.GeoDataFrame(
+            stages_gdf[cols],
+            geometry=pyramid.level(level).loc[stages_gdf.index],
+            crs=stages_gdf.crs,
+        )
+        gdf.attrs = {}
+        return gdf
+
+    def geojson_to_gpd(self, gj, crs="EPSG:4326"):
+        _gdf = gpd.GeoDataFrame.from_features(gj["features"], crs=crs)
+        return self._finalise_stages_gdf(_gdf)
+
+    def placemarks_to_gpd(self, placemarks, crs="EPSG:4326"):
+        """Build a stages geodataframe directly from streamed KML placemarks."""
+
+        def to_geometry(p):
+            coords = p["coords"]
+            if p["type"] == "Point":
+                return Point(coords[0][0])
+            if p["type"] == "MultiLineString":
+                return MultiLineString([c for c in coords if len(c) > 1])
+            if len(coords[0]) < 2:
+                return None
+            return LineString(coords[0])
+
+        placemarks = [p for p in placemarks if p["coords"] and len(p["coords"][0])]
+        _gdf = gpd.GeoDataFrame(
+            {
+                "name": [p["name"] for p in placemarks],
+                "stages": [p.get("stages", []) for p in placemarks],
+            },
+            geometry=[to_geometry(p) for p in placemarks],
+            crs=crs,
+        )
+        return self._finalise_stages_gdf(_gdf)
 
     @staticmethod
     def get_gdf_from_lat_lon_df(df, lat="latitude", lon="longitude", crs="EPSG:4326"):
@@ -119,7 +253,7 @@ class RallyGeoTools:
         if stages_gdf.empty:
             return None
 
-        geojson_dict = stages_gdf.__geo_interface__
+        geojson_dict = RallyGeoTools.map_stages_gdf(stages_gdf).__geo_interface__
         layer = GeoJSON(
             data=geojson_dict,
             hover_style={"fillColor": "red", "fillOpacity": 0.2},
@@ -133,7 +267,7 @@ class RallyGeoTools:
         stages=None,
         poi_gdf=None,
         labelcoords=None,
-        zoom=9,
+        zoom=None,
         buffer_percentage=0.05,
         m=None
     ):
@@ -165,14 +299,17 @@ class RallyGeoTools:
         if not m:
             print("map", m)
             print("Creating new base all event stages map")
-            m = Map(center=[(miny + maxy) / 2, (minx + maxx) / 2], zoom=zoom)
+            m = Map(center=[(miny + maxy) / 2, (minx + maxx) / 2], zoom=zoom or 9)
         else:
             print("Reusing base all event stages map")
         # Auto-fit to the bounding box
         m.fit_bounds([[miny, minx], [maxy, maxx]])
 
+        # Send simplified, quantized geometries matched to the map extent
         geo_data = GeoData(
-            geo_dataframe=stages_gdf,
+            geo_dataframe=RallyGeoTools.map_stages_gdf(
+                stages_gdf, bounds=(minx, miny, maxx, maxy), zoom=zoom
+            ),
             hover_style={"fillColor": "red", "fillOpacity": 0.2},
             name="name",
         )
@@ -0,0 +1,149 @@
+# Streaming reader for WRC stage route KML files
+#
+# The KML route files can hold hundreds of thousands of vertices.
+# Rather than decoding the whole file to a string and building nested
+# GeoJSON dicts for every coordinate, we stream the XML with iterparse
+# and parse each <coordinates> block straight into a numpy array.
+import io
+
+import numpy as np
+
+try:
+    from lxml.etree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+# Zero width characters that turn up in the WRC KML files, as UTF-8 bytes
+ZERO_WIDTH_BYTES = (b"\xe2\x80\x8b", b"\xe2\x80\x8e", b"\xe2\x80\x8f")
+
+KML_GEOMETRY_TYPES = {"Point", "LineString", "LinearRing", "Polygon"}
+
+
+def _localname(tag):
+    """Strip any namespace from an XML tag."""
+    # lxml reports comments and processing instructions with non-string tags
+    if not isinstance(tag, str):
+        return ""
+    return tag.rsplit("}", 1)[-1]
+
+
+def strip_zero_width(content):
+    """Remove zero width characters from raw KML bytes."""
+    if b"\xe2\x80" not in content:
+        return content
+    for zw in ZERO_WIDTH_BYTES:
+        content = content.replace(zw, b"")
+    return content
+
+
+def parse_kml_coordinates(text):
+    """Parse a KML coordinates string into an (N, 2) or (N, 3) float array."""
+    tuples = text.split() if text else []
+    if not tuples:
+        return np.empty((0, 2))
+    ndim = tuples[0].count(",") + 1
+    values = np.array(text.replace(",", " ").split(), dtype=float)
+    if values.size != ndim * len(tuples):
+        # Ragged tuples, eg a mix of 2D and 3D points; just keep lon, lat
+        logger.debug("Ragged KML coordinates; falling back to 2D parse")
+        return np.array(
+            [[float(v) for v in t.split(",")[:2]] for t in tuples], dtype=float
+        )
+    return values.reshape(-1, ndim)
+
+
+def iter_kml_placemarks(source):
+    """
+    Stream placemarks from a KML source.
+
+    Args:
+        source: KML as bytes, or a binary file-like object
+
+    Yields:
+        dict with name, styleUrl, geometry type and a list of coordinate arrays
+        (one array per geometry part).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(strip_zero_width(bytes(source)))
+
+    placemark = None
+    depth = 0
+    for event, elem in iterparse(source, events=("start", "end")):
+        tag = _localname(elem.tag)
+        if event == "start":
+            if tag == "Placemark":
+                placemark = {"name": "", "styleUrl": None, "type": None, "coords": []}
+                depth = 0
+            elif placemark is not None:
+                depth += 1
+            continue
+
+        if placemark is None:
+            continue
+
+        if tag == "Placemark":
+            yield placemark
+            placemark = None
+            # Free the parsed subtree as we go
+            elem.clear()
+            continue
+
+        depth -= 1
+        if tag == "name" and depth == 0:
+            placemark["name"] = (elem.text or "").strip()
+        elif tag == "styleUrl" and depth == 0:
+            placemark["styleUrl"] = (elem.text or "").strip()
+        elif tag == "coordinates":
+            placemark["coords"].append(parse_kml_coordinates(elem.text))
+            elem.text = None
+        elif tag in KML_GEOMETRY_TYPES:
+            # Nested geometries end first, so the outer type (eg Polygon) wins
+            placemark["type"] = tag
+        elif tag == "MultiGeometry":
+            placemark["type"] = f"Multi{placemark['type']}" if placemark["type"] else None
+
+
+def read_kml_placemarks(source):
+    """Return a list of placemarks that have some geometry."""
+    return [p for p in iter_kml_placemarks(source) if p["coords"] and p["type"]]
+
+
+def placemarks_to_geojson(placemarks):
+    """Convert placemarks to a kml2geojson style list of feature collections."""
+    features = []
+    for p in placemarks:
+        coords = [c.tolist() for c in p["coords"]]
+        typ = p["type"]
+        if typ == "Point":
+            coordinates = coords[0][0]
+        elif typ in ("LineString", "LinearRing"):
+            typ = "LineString"
+            coordinates = coords[0]
+        elif typ == "Polygon":
+            coordinates = coords
+        elif typ == "MultiLineString":
+            coordinates = coords
+        else:
+            # Fall back to the first part of anything more exotic
+            typ = "LineString"
+            coordinates = coords[0]
+        properties = {"name": p["name"]}
+        if p.get("styleUrl"):
+            properties["styleUrl"] = p["styleUrl"]
+        if "stages" in p:
+            properties["stages"] = p["stages"]
+        features.append(
+            {
+                "type": "Feature",
+                "properties": properties,
+                "geometry": {"type": typ, "coordinates": coordinates},
+            }
+        )
+    if not features:
+        return []
+    return [{"type": "FeatureCollection", "features": features}]
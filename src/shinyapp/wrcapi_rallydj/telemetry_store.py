@@ -0,0 +1,211 @@
+# A local store of decoded telemetry traces
+#
+# Each car's decoded telemetry for a stage is kept as a compressed .npz file
+# of typed column arrays, so re-opening a telemetry comparison doesn't have
+# to re-download and re-decode megabytes of JSON. Columns are decompressed
+# lazily, as they are first read, and a trace can be windowed by time (utx)
+# or distance (kms) without decompressing the columns that aren't wanted.
+#
+#   store = TelemetryStore("telemetry")
+#   trace = store.get(stageId, carentryid)
+#   trace.window(distance=(2.5, 4.0), columns=["speed", "throttle"])
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import logging
+
+# Logging for this package
+logger = logging.getLogger(__name__)
+
+# The columns traces are windowed on
+TIME_COL = "utx"
+DISTANCE_COL = "kms"
+
+# Stored members that aren't columns: each column's dtype and encoding,
+# as JSON text, and the frame's index, if it isn't the default one
+META_KEY = "__meta__"
+INDEX_KEY = "__index__"
+
+
+def _json_default(value):
+    # numpy scalars as their Python values, anything else as its text
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def _to_array(series):
+    """
+    A column as a typed array, and how to decode it (see _from_array).
+
+    Numeric columns are stored as they are, or, for the nullable dtypes,
+    as floats with NaN for missing values. Text is stored as fixed width
+    strings; any other values (eg with missing values, or nested dicts and
+    lists) as the JSON text of each value, or "" for pd.NA.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        return series.to_numpy(), "values"
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        return series.to_numpy(dtype=float, na_value=np.nan), "float"
+    values = series.tolist()
+    if all(isinstance(v, str) for v in values):
+        return np.array(values, dtype=str), "text"
+    encoded = ["" if v is pd.NA else json.dumps(v, default=_json_default) for v in values]
+    return np.array(encoded, dtype=str), "json"
+
+
+def _from_array(values, dtype, encoding):
+    """A stored array decoded back to its column's values, as a (numpy or
+    pandas extension) array of its original dtype."""
+    if encoding == "values":
+        return values
+    if encoding == "json":
+        decoded = np.empty(len(values), dtype=object)
+        # Assigned one by one, so that list values aren't broadcast
+        for i, v in enumerate(values):
+            decoded[i] = json.loads(v) if v else pd.NA
+        values = decoded
+    if dtype == "object":
+        return values.astype(object)
+    return pd.Series(values).astype(dtype).array
+
+
+class TelemetryTrace:
+    """A stored trace, whose columns are decompressed as they are read."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._npz = np.load(self.path, allow_pickle=False)
+        # Traces stored without dtypes are read as their stored arrays
+        self._meta = (
+            json.loads(str(self._npz[META_KEY]))
+            if META_KEY in self._npz.files
+            else {"columns": {}}
+        )
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return [c for c in self._npz.files if c not in (META_KEY, INDEX_KEY)]
+
+    def __len__(self):
+        return len(self[self.columns[0]]) if self.columns else 0
+
+    def _decoded(self, key, meta):
+        if key not in self._columns:
+            values = self._npz[key]
+            if meta:
+                values = _from_array(values, meta["dtype"], meta["encoding"])
+            self._columns[key] = values
+        return self._columns[key]
+
+    def __getitem__(self, column):
+        return self._decoded(column, self._meta["columns"].get(column))
+
+    @property
+    def index(self):
+        """The trace's index, or None for the default (0, 1, ...) index."""
+        meta = self._meta.get("index")
+        if meta is None:
+            return None
+        return pd.Index(self._decoded(INDEX_KEY, meta), name=meta["name"])
+
+    def _mask(self, column, limits):
+        lo, hi = limits
+        # Compared as stored, so nullable numbers are NaN rather than NA
+        values = self._npz[column]
+        mask = np.ones(len(values), dtype=bool)
+        if lo is not None:
+            mask &= values >= lo
+        if hi is not None:
+            mask &= values <= hi
+        return mask
+
+    def window(self, time=None, distance=None, columns=None):
+        """
+        The rows in a (start, end) time (utx) and / or distance (kms) window,
+        as a DataFrame of some (by default, all) columns. Either end of a
+        window may be None.
+        """
+        mask = None
+        for column, limits in ((TIME_COL, time), (DISTANCE_COL, distance)):
+            if limits is not None and column in self.columns:
+                _mask = self._mask(column, limits)
+                mask = _mask if mask is None else mask & _mask
+        columns = self.columns if columns is None else columns
+        index = self.index
+        if index is not None and mask is not None:
+            index = index[mask]
+        return pd.DataFrame(
+            {c: self[c] if mask is None else self[c][mask] for c in columns},
+            index=index,
+        )
+
+    def to_frame(self, columns=None):
+        return self.window(columns=columns)
+
+    def close(self):
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TelemetryStore:
+    """Decoded telemetry traces, by stage and car entry, in a directory."""
+
+    def __init__(self, path="telemetry"):
+        self.path = Path(path)
+
+    def _trace_path(self, stageId, carentryid, kind):
+        return self.path / str(stageId) / f"{carentryid}.{kind}.npz"
+
+    def has(self, stageId, carentryid, kind="telemetry"):
+        return self._trace_path(stageId, carentryid, kind).is_file()
+
+    def put(self, stageId, carentryid, df, kind="telemetry"):
+        """Store a decoded trace (kind is telemetry or merged)."""
+        path = self._trace_path(stageId, carentryid, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays, meta = {}, {"columns": {}}
+        for c in df.columns:
+            arrays[str(c)], encoding = _to_array(df[c])
+            meta["columns"][str(c)] = {"dtype": str(df[c].dtype), "encoding": encoding}
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            arrays[INDEX_KEY], encoding = _to_array(df.index.to_series())
+            meta["index"] = {
+                "dtype": str(df.index.dtype),
+                "encoding": encoding,
+                "name": df.index.name,
+            }
+        arrays[META_KEY] = np.array(json.dumps(meta, default=_json_default))
+        # Write then rename, so that a trace is never read half written
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        logger.debug(f"Stored {kind} trace for {stageId}/{carentryid}: {len(df)} rows")
+
+    def get(self, stageId, carentryid, kind="telemetry"):
+        """A stored trace, or None if there isn't one."""
+        path = self._trace_path(stageId, carentryid, kind)
+        return TelemetryTrace(path) if path.is_file() else None
+
+    def cars(self, stageId, kind="telemetry"):
+        """The car entries with a stored trace for a stage."""
+        suffix = f".{kind}.npz"
+        stage_dir = self.path / str(stageId)
+        if not stage_dir.is_dir():
+            return []
+        return sorted(p.name[: -len(suffix)] for p in stage_dir.glob(f"*{suffix}"))
@@ -0,0 +1,32 @@
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+APP_DIR = ROOT / "src" / "shinyapp"
+RESOURCES_DIR = ROOT / "resources"
+# The bundled single event timing db
+EVENT_DB = APP_DIR / "wrcRbAPITiming.db"
+
+# The app's packages are imported from the app directory, as the app does
+sys.path.insert(0, str(APP_DIR))
+
+
+@pytest.fixture
+def wrc(tmp_path):
+    """An offline timing client, on a copy of the bundled event db, set to its event."""
+    from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+
+    dbname = tmp_path / "timing.db"
+    shutil.copy(EVENT_DB, dbname)
+    client = WRCTimingResultsAPIClientV2(dbname=str(dbname), liveCatchup=False)
+    client.api_client.offline = True
+    with sqlite3.connect(dbname) as conn:
+        client.eventId, client.rallyId, client.itineraryId = conn.execute(
+            "SELECT eventId, rallyId, itineraryId FROM event_rallies LIMIT 1"
+        ).fetchone()
+    yield client
+    client.db_manager.conn.close()
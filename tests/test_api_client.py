@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from wrc_rallydj.livetiming_api2 import APIClient
+
+
+@pytest.fixture
+def api():
+    return APIClient()
+
+
+def test_event_stubs_skip_recent(api):
+    api.metrics.reset()
+    stubs = api.eventStubs(1, 2, 3)
+    assert len(stubs) == 3
+    assert api.eventStubs(1, 2, 3, skip_recent=True) == stubs
+
+    api._remember("stages_json", 1, "stages")
+    api._remember("itinerary_json", "1_3", "itinerary")
+    assert api.eventStubs(1, 2, 3, skip_recent=True) == [
+        "events/1/rallies/2/entries.json"
+    ]
+    # Looking doesn't count as a cache hit, or miss
+    assert api.metrics.to_prometheus().count("wrc_cache_total{") == 0
+
+
+def test_prefetch_while_popping(api, monkeypatch):
+    monkeypatch.setattr(
+        api, "fetch_many", lambda paths, base=None: {p: {"path": p} for p in paths}
+    )
+    errors = []
+
+    def prefetch(n):
+        try:
+            for i in range(200):
+                api.prefetch([f"p{n}_{i}_{j}" for j in range(5)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=prefetch, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        api._pop_prefetched(api._WRC_RedBull_json("p0_0_0", retUrl=True))
+    assert not errors
+    url = api._WRC_RedBull_json("p1_199_4", retUrl=True)
+    assert api._pop_prefetched(url) == {"path": "p1_199_4"}
+    assert api._pop_prefetched(url) is None
+
+
+def _concurrent_fetches(api, url, n=8):
+    """Make n concurrent fetches of a url, once they're all waiting on the first."""
+    labels = [{} for _ in range(n)]
+    results = [None] * n
+
+    def fetch(i):
+        try:
+            results[i] = api._single_flight(url, labels=labels[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    # Followers mark their labels before they wait on the leader
+    deadline = time.time() + 5
+    while sum(l.get("source") == "coalesced" for l in labels) < n - 1:
+        assert time.time() < deadline, "callers didn't coalesce"
+        time.sleep(0.01)
+    return threads, results
+
+
+@pytest.fixture
+def blocking_fetch(api, monkeypatch):
+    calls = []
+    release = threading.Event()
+    outcome = {}
+
+    def fetch_json(url, labels=None):
+        calls.append(url)
+        assert release.wait(5)
+        if "error" in outcome:
+            raise outcome["error"]
+        return {"url": url}
+
+    monkeypatch.setattr(api, "_fetch_json", fetch_json)
+    return calls, release, outcome
+
+
+def test_single_flight_coalesces(api, blocking_fetch):
+    calls, release, _ = blocking_fetch
+    threads, results = _concurrent_fetches(api, "https://example/a.json")
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert calls == ["https://example/a.json"]
+    assert results[0] == {"url": "https://example/a.json"}
+    # Every caller shares the one parsed result
+    assert all(r is results[0] for r in results)
+    assert api._inflight == {}
+
+
+def test_single_flight_error_reaches_every_caller(api, blocking_fetch):
+    calls, release, outcome = blocking_fetch
+    outcome["error"] = ConnectionError("upstream down")
+    threads, results = _concurrent_fetches(api, "https://example/b.json")
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(calls) == 1
+    assert all(r is outcome["error"] for r in results)
+    assert api._inflight == {}
+
+    # The next fetch goes upstream again
+    outcome.clear()
+    assert api._single_flight("https://example/b.json") == {"url": "https://example/b.json"}
+    assert len(calls) == 2
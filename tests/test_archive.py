@@ -0,0 +1,30 @@
+import shutil
+
+import pytest
+
+from conftest import EVENT_DB
+from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+
+
+@pytest.fixture
+def archive_db(tmp_path):
+    dbname = tmp_path / "archive.db"
+    shutil.copy(EVENT_DB, dbname)
+    return str(dbname)
+
+
+def test_archive_falls_back_to_latest_season(archive_db):
+    # The bundled db's seasons run to 2025
+    wrc = WRCTimingResultsAPIClientV2(dbname=archive_db, archive=True, year=2099)
+    wrc.seedDB()
+    wrc.initialise()
+    assert (wrc.year, wrc.seasonId) == (2025, 34)
+    session = wrc.newSession()
+    assert (session.year, session.seasonId) == (2025, 34)
+
+
+def test_archive_keeps_a_season_it_has(archive_db):
+    wrc = WRCTimingResultsAPIClientV2(dbname=archive_db, archive=True, year=2023)
+    wrc.seedDB()
+    wrc.setSeason()
+    assert (wrc.year, wrc.seasonId) == (2023, 20)
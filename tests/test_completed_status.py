@@ -0,0 +1,61 @@
+from pandas import DataFrame
+
+from wrc_rallydj.livetiming_api2 import DatabaseManager
+
+TABLES = ["stage_overall", "stage_times", "progression", "split_times"]
+
+
+def _stored(wrc, stageId, table):
+    """The per stage, per table query the flags replace."""
+    sql = f"""SELECT meta.* FROM meta_completed_stage_tables AS meta WHERE stageId={stageId} AND tableType="{table}";"""
+    return not wrc.query(sql=sql).empty
+
+
+def test_flags_match_the_meta_table(wrc):
+    status = wrc.getCompletedStatus()
+    stage_info = wrc.query("SELECT stageId, status FROM stage_info")
+    assert status["stages"] == dict(
+        zip(stage_info["stageId"], stage_info["status"].str.lower())
+    )
+    for stageId in status["stages"]:
+        for table in TABLES:
+            assert wrc.checkCompletedStageTableStatus(stageId, table) == _stored(
+                wrc, stageId, table
+            )
+
+
+def test_marking_a_table_complete(wrc):
+    stageId = 8330
+    before = wrc.getCompletedStatus()
+    assert (stageId, "split_times") not in before["completed"]
+
+    wrc._updateCompletedStagesStatus(stageId, "split_times", "completed")
+    after = wrc.getCompletedStatus()
+    assert (stageId, "split_times") in after["completed"]
+    assert _stored(wrc, stageId, "split_times")
+    # Updated in memory, without changing what other readers hold
+    assert (stageId, "split_times") not in before["completed"]
+    assert after["stages"] is before["stages"]
+
+
+def test_changes_from_another_connection(wrc):
+    stageId = 8331
+    status = wrc.getCompletedStatus()
+    assert wrc.getCompletedStatus() is status
+
+    other = DatabaseManager(wrc.db_manager.dbname)
+    other.dbfy(
+        DataFrame([{"stageId": stageId, "tableType": "split_times", "status": "completed"}]),
+        "meta_completed_stage_tables",
+        pk=["tableType", "stageId"],
+    )
+    assert wrc.checkCompletedStageTableStatus(stageId, "split_times")
+
+    other.dbfy(
+        DataFrame([{"stageId": stageId, "status": "Running"}]),
+        "stage_info",
+        pk="stageId",
+    )
+    other.conn.close()
+    assert wrc.getCompletedStatus()["stages"][stageId] == "running"
+    assert wrc.handleStageCompleted(stageId) is False
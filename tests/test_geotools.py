@@ -0,0 +1,103 @@
+import json
+import re
+
+import pytest
+
+from conftest import RESOURCES_DIR
+
+pytest.importorskip("geopandas")
+pytest.importorskip("ipyleaflet")
+
+from wrcapi_rallydj.data_api import simple_stage_list  # noqa: E402
+from wrcapi_rallydj.geotools import RallyGeoTools  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def stages_gdf():
+    gj = json.loads((RESOURCES_DIR / "belgium_2022.json").read_text())[0]
+    for feature in gj["features"]:
+        # eg SS 1-5 Vleteren runs as SS1 and SS5
+        name = feature["properties"]["name"]
+        numbers = re.match(r"SS\s*([\d-]+)", name)
+        feature["properties"]["stages"] = (
+            [f"SS{n}" for n in numbers.group(1).split("-")] if numbers else [name]
+        )
+    return RallyGeoTools().geojson_to_gpd(gj)
+
+
+def test_stages_gdf_serialises(stages_gdf):
+    assert list(stages_gdf.geometry.geom_type.unique()) == ["Point", "LineString"]
+    assert json.loads(stages_gdf.to_json())["features"]
+    json.dumps(stages_gdf.__geo_interface__)
+
+
+def test_pyramid_is_shared_by_filtered_frames(stages_gdf):
+    pyramid = stages_gdf.attrs["geometry_pyramid"]
+    filtered = stages_gdf[stages_gdf["stages"].apply(lambda x: "SS1" in x)]
+    assert len(filtered) == 1
+    assert filtered.attrs["geometry_pyramid"] is pyramid
+
+
+def test_map_stages_gdf_levels(stages_gdf):
+    full = RallyGeoTools.map_stages_gdf(stages_gdf, zoom=18)
+    coarse = RallyGeoTools.map_stages_gdf(stages_gdf, zoom=5)
+    assert list(full.columns) == ["name", "geometry"]
+    assert full.index.equals(stages_gdf.index)
+    vertices = lambda gdf: sum(len(g.coords) for g in gdf.geometry)  # noqa: E731
+    assert vertices(coarse) < vertices(full) == vertices(stages_gdf)
+    # 2D, and quantized
+    x, y = full.geometry.iloc[1].coords[0]
+    assert x == round(x, 5) and y == round(y, 5)
+    json.dumps(coarse.__geo_interface__)
+
+
+def test_map_stages_gdf_zoom_overrides_bounds(stages_gdf):
+    bounds = stages_gdf.total_bounds
+    level = RallyGeoTools.pyramid_level(bounds)
+    assert RallyGeoTools.pyramid_level(bounds, zoom=18) == 0
+    assert RallyGeoTools.pyramid_level(bounds, zoom=3) > level
+
+
+def test_map_stages_gdf_without_pyramid(stages_gdf):
+    stripped = stages_gdf.copy()
+    stripped.attrs = {}
+    assert RallyGeoTools.map_stages_gdf(stripped, zoom=18).geometry.equals(
+        RallyGeoTools.map_stages_gdf(stages_gdf, zoom=18).geometry
+    )
+
+
+def test_badly_behaved_stage_names():
+    gj = json.loads((RESOURCES_DIR / "portugal_2022.json").read_text())[0]
+    stages = {
+        "Service Park - RALLY HQ": ["Service Park - RALLY HQ"],
+        "SS2/5 Lousã": ["SS2-5"],
+        "SS9 - Lousada": ["SS9"],
+    }
+    gj["features"] = [
+        f for f in gj["features"] if f["properties"]["name"] in stages
+    ]
+    for feature in gj["features"]:
+        feature["properties"]["stages"] = stages[feature["properties"]["name"]]
+    gdf = RallyGeoTools().geojson_to_gpd(gj)
+    assert gdf["stages"].tolist() == [
+        ["Service Park - RALLY HQ"],
+        ["SS2", "SS5"],
+        ["SS9"],
+    ]
+
+
+@pytest.mark.parametrize(
+    "name, stages",
+    [
+        ("SS 1/5 Start - Finish", ["SS1", "SS5"]),
+        ("SS01 Coimbra", ["SS1"]),
+        ("SS9 - Lousada", ["SS9"]),
+        ("SS 1-5 Vleteren", ["SS1", "SS5"]),
+        ("SS-2/5 Stanczyki", ["SS2", "SS5"]),
+        ("SSS-1 Mikolajki Arena", ["SS1"]),
+        ("SD Start - Finish", ["SD Start - Finish"]),
+        ("Service Park - RALLY HQ", ["Service Park - RALLY HQ"]),
+    ],
+)
+def test_simple_stage_list(name, stages):
+    assert simple_stage_list(name) == stages
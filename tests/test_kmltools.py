@@ -0,0 +1,67 @@
+import io
+import json
+from xml.sax.saxutils import escape
+
+import pytest
+
+from conftest import RESOURCES_DIR
+from wrcapi_rallydj.kmltools import placemarks_to_geojson, read_kml_placemarks
+
+# The bundled route files are the GeoJSON that kml2geojson made of the WRC KML
+PARITY_ROUTES = ["belgium_2022", "finland_2024"]
+
+
+def _coordinates(coords):
+    return " ".join(",".join(repr(v) for v in c) for c in coords)
+
+
+def geojson_to_kml(collections):
+    """Write kml2geojson style GeoJSON back out as a KML document, with the
+    zero width characters that turn up in the WRC files in the names."""
+    placemarks = []
+    for feature in collections[0]["features"]:
+        props = feature["properties"]
+        geometry = feature["geometry"]
+        if geometry["type"] == "Point":
+            shape = f"<Point><coordinates>{_coordinates([geometry['coordinates']])}</coordinates></Point>"
+        else:
+            shape = f"<LineString><tessellate>1</tessellate><coordinates>\n{_coordinates(geometry['coordinates'])}\n</coordinates></LineString>"
+        placemarks.append(
+            "<Placemark>"
+            f"<name>{escape(props['name'])}\u200b</name>"
+            f"<styleUrl>{props['styleUrl']}</styleUrl>"
+            f"{shape}</Placemark>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>Route</name>'
+        '<Style id="s"><IconStyle><scale>1.1</scale></IconStyle></Style>'
+        f"<Folder><name>Stages</name>{''.join(placemarks)}</Folder>"
+        "</Document></kml>"
+    ).encode("utf-8")
+
+
+@pytest.mark.parametrize("route", PARITY_ROUTES)
+def test_geojson_matches_kml2geojson(route):
+    expected = json.loads((RESOURCES_DIR / f"{route}.json").read_text())
+    kml = geojson_to_kml(expected)
+    assert placemarks_to_geojson(read_kml_placemarks(kml)) == expected
+
+
+@pytest.mark.parametrize("route", PARITY_ROUTES)
+def test_geojson_matches_kml2geojson_converter(route):
+    kml2geojson = pytest.importorskip("kml2geojson")
+    kml = geojson_to_kml(json.loads((RESOURCES_DIR / f"{route}.json").read_text()))
+    expected = kml2geojson.main.convert(
+        io.StringIO(kml.decode("utf-8").replace("\u200b", ""))
+    )
+    # Newer kml2geojson releases wrap the collections in a dict
+    if isinstance(expected, dict):
+        expected = expected["feature_collections"]
+    features = [f for collection in expected for f in collection["features"]]
+    for feature in features:
+        feature["properties"] = {
+            k: v for k, v in feature["properties"].items() if k in ("name", "styleUrl")
+        }
+    [collection] = placemarks_to_geojson(read_kml_placemarks(kml))
+    assert collection["features"] == features
@@ -0,0 +1,81 @@
+import sys
+
+import pytest
+
+import lazy_imports
+from lazy_imports import Lazy, import_time_report, lazy_import
+
+MODULE = "wrc_lazy_test_module"
+
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    (tmp_path / f"{MODULE}.py").write_text(
+        "VALUE = 42\n"
+        "def double(x):\n"
+        "    return 2 * x\n"
+        "class Thing:\n"
+        "    def __init__(self, n):\n"
+        "        self.n = n\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, MODULE, raising=False)
+    monkeypatch.delitem(lazy_imports.IMPORT_TIMES, MODULE, raising=False)
+    yield MODULE
+    sys.modules.pop(MODULE, None)
+
+
+def test_lazy_module(module):
+    mod = lazy_import(module)
+    assert module not in sys.modules
+    assert "deferred" in repr(mod)
+
+    assert mod.VALUE == 42
+    assert module in sys.modules
+    assert module in lazy_imports.IMPORT_TIMES
+    assert "loaded" in repr(mod)
+    # Behaves like the real module
+    real = sys.modules[module]
+    assert mod.double is real.double
+    assert mod.double(4) == 8
+    with pytest.raises(AttributeError):
+        mod.nonesuch
+
+
+def test_lazy_names(module):
+    double, Thing = lazy_import(module, "double", "Thing")
+    value = lazy_import(module, "VALUE")
+    assert module not in sys.modules
+
+    assert double(3) == 6
+    assert module in sys.modules
+    thing = Thing(5)
+    assert isinstance(thing, sys.modules[module].Thing)
+    assert thing.n == 5
+    assert value.real == 42
+
+
+def test_lazy_factory_called_once():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return "text"
+
+    lazy = Lazy(factory, "text")
+    assert not calls
+    assert lazy.upper() == "TEXT"
+    assert lazy.lower() == "text"
+    assert calls == [1]
+    # Private attributes aren't passed through to the object
+    with pytest.raises(AttributeError):
+        lazy._nonesuch
+
+
+def test_import_time_report():
+    report = import_time_report(["colorsys"], budget_ms=0.000001)
+    assert [package for package, _, _ in report] == ["colorsys"]
+    _, ms, over = report[0]
+    assert ms > 0
+    assert over
+    assert not import_time_report(["colorsys"])[0][2]
@@ -0,0 +1,72 @@
+import pytest
+
+from wrc_rallydj.metrics import Histogram, MetricsRegistry, endpoint_template
+
+
+@pytest.mark.parametrize(
+    "path, template",
+    [
+        (
+            "events/535/stages/1/stagetimes.json?rallyId=583",
+            "events/{id}/stages/{id}/stagetimes.json?rallyId",
+        ),
+        ("events/535/stages.json", "events/{id}/stages.json"),
+        ("events/535/itineraries/1234.json", "events/{id}/itineraries/{id}.json"),
+        (
+            "events/535/rallies/583/entries.json",
+            "events/{id}/rallies/{id}/entries.json",
+        ),
+        ("season-detail.json?seasonId=20", "season-detail.json?seasonId"),
+        (
+            "championship-detail.json?championshipId=289&seasonId=34",
+            "championship-detail.json?championshipId&seasonId",
+        ),
+        # Numbers that aren't whole path segments are kept
+        ("events/wrc2025/stages.json", "events/wrc2025/stages.json"),
+    ],
+)
+def test_endpoint_template(path, template):
+    assert endpoint_template(path) == template
+
+
+@pytest.fixture
+def histogram():
+    h = Histogram((1, 2, 5, 10))
+    for value in [0.5, 1, 1.5, 3, 3, 4, 7, 20]:
+        h.observe(value)
+    return h
+
+
+def test_histogram_counts(histogram):
+    assert histogram.counts == [2, 1, 3, 1]
+    assert histogram.count == 8
+    assert histogram.sum == 40
+    assert histogram.max == 20
+
+
+@pytest.mark.parametrize(
+    "q, bound", [(0, 1), (0.25, 1), (0.3, 2), (0.5, 5), (0.75, 5), (0.8, 10), (0.9, 20), (1, 20)]
+)
+def test_histogram_quantile(histogram, q, bound):
+    # The bucket bound covering the quantile, or the max past the last bucket
+    assert histogram.quantile(q) == bound
+
+
+def test_empty_histogram_quantile():
+    assert Histogram((1, 2)).quantile(0.5) is None
+
+
+def test_registry_prometheus_text():
+    registry = MetricsRegistry()
+    registry.inc("wrc_cache_total", cache="memory", key="stages_json", result="hit")
+    registry.inc("wrc_cache_total", cache="memory", key="stages_json", result="hit")
+    registry.observe("wrc_db_write_seconds", 0.02, table="stage_times", writer="sync")
+    text = registry.to_prometheus()
+    assert (
+        'wrc_cache_total{cache="memory",key="stages_json",result="hit"} 2' in text
+    )
+    assert (
+        'wrc_db_write_seconds_bucket{table="stage_times",writer="sync",le="0.025"} 1'
+        in text
+    )
+    assert 'wrc_db_write_seconds_count{table="stage_times",writer="sync"} 1' in text
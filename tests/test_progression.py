@@ -0,0 +1,32 @@
+"""The materialized progression tables against the pivot they replace."""
+
+import pytest
+from pandas.testing import assert_frame_equal
+
+from wrc_rallydj.livetiming_api2 import WRCTimingResultsAPIClientV2
+
+
+def _pivoted(wrc, monkeypatch, **kwargs):
+    with monkeypatch.context() as m:
+        m.setattr(wrc, "_getProgressionWide", lambda **kwargs: None)
+        return wrc.getStageOverallWide(**kwargs)
+
+
+@pytest.mark.parametrize("typ", WRCTimingResultsAPIClientV2.PROGRESSION_TYPES)
+@pytest.mark.parametrize("priority", [None, "P2"])
+# Up to an early stage, and to the last, after some retirements
+@pytest.mark.parametrize("stageId", [8335, 8347])
+def test_progression_matches_pivot(wrc, monkeypatch, typ, priority, stageId):
+    if priority and typ == "Chase":
+        pytest.skip("Category chase is always pivoted")
+    kwargs = dict(stageId=stageId, priority=priority, completed=True, typ=typ)
+    expected = _pivoted(wrc, monkeypatch, **kwargs)
+    # Materialized on the first read, then read back
+    for _ in range(2):
+        wide = wrc.getStageOverallWide(**kwargs)
+        assert_frame_equal(
+            wide.reset_index(drop=True), expected.reset_index(drop=True)
+        )
+    assert not wrc.query(
+        'SELECT * FROM meta_completed_stage_tables WHERE tableType="progression"'
+    ).empty
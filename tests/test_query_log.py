@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from wrc_rallydj.query_log import QueryLog, fingerprint, table_aliases
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        (
+            'SELECT st.* FROM stage_times AS st INNER JOIN entries AS e ON st.entryId=e.entryId WHERE st.eventId=535 AND e.priority LIKE "%P1" AND st.stageId IN (1, 2,3);',
+            "SELECT st.* FROM stage_times AS st INNER JOIN entries AS e ON st.entryId=e.entryId WHERE st.eventId=? AND e.priority LIKE ? AND st.stageId IN (?...)",
+        ),
+        (
+            "select *\n  from t where name='O''Brien' and x=-1.5",
+            "select * from t where name=? and x=?",
+        ),
+        # Quoted identifiers, and numbers in names, are kept
+        (
+            'SELECT p."SS12" FROM "progression_Gap" AS p WHERE p.rallyId=583',
+            'SELECT p."SS12" FROM "progression_Gap" AS p WHERE p.rallyId=?',
+        ),
+    ],
+)
+def test_fingerprint(query, expected):
+    assert fingerprint(query) == expected
+
+
+def test_fingerprint_groups_runs_of_a_query():
+    sql = "SELECT * FROM stage_times WHERE stageId={} AND status!=\"{}\""
+    assert fingerprint(sql.format(1, "DNS")) == fingerprint(sql.format(22, "DNF"))
+
+
+def test_table_aliases():
+    sql = """SELECT d.code, st.* FROM stage_times AS st
+    INNER JOIN entries e ON st.entryId=e.entryId
+    LEFT JOIN entries_drivers AS d ON e.driverId=d.personId
+    INNER JOIN stage_info ON stage_info.stageId=st.stageId
+    WHERE 1=1"""
+    assert table_aliases(sql) == {
+        "stage_times": {"stage_times"},
+        "st": {"stage_times"},
+        "entries": {"entries"},
+        "e": {"entries"},
+        "entries_drivers": {"entries_drivers"},
+        "d": {"entries_drivers"},
+        "stage_info": {"stage_info"},
+    }
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        """
+        CREATE TABLE stage_times (stageTimeId INTEGER PRIMARY KEY, stageId INT, entryId INT, position INT);
+        CREATE INDEX st_stage ON stage_times(stageId);
+        CREATE TABLE entries (entryId INTEGER PRIMARY KEY, priority TEXT);
+        CREATE VIEW ranked AS SELECT x.*, ROW_NUMBER() OVER (PARTITION BY x.stageId ORDER BY x.position) AS rn FROM stage_times AS x;
+        """
+    )
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "query, full_scans",
+    [
+        ("SELECT * FROM stage_times AS st WHERE st.position=1", ["stage_times"]),
+        ("SELECT * FROM stage_times AS st WHERE st.stageId=1", []),
+        # Unwatched tables aren't reported
+        ("SELECT * FROM entries", []),
+        (
+            "SELECT * FROM entries AS e INNER JOIN stage_times AS st ON st.entryId=e.entryId",
+            ["stage_times"],
+        ),
+        # Scans inside a view are resolved through the view's aliases
+        ("SELECT * FROM ranked AS r WHERE r.stageId=1", []),
+        ("SELECT * FROM ranked AS r WHERE r.position=1", ["stage_times"]),
+    ],
+)
+def test_explain_full_scans(conn, query, full_scans):
+    plan, scans = QueryLog().explain(query, conn)
+    assert plan
+    assert scans == full_scans
+
+
+def test_explain_bad_query(conn):
+    plan, scans = QueryLog().explain("SELECT * FROM nonesuch", conn)
+    assert plan[0].startswith("(could not explain")
+    assert scans == []
+
+
+def test_record_explains_first_slow_run(conn):
+    log = QueryLog(threshold_ms=10)
+    query = "SELECT * FROM stage_times WHERE position={}"
+    log.record(query.format(1), 0.001, conn)
+    log.record(query.format(2), 0.05, conn)
+    log.record(query.format(3), 0.05, conn)
+    (stats,) = log.stats.values()
+    assert stats.count == 3
+    assert stats.example == query.format(2)
+    assert stats.full_scans == ["stage_times"]
+    assert "FULL SCAN stage_times" in log.report()
@@ -0,0 +1,107 @@
+"""The ranked views against the pandas post-processing they replaced."""
+
+import shutil
+import sqlite3
+
+import pytest
+from numpy import nan, where
+from pandas import notnull
+from pandas.testing import assert_series_equal
+
+from wrc_rallydj.db_table_schemas import RANKED_VIEWS
+
+STAGE_IDS = range(8330, 8348)
+
+
+def _rounded(ms):
+    return ms.apply(lambda x: round(x / 1000, 1) if notnull(x) else nan)
+
+
+def _pandas_stage_times(df):
+    """categoryPosition, Gap and Diff as getStageTimes used to compute them."""
+    df = df.copy()
+    df["roadPos"] = range(1, len(df) + 1)
+    df.sort_values("position", inplace=True)
+    df["categoryPosition"] = range(1, len(df) + 1)
+    df.sort_values("roadPos", inplace=True)
+    df["Gap"] = _rounded(df["diffFirstMs"])
+    df["Diff"] = _rounded(df["diffPrevMs"])
+    return df
+
+
+def _pandas_overall(df):
+    """categoryPosition, Gap, Diff and Chase as getStageOverallResults used to compute them."""
+    df = df.sort_values(["stageOrder", "position"])
+    df["categoryPosition"] = df.groupby(["stageId"]).cumcount() + 1
+    for col, ms in [("Gap", "diffFirstMs"), ("Diff", "diffPrevMs")]:
+        df[col] = df.groupby("stageId")[ms].transform(
+            lambda group: where(notnull(group), group.div(1000).round(1), nan)
+        )
+    # Within the stage: the old shift(-1) ran on into the next stage
+    df["Chase"] = df.groupby("stageId")["Diff"].shift(-1)
+    return df
+
+
+def _assert_columns_equal(df, expected, cols):
+    for col in cols:
+        assert_series_equal(
+            df[col].astype(float), expected[col].astype(float), check_names=False
+        )
+
+
+@pytest.mark.parametrize("priority", [None, "P1", "P2", "P4"])
+def test_stage_times_match_pandas(wrc, priority):
+    for stageId in STAGE_IDS:
+        df = wrc.getStageTimes(
+            stageId=stageId, raw=False, rebaseToCategory=False, priority=priority
+        )
+        if df.empty:
+            continue
+        # Rows come back in road order
+        assert df["stageTimeId"].is_monotonic_increasing
+        _assert_columns_equal(
+            df, _pandas_stage_times(df), ["categoryPosition", "Gap", "Diff"]
+        )
+
+
+@pytest.mark.parametrize("priority", [None, "P1", "P2"])
+def test_overall_matches_pandas(wrc, priority):
+    df = wrc.getStageOverallResults(
+        stageId=STAGE_IDS[-1], completed=True, raw=False, priority=priority
+    )
+    assert df["stageId"].nunique() == len(STAGE_IDS)
+    _assert_columns_equal(
+        df, _pandas_overall(df), ["categoryPosition", "Gap", "Diff", "Chase"]
+    )
+
+
+def test_db_without_views(wrc):
+    ranked = wrc.getStageTimes(stageId=8330, raw=False, rebaseToCategory=False)
+    with wrc.db_manager.lock:
+        for name in ["stage_times_ranked", "stage_times_class_ranked"]:
+            wrc.db_manager.conn.execute(f"DROP VIEW {name}")
+    wrc.db_manager._views.clear()
+    assert wrc.db_manager.view("stage_times_ranked").startswith("(")
+    subquery = wrc.getStageTimes(stageId=8330, raw=False, rebaseToCategory=False)
+    _assert_columns_equal(subquery, ranked, ["categoryPosition", "Gap", "Diff"])
+
+
+def test_read_only_db_without_views(tmp_path):
+    from conftest import EVENT_DB
+    from wrc_rallydj.livetiming_api2 import DatabaseManager
+
+    dbname = tmp_path / "old.db"
+    shutil.copy(EVENT_DB, dbname)
+    with sqlite3.connect(dbname) as conn:
+        for name in RANKED_VIEWS:
+            conn.execute(f"DROP VIEW IF EXISTS {name}")
+        conn.execute("DROP TABLE IF EXISTS meta_table_versions")
+        schema = conn.execute("SELECT name FROM sqlite_master").fetchall()
+
+    db = DatabaseManager(str(dbname), dbReadOnly=True)
+    # The schema isn't touched
+    assert db.conn.execute("SELECT name FROM sqlite_master").fetchall() == schema
+    view = db.view("stage_times_ranked")
+    assert view.startswith("(")
+    assert db.read_sql(f"SELECT * FROM {view} AS st WHERE st.stageId=8330").shape[0]
+    db.conn.close()
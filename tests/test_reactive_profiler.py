@@ -0,0 +1,133 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("shiny")
+
+from shiny import reactive, render
+from shiny.session import session_context
+
+import reactive_profiler
+
+NAP = 0.02
+
+
+class FakeSession:
+    def __init__(self, inputs=None):
+        self.id = "s1"
+        self.ns = None
+        self.input = SimpleNamespace() if inputs is None else SimpleNamespace(_map=inputs)
+        self.ended = []
+
+    def on_ended(self, fn):
+        self.ended.append(fn)
+
+    def on_destroy(self, fn):
+        pass
+
+    def output(self, renderer):
+        pass
+
+
+@pytest.fixture
+def profiler(monkeypatch, tmp_path):
+    # Put shiny's decorators back afterwards
+    monkeypatch.setattr(reactive, "calc", reactive.calc)
+    monkeypatch.setattr(reactive, "effect", reactive.effect)
+    for renderer in reactive_profiler.RENDERERS:
+        if hasattr(render, renderer):
+            monkeypatch.setattr(render, renderer, getattr(render, renderer))
+    try:
+        import shinywidgets
+
+        monkeypatch.setattr(shinywidgets, "render_widget", shinywidgets.render_widget)
+    except ImportError:
+        pass
+    monkeypatch.setattr(reactive_profiler, "_installed", False)
+    monkeypatch.setattr(reactive_profiler, "PROFILES", {})
+    monkeypatch.setenv("WRC_PROFILE_REACTIVE", str(tmp_path))
+    reactive_profiler.install()
+    return tmp_path
+
+
+def _graph():
+    stage = reactive.value("SS1")
+
+    @reactive.calc
+    def times():
+        time.sleep(NAP)
+        return [stage(), 1, 2]
+
+    @reactive.calc
+    def table():
+        return len(times())
+
+    @render.text
+    def report():
+        return f"{table()} rows"
+
+    return stage, table, report
+
+
+async def _render(renderer):
+    with reactive.isolate():
+        return await renderer.render()
+
+
+def test_profile_calc_and_render(profiler):
+    stage = reactive.value("SS1")
+    session = FakeSession({"stage": stage})
+    with session_context(session):
+        # Nodes run in the session they were created in
+        _, table, report = _graph()
+        with reactive.isolate():
+            assert table() == 3
+            assert table() == 3
+        assert asyncio.run(_render(report)) == "3 rows"
+
+    profile = reactive_profiler.PROFILES["s1"]
+    nodes = profile.nodes
+    # A calc only runs again when it's invalidated
+    assert (nodes["times"].runs, nodes["table"].runs, nodes["report"].runs) == (1, 1, 1)
+    assert nodes["times"].total >= NAP
+    # Self time is less the nested calcs
+    assert nodes["table"].total >= nodes["times"].total
+    assert nodes["table"].self_time < NAP
+    assert nodes["report"].kind == "render"
+    assert nodes["times"].triggers == {"stage": 1}
+
+    stacks = dict(
+        line.rsplit(" ", 1) for line in profile.folded_stacks().splitlines()
+    )
+    assert set(stacks) == {
+        "calc:table;calc:times",
+        "calc:table",
+        "render:report",
+    }
+    assert int(stacks["calc:table;calc:times"]) >= NAP * 1000
+
+    # The profile is written out when the session ends
+    (ended,) = session.ended
+    ended()
+    assert "s1" not in reactive_profiler.PROFILES
+    assert (profiler / "s1.folded").read_text().startswith("calc:table")
+    summary = (profiler / "s1.txt").read_text().splitlines()
+    assert [line.split()[0] for line in summary[2:]] == ["table", "times", "report"]
+
+
+def test_profile_without_session_inputs(profiler):
+    session = FakeSession()
+    with session_context(session):
+        _, table, _ = _graph()
+        with reactive.isolate():
+            assert table() == 3
+    assert reactive_profiler.PROFILES["s1"].nodes["table"].triggers == {"(none)": 1}
+
+
+def test_not_profiled_outside_a_session(profiler):
+    _, table, _ = _graph()
+    with reactive.isolate():
+        assert table() == 3
+    assert reactive_profiler.PROFILES == {}
@@ -0,0 +1,94 @@
+import pytest
+
+STAGE_ID = 8330
+
+
+def _bump_leader(wrc, ms):
+    """Rewrite the stage winner's time, as a refresh from the API might."""
+    times = wrc.db_manager.read_sql(
+        f"SELECT * FROM stage_times WHERE stageId={STAGE_ID} ORDER BY position LIMIT 1"
+    )
+    times["elapsedDurationMs"] += ms
+    wrc.dbfy(times, "stage_times", pk="stageTimeId")
+
+
+def test_live_refresh_invalidates_before_the_cache_is_read(wrc, monkeypatch):
+    wrc.liveCatchup = True
+    refreshes = []
+
+    def refresh(**kwargs):
+        refreshes.append(kwargs)
+        if len(refreshes) == 2:
+            _bump_leader(wrc, 500)
+
+    monkeypatch.setattr(wrc, "_refreshStageTimes", refresh)
+    first = wrc._getCategoryRebasedStageTimes(STAGE_ID)
+    # The refresh on this poll writes new stage times, which this poll returns
+    second = wrc._getCategoryRebasedStageTimes(STAGE_ID)
+    assert len(refreshes) == 2
+    assert not first["elapsedDurationMs"].equals(second["elapsedDurationMs"])
+    assert second["elapsedDurationMs"].sum() == first["elapsedDurationMs"].sum() + 500
+
+
+def test_cached_times_are_not_shared_with_callers(wrc):
+    first = wrc._getCategoryRebasedStageTimes(STAGE_ID)
+    first["Gap"] = -1
+    second = wrc._getCategoryRebasedStageTimes(STAGE_ID)
+    assert (second["Gap"] != -1).any()
+    second.drop(columns="Gap", inplace=True)
+    assert "Gap" in wrc._getCategoryRebasedStageTimes(STAGE_ID)
+
+
+def test_category_stage_times_match_uncached(wrc):
+    wrc.stageId = STAGE_ID
+    for priority in ["P1", "P2"]:
+        cached = wrc.getStageTimes(stageId=STAGE_ID, priority=priority, raw=False)
+        direct = wrc.getStageTimes(
+            stageId=STAGE_ID, priority=priority, raw=False, rebaseToCategory=False
+        )
+        assert cached["entryId"].tolist() == direct["entryId"].tolist()
+        # Rows are in road order
+        assert sorted(cached["categoryPosition"]) == list(range(1, len(cached) + 1))
+        assert cached.loc[cached["categoryPosition"] == 1, "Gap"].iloc[0] == 0
+
+
+def _by_hand(wrc, priority):
+    """Gap, Diff and pace diff for a class, worked out from the raw stage times."""
+    (distance,) = wrc.db_manager.conn.execute(
+        f"SELECT distance FROM stage_info WHERE stageId={STAGE_ID}"
+    ).fetchone()
+    rows = wrc.db_manager.conn.execute(
+        f"""SELECT st.entryId, st.elapsedDurationMs FROM stage_times AS st
+        INNER JOIN entries AS e ON st.entryId=e.entryId
+        WHERE st.stageId={STAGE_ID} AND st.status!="DNS" AND e.priority LIKE "%{priority}"
+        AND st.position IS NOT NULL ORDER BY st.position"""
+    ).fetchall()
+    leader_ms = rows[0][1]
+    leader_pace = round(round(leader_ms / 1000, 1) / distance, 2)
+    expected, prev_ms = {}, leader_ms
+    for entryId, ms in rows:
+        pace = round(round(ms / 1000, 1) / distance, 2)
+        expected[entryId] = (
+            round((ms - leader_ms) / 1000, 1),
+            round((ms - prev_ms) / 1000, 1),
+            round(pace - leader_pace, 2),
+        )
+        prev_ms = ms
+    return expected
+
+
+def test_category_stage_times_rebased_to_class_leader(wrc):
+    wrc.stageId = STAGE_ID
+    expected = _by_hand(wrc, "P2")
+    assert len(expected) > 2
+    times = wrc.getStageTimes(stageId=STAGE_ID, priority="P2", raw=False)
+    times = times.set_index("entryId").loc[list(expected)]
+    for entryId, (gap, diff, pace_diff) in expected.items():
+        row = times.loc[entryId]
+        assert row["Gap"] == pytest.approx(gap)
+        assert row["Diff"] == pytest.approx(diff)
+        assert row["pace diff (s/km)"] == pytest.approx(pace_diff, abs=0.005)
+    # Not the overall stage leader
+    assert times["Gap"].iloc[0] == 0
+    overall = wrc.getStageTimes(stageId=STAGE_ID, raw=False, rebaseToCategory=False)
+    assert overall.set_index("entryId").loc[list(expected)[0], "Gap"] > 0
@@ -0,0 +1,85 @@
+from datetime import date
+
+import pytest
+
+from wrc_rallydj.replay import StageSimulator
+
+
+class Clock:
+    t0 = 0
+
+    def __init__(self):
+        self.t = 0
+
+    def now(self):
+        return self.t
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def simulator(clock):
+    # 20 minute stages with 10 minute gaps: stage 1 runs from 600s to 1800s,
+    # stage 2 from 2400s to 3600s
+    stages = [{"stageId": 2, "number": 2}, {"stageId": 1, "number": 1}]
+    return StageSimulator(clock, stages, events=[535])
+
+
+def _statuses(simulator):
+    stages = [{"stageId": 1}, {"stageId": 2}, {"stageId": 99, "status": "Completed"}]
+    return [s.get("status") for s in simulator.rewrite("events/535/stages.json", stages)]
+
+
+def test_stage_statuses(simulator, clock):
+    assert _statuses(simulator) == ["ToRun", "ToRun", "Completed"]
+    clock.t = 1200
+    assert _statuses(simulator) == ["Running", "ToRun", "Completed"]
+    clock.t = 3000
+    assert _statuses(simulator) == ["Completed", "Running", "Completed"]
+    clock.t = 4000
+    assert _statuses(simulator) == ["Completed", "Completed", "Completed"]
+
+
+def test_itinerary_statuses(simulator, clock):
+    itinerary = {
+        "itineraryLegs": [
+            {"itinerarySections": [{"stages": [{"stageId": 1, "status": "Completed"}]}]}
+        ]
+    }
+    clock.t = 1200
+    rewritten = simulator.rewrite("events/535/itineraries/1.json", itinerary)
+    stage = rewritten["itineraryLegs"][0]["itinerarySections"][0]["stages"][0]
+    assert stage["status"] == "Running"
+    # The recorded response isn't changed
+    assert itinerary["itineraryLegs"][0]["itinerarySections"][0]["stages"][0][
+        "status"
+    ] == "Completed"
+
+
+@pytest.mark.parametrize(
+    "t, finished", [(0, 0), (600, 0), (900, 2), (1200, 5), (1800, 10), (9999, 10)]
+)
+def test_stage_feed_share(simulator, clock, t, finished):
+    clock.t = t
+    times = list(range(10))
+    for feed in ["stagetimes", "splittimes", "results"]:
+        path = f"events/535/stages/1/{feed}.json?rallyId=583"
+        assert simulator.rewrite(path, times) == times[:finished]
+    # Stages that aren't being simulated are served as recorded
+    assert simulator.rewrite("events/535/stages/99/stagetimes.json", times) == times
+
+
+def test_simulated_events_are_today(simulator):
+    detail = {
+        "seasonRounds": [
+            {"event": {"eventId": 535, "startDate": "2024-01-25"}},
+            {"event": {"eventId": 536, "startDate": "2024-02-15"}},
+        ]
+    }
+    rewritten = simulator.rewrite("season-detail.json?seasonId=20", detail)
+    assert rewritten["seasonRounds"][0]["event"]["startDate"] == date.today().isoformat()
+    assert rewritten["seasonRounds"][1]["event"]["startDate"] == "2024-02-15"
+    assert detail["seasonRounds"][0]["event"]["startDate"] == "2024-01-25"
@@ -0,0 +1,24 @@
+import pytest
+
+STAGE_ID = 8330
+
+
+@pytest.mark.parametrize("staleWhileRevalidate", [False, True])
+def test_live_reads_refresh_the_db(wrc, monkeypatch, staleWhileRevalidate):
+    wrc.liveCatchup = True
+    wrc.staleWhileRevalidate = staleWhileRevalidate
+    refreshes = []
+    for name in ["_refreshStageTimes", "_refreshSplitTimes"]:
+        monkeypatch.setattr(
+            wrc, name, lambda name=name, **kwargs: refreshes.append((name, kwargs))
+        )
+    wrc.stageId = STAGE_ID
+    assert not wrc.getStageTimes(stageId=STAGE_ID, raw=False).empty
+    wrc.getSplitTimes(stageId=STAGE_ID)
+    if wrc._revalidate_executor is not None:
+        wrc._revalidate_executor.submit(lambda: None).result()
+    assert [(name, kwargs["stageId"]) for name, kwargs in refreshes] == [
+        ("_refreshStageTimes", STAGE_ID),
+        ("_refreshSplitTimes", STAGE_ID),
+    ]
+    assert wrc.getFreshness(stageId=STAGE_ID) is not None
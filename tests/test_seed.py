@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from wrc_rallydj.livetiming_api2 import DatabaseManager
+
+
+def _seasons(dbname):
+    with sqlite3.connect(dbname) as conn:
+        return conn.execute("SELECT seasonId, name, year FROM seasons ORDER BY seasonId").fetchall()
+
+
+@pytest.fixture
+def seed(tmp_path):
+    dbname = str(tmp_path / "seed.db")
+    db = DatabaseManager(dbname, newdb=True)
+    db.conn.executemany(
+        "INSERT INTO seasons VALUES (?, ?, ?)",
+        [(1, "WRC 2024 (seed)", 2024), (2, "WRC 2025 (seed)", 2025)],
+    )
+    db.conn.commit()
+    db.conn.close()
+    return dbname
+
+
+def test_load_seed_keeps_existing_rows(tmp_path, seed):
+    dbname = str(tmp_path / "timing.db")
+    db = DatabaseManager(dbname, newdb=True)
+    db.conn.execute("INSERT INTO seasons VALUES (1, 'WRC 2024', 2024)")
+    db.conn.commit()
+
+    assert db.load_seed(seed)
+    assert _seasons(dbname) == [(1, "WRC 2024", 2024), (2, "WRC 2025 (seed)", 2025)]
+
+    # A seed is only loaded once
+    with sqlite3.connect(seed) as conn:
+        conn.execute("INSERT INTO seasons VALUES (3, 'WRC 2026 (seed)', 2026)")
+    assert db.load_seed(seed)
+    assert [r[0] for r in _seasons(dbname)] == [1, 2]
+    db.conn.close()
+
+
+def test_load_seed_missing_or_read_only(tmp_path, seed):
+    db = DatabaseManager(str(tmp_path / "timing.db"), newdb=True)
+    assert not db.load_seed(str(tmp_path / "nonesuch.db"))
+    db.conn.close()
+
+    db = DatabaseManager(str(tmp_path / "timing.db"), dbReadOnly=True)
+    assert not db.load_seed(seed)
+    assert _seasons(tmp_path / "timing.db") == []
+    db.conn.close()
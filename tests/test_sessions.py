@@ -0,0 +1,40 @@
+import threading
+
+
+def test_session_selection_is_its_own(wrc):
+    wrc.championshipLookup["wrc"] = {"x": 1}
+    session = wrc.newSession()
+    assert session.db_manager is wrc.db_manager
+    assert session.api_client is wrc.api_client
+
+    session.stageId = 123
+    session.eventId = wrc.eventId + 1
+    session.championshipLookup["wrc"]["x"] = 2
+    assert wrc.stageId is None
+    assert wrc.championshipLookup == {"wrc": {"x": 1}}
+
+
+def test_sessions_share_locked_caches(wrc):
+    sessions = [wrc.newSession() for _ in range(4)]
+    errors = []
+
+    def poll(n, session):
+        try:
+            for stageId in range(300):
+                session._markFresh("stage_times", stageId * 10 + n)
+                session.getDataAge(stageId=stageId)
+                session.getCompletedStatus()
+                session.checkCompletedStageTableStatus(stageId, "stage_times")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=poll, args=(n, s)) for n, s in enumerate(sessions)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    # Each session's refreshes are seen by the others
+    assert sessions[0].getFreshness(stageId=11) is not None
@@ -0,0 +1,31 @@
+from pandas import DataFrame
+
+from wrc_rallydj.livetiming_api2 import DatabaseManager
+
+
+def test_write_bumps_table_version(wrc):
+    db = wrc.db_manager
+    before = db.table_versions(["stage_info", "split_points"])
+    db.dbfy(DataFrame([{"stageId": -1, "name": "Test"}]), "stage_info", pk="stageId")
+    after = db.table_versions(["stage_info", "split_points"])
+    assert after["stage_info"] == before["stage_info"] + 1
+    assert after["split_points"] == before["split_points"]
+
+
+def test_recent_invalidated_by_another_connection(wrc):
+    api = wrc.api_client
+    api._remember("stages_json", wrc.eventId, "stages")
+    api._remember("itinerary_json", "itinerary_key", "itinerary")
+    assert api._recent("stages_json", wrc.eventId) == "stages"
+
+    # Another worker, on its own connection, writes to a stages table
+    other = DatabaseManager(wrc.db_manager.dbname)
+    other.dbfy(
+        DataFrame([{"stageId": -1, "name": "Test"}]), "stage_info", pk="stageId"
+    )
+    other.conn.close()
+
+    assert api._recent("stages_json", wrc.eventId) is None
+    assert ("stages_json", wrc.eventId) not in api.lastreferenced
+    # Results from other tables are still served
+    assert api._recent("itinerary_json", "itinerary_key") == "itinerary"
@@ -0,0 +1,190 @@
+import base64
+import gzip
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from wrcapi_rallydj.data_api import WRCDataAPIClient
+from wrcapi_rallydj.telemetry_store import TelemetryStore
+
+ENTRIES = [
+    {
+        "utx": 1700000000 + i,
+        "kms": round(i * 0.1, 1),
+        "speed": 100 + i,
+        "gear": i % 6,
+        "throttle": None if i == 4 else i * 10.5,
+        "brake": bool(i % 2),
+        # Missing from some entries
+        **({"status": "ok"} if i % 3 else {}),
+    }
+    for i in range(10)
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TelemetryStore(tmp_path / "telemetry")
+
+
+def _trace_frame():
+    df = pd.DataFrame(ENTRIES)
+    # Gaps in the index, as left by dropping duplicate rows
+    df = df.drop(index=[2, 7])
+    df["nested"] = [{"x": 1}, [1, 2], None, np.nan, "text", 1.5, {}, []]
+    df["laps"] = pd.array([1, None, 3, 4, 5, 6, 7, 8], dtype="Int64")
+    df["car"] = np.arange(len(df), dtype="int8")
+    return df
+
+
+def test_round_trip(store):
+    df = _trace_frame()
+    store.put(1, "c1", df)
+    with store.get(1, "c1") as trace:
+        assert trace.columns == list(df.columns)
+        assert len(trace) == len(df)
+        stored = trace.to_frame()
+    assert_frame_equal(stored, df)
+    assert stored["nested"].iloc[0] == {"x": 1}
+    assert stored["status"].isna().tolist() == df["status"].isna().tolist()
+
+
+def test_window(store):
+    df = _trace_frame()
+    store.put(1, "c1", df)
+    with store.get(1, "c1") as trace:
+        window = trace.window(distance=(0.3, 0.6), columns=["kms", "laps", "nested"])
+    expected = df[(df["kms"] >= 0.3) & (df["kms"] <= 0.6)][["kms", "laps", "nested"]]
+    assert_frame_equal(window, expected)
+
+
+def test_trace_without_dtypes(store):
+    # As stored before dtypes were kept
+    path = store._trace_path(1, "c1", "telemetry")
+    path.parent.mkdir(parents=True)
+    np.savez_compressed(path, kms=np.array([0.1, 0.2]), status=np.array(["a", "b"]))
+    with store.get(1, "c1") as trace:
+        assert trace.to_frame()["kms"].tolist() == [0.1, 0.2]
+        assert trace.to_frame()["status"].tolist() == ["a", "b"]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The client's requests cache is made in the working directory
+    monkeypatch.chdir(tmp_path)
+    client = WRCDataAPIClient(telemetry_store=tmp_path / "telemetry")
+    payloads = {
+        "T1": json.dumps({"_entries": ENTRIES}),
+        "M1": base64.b64encode(
+            gzip.compress(json.dumps({"_entries": ENTRIES[:5]}).encode())
+        ).decode(),
+        "M0": base64.b64encode(
+            gzip.compress(json.dumps({"_entries": []}).encode())
+        ).decode(),
+        "BAD": "not base64 gzipped json",
+    }
+    fetched = []
+
+    def fetch(telemetryID, stub_telemetry=None):
+        fetched.append(telemetryID)
+        return payloads[telemetryID]
+
+    monkeypatch.setattr(client, "_fetch_telemetry_text", fetch)
+    client.fetched = fetched
+    return client
+
+
+def test_process_driver_telemetry_data_from_store(client):
+    df_stagedata = pd.DataFrame(
+        [
+            {
+                "_record_name": "Neuville",
+                "_carentryid": "c1",
+                "_rally_stageid": "s1",
+                "telemetry": "T1",
+                "telemetry_merged": "M1",
+            }
+        ]
+    )
+    fetched = client.process_driver_telemetry_data(df_stagedata, "Neuville")
+    assert client.fetched == ["T1", "M1"]
+    stored = client.process_driver_telemetry_data(df_stagedata, "Neuville")
+    assert client.fetched == ["T1", "M1"]
+    for df, df_stored in zip(fetched, stored):
+        assert not df.empty
+        assert df.equals(df_stored)
+        assert_frame_equal(df_stored, df)
+
+
+@pytest.fixture
+def cars_stagedata():
+    return pd.DataFrame(
+        [
+            {
+                "_record_name": name,
+                "_carentryid": f"c{i}",
+                "_rally_stageid": "s1",
+                "nr": str(i),
+                "telemetry": "T1",
+                "telemetry_merged": "M1",
+            }
+            for i, name in enumerate(["Neuville", "Evans", "Tanak"], start=1)
+        ]
+    )
+
+
+@pytest.mark.parametrize("decode_workers", [0, 1])
+def test_cars_telemetry_fetches_and_decodes_separately(
+    client, cars_stagedata, monkeypatch, decode_workers
+):
+    fetch_threads, decode_threads = set(), set()
+    fetch = client._fetch_telemetry_text
+    submit_decode = client._submit_decode
+
+    def recording_fetch(telemetryID, stub_telemetry=None):
+        fetch_threads.add(threading.current_thread().name)
+        return fetch(telemetryID)
+
+    def recording_submit_decode(text, merged, meta):
+        decode_threads.add(threading.current_thread().name)
+        return submit_decode(text, merged, meta)
+
+    monkeypatch.setattr(client, "DECODE_WORKERS", decode_workers)
+    monkeypatch.setattr(client, "_fetch_telemetry_text", recording_fetch)
+    monkeypatch.setattr(client, "_submit_decode", recording_submit_decode)
+    telemetry, merged = client.get_cars_telemetry(cars_stagedata)
+    if client._decode_executor is not None:
+        client._decode_executor.shutdown()
+
+    assert all(name.startswith("wrc-telemetry") for name in fetch_threads)
+    assert decode_threads == {threading.current_thread().name}
+    assert sorted(telemetry.index.get_level_values("car").unique()) == ["1", "2", "3"]
+    assert len(telemetry) == 3 * len(ENTRIES)
+    assert len(merged) == 3 * 5
+    # And the traces are stored, as they were decoded
+    assert client.get_cars_telemetry(cars_stagedata)[0].equals(telemetry)
+    assert len(client.fetched) == 6
+
+
+@pytest.mark.parametrize("cars", [1, 2])
+def test_empty_merged_trace_is_stored(client, cars_stagedata, cars):
+    cars_stagedata = cars_stagedata.head(cars).assign(telemetry_merged="M0")
+    for _ in range(2):
+        telemetry, merged = client.get_cars_telemetry(cars_stagedata)
+        assert len(telemetry) == cars * len(ENTRIES)
+        assert merged.empty
+    # The second call is all read from the store
+    assert sorted(client.fetched) == sorted(["T1", "M0"] * cars)
+
+
+def test_undecodable_merged_trace_is_fetched_again(client, cars_stagedata):
+    cars_stagedata = cars_stagedata.head(1).assign(telemetry_merged="BAD")
+    for _ in range(2):
+        telemetry, merged = client.process_driver_telemetry_data(cars_stagedata)
+        assert len(telemetry) == len(ENTRIES)
+        assert merged.empty
+    assert client.fetched == ["T1", "BAD", "T1", "BAD"]
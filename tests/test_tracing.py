@@ -0,0 +1,95 @@
+import itertools
+
+import pytest
+
+from wrc_rallydj import tracing
+from wrc_rallydj.tracing import breakdown, read_trace, span
+
+
+def _event(id, name, dur, parent=None):
+    return {"name": name, "dur": dur, "args": {"id": id, "parent": parent}}
+
+
+def test_breakdown():
+    events = [
+        # Two renders, each with a getter that reads the db and fetches
+        _event(3, "db.read_sql", 20, parent=2),
+        _event(4, "api.fetch", 50, parent=2),
+        _event(2, "getStageTimes", 100, parent=1),
+        _event(1, "render.split_report", 150),
+        _event(6, "getStageTimes", 40, parent=5),
+        _event(5, "render.split_report", 50),
+        # A fetch that isn't in any render is its own root
+        _event(7, "api.fetch", 30),
+    ]
+    roots = breakdown(events)
+    assert roots == {
+        "render.split_report": {
+            "count": 2,
+            "total": 200,
+            "self": {
+                "render.split_report": 60,
+                "getStageTimes": 70,
+                "db.read_sql": 20,
+                "api.fetch": 50,
+            },
+        },
+        "api.fetch": {"count": 1, "total": 30, "self": {"api.fetch": 30}},
+    }
+
+
+def test_breakdown_orphaned_and_overlapping_spans():
+    events = [
+        # The parent span was never written (eg the trace was cut short)
+        _event(2, "getStageTimes", 10, parent=1),
+        # Concurrent children can add up to more than their parent
+        _event(4, "api.fetch", 30, parent=3),
+        _event(5, "api.fetch", 30, parent=3),
+        _event(3, "prefetch", 40),
+    ]
+    roots = breakdown(events)
+    assert roots["getStageTimes"] == {
+        "count": 1,
+        "total": 10,
+        "self": {"getStageTimes": 10},
+    }
+    assert roots["prefetch"]["self"] == {"prefetch": 0, "api.fetch": 60}
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(tracing.TRACER, "path", str(path))
+    yield path
+    tracing.TRACER.close()
+
+
+def test_trace_spans(trace_file):
+    with span("render.split_report", tags={"session": "s1"}):
+        with span("getStageTimes", tags={"stageId": 8330}, rows=60):
+            pass
+    tracing.TRACER.close()
+
+    inner, outer = read_trace(trace_file)
+    assert inner["args"]["parent"] == outer["args"]["id"]
+    # Tags are inherited, attrs aren't
+    assert inner["args"]["session"] == "s1"
+    assert inner["args"]["stageId"] == 8330
+    assert inner["args"]["rows"] == 60
+    assert "stageId" not in outer["args"]
+    assert list(breakdown([inner, outer])) == ["render.split_report"]
+
+
+def test_span_ids_unique_across_runs(trace_file, monkeypatch):
+    for run in ["run1", "run2"]:
+        # Another run, or process, appending to the trace, with its ids from 1
+        monkeypatch.setattr(tracing, "_RUN", run)
+        monkeypatch.setattr(tracing, "_ids", itertools.count(1))
+        with span("render.split_report"):
+            with span("getStageTimes"):
+                pass
+    tracing.TRACER.close()
+
+    events = read_trace(trace_file)
+    assert len({e["args"]["id"] for e in events}) == 4
+    assert breakdown(events)["render.split_report"]["count"] == 2
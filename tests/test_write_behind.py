@@ -0,0 +1,69 @@
+import pytest
+from pandas import DataFrame
+
+from wrc_rallydj.livetiming_api2 import DatabaseManager, WriteBehindError
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "wb.db"), newdb=True, writeBehind=True)
+    yield db
+    db.flush()
+
+
+def seasons(*ids):
+    return DataFrame(
+        [{"seasonId": i, "name": "World Rally Championship", "year": 2000 + i} for i in ids]
+    )
+
+
+def test_rows_are_written(db):
+    db.dbfy(seasons(1, 2), "seasons", pk="seasonId")
+    assert db.read_sql("SELECT seasonId FROM seasons")["seasonId"].tolist() == [1, 2]
+
+
+def test_failed_batch_falls_back_to_sync_write(db, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(db, "_write_batches", fail)
+    db.dbfy(seasons(3), "seasons", pk="seasonId")
+    assert db.read_sql("SELECT seasonId FROM seasons")["seasonId"].tolist() == [3]
+    assert not db.write_failures
+
+
+def test_lost_rows_are_surfaced(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(db, "_write_batches", fail)
+    monkeypatch.setattr(db, "_dbfy", fail)
+    db.dbfy(seasons(4), "seasons", pk="seasonId")
+    with pytest.raises(WriteBehindError, match="seasons"):
+        db.read_sql("SELECT seasonId FROM seasons")
+    assert "seasons" in db.write_failures
+    # Only the reads waiting on the lost rows see the error
+    monkeypatch.undo()
+    db.dbfy(seasons(5), "seasons", pk="seasonId")
+    assert db.read_sql("SELECT seasonId FROM seasons")["seasonId"].tolist() == [5]
+
+
+def test_columns_added_later_are_written(db):
+    db.dbfy(seasons(1), "seasons", pk="seasonId")
+    db.flush()
+    # A schema change made after the writer first saw the table
+    extended = seasons(2).assign(extra="x")
+    db.dbfy(extended, "seasons", pk="seasonId", alter=True)
+    db.dbfy(seasons(3).assign(extra="y"), "seasons", pk="seasonId")
+    extra = db.read_sql("SELECT extra FROM seasons ORDER BY seasonId")["extra"]
+    assert extra.tolist()[1:] == ["x", "y"]
+
+
+def test_tables_created_later_are_written(db):
+    rows = DataFrame([{"entryId": 1, "SS1": 10.0}])
+    # No such table yet, so the rows are dropped, as they are by the sync path
+    db.dbfy(rows, "progression_test", pk="entryId")
+    db.flush()
+    db.dbfy(rows, "progression_test", pk="entryId", alter=True)
+    db.dbfy(rows.assign(SS1=12.5), "progression_test", pk="entryId")
+    assert db.read_sql("SELECT SS1 FROM progression_test")["SS1"].tolist() == [12.5]